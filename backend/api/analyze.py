@@ -3,71 +3,65 @@ Intra-document analysis API endpoints.
 Provides routes for analyzing similarities between pages within a single document.
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import FileResponse
-from pdf2image import convert_from_path
-import pytesseract
-from PIL import Image, ImageDraw
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request
+from fastapi.responses import FileResponse, Response
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+import asyncio
+import hashlib
+import io
 import os
-import tempfile
+import re
 import uuid
-import time
 import logging
+from email.utils import formatdate
 from typing import List, Tuple, Dict, Any, Set
 from collections import defaultdict
-from ingestion.preprocessing import measure_medical_confidence
+from ingestion.preprocessing import measure_medical_confidence_batch
 from ingestion.pdf_reader import extract_pages_from_pdf
+from utils.config import settings
 from similarity.tfidf import analyze_document_pages as tfidf_analyze_document_pages
+from backend.services.ocr_utils import normalize_word, render_page, tesseract_words_batch
+from backend.api.common import etag_matches, save_upload
 
 # Create temporary directory for storing images
 TEMP_DIR = os.path.abspath("storage/tmp")
 os.makedirs(TEMP_DIR, exist_ok=True)
 os.chmod(TEMP_DIR, 0o755)
 
+# Uploaded PDFs are only read back by this process, so they go to scratch space
+SCRATCH_DIR = os.path.abspath(settings.SCRATCH_PATH)
+os.makedirs(SCRATCH_DIR, exist_ok=True)
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Create router
-router = APIRouter()
+# Highlight colours: yellow with 40% opacity (pre-multiplied), orange outline
+_HIGHLIGHT_ALPHA = 100 / 255
+_HIGHLIGHT_TINT = np.array((255, 255, 0), dtype=np.float32) * _HIGHLIGHT_ALPHA
+_HIGHLIGHT_OUTLINE = np.array((255, 165, 0), dtype=np.uint8)
 
+# Content hash in the names save_page_image gives page images, e.g. page3_0123456789abcdef_orig.jpg
+_IMAGE_CONTENT_ID_RE = re.compile(r'_([0-9a-f]{16})_[^_]+\.jpg$')
 
-def cleanup_old_temp_files(temp_dir: str, max_age_hours: int = 1, preserve_files: set = None):
-    """
-    Clean up temporary files older than max_age_hours, preserving specified files.
-    
-    Args:
-        temp_dir: Directory to clean up
-        max_age_hours: Maximum age of files to keep in hours
-        preserve_files: Set of filenames to preserve
-    """
-    if preserve_files is None:
-        preserve_files = set()
-        
-    current_time = time.time()
-    for filename in os.listdir(temp_dir):
-        file_path = os.path.join(temp_dir, filename)
-        if not os.path.isfile(file_path):
-            continue
-        if filename in preserve_files:
-            continue
-        if current_time - os.path.getmtime(file_path) > (max_age_hours * 3600):
-            try:
-                os.remove(file_path)
-                logger.debug(f"Removed old temp file: {filename}")
-            except Exception as e:
-                logger.error(f"Failed to remove old temp file {filename}: {e}")
+# Create router
+router = APIRouter()
 
 
 @router.get("/tmp/{filename}")
-async def get_temp_image(filename: str):
+async def get_temp_image(filename: str, request: Request):
     """
     Serve a temporary image file.
+    Image names carry a hash of their content and are never rewritten, so responses are
+    cacheable as immutable, and the hash is a strong ETag for revalidation.
     
     Args:
         filename: Name of the image file
+        request: Incoming request, checked for If-None-Match
         
     Returns:
-        Image file
+        Image file, or an empty 304 response if the client's copy is current
         
     Raises:
         HTTPException: If image is not found
@@ -78,102 +72,138 @@ async def get_temp_image(filename: str):
     if not os.path.exists(file_path):
         logger.warning(f"File not found at: {file_path}")
         raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
+    
+    mtime = os.path.getmtime(file_path)
+    # save_page_image touches reused files, so the mtime isn't a stable validator; the content hash is
+    content_id = _IMAGE_CONTENT_ID_RE.search(filename)
+    etag = f'"{content_id.group(1) if content_id else os.path.splitext(filename)[0]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=604800, immutable",
+        "Last-Modified": formatdate(mtime, usegmt=True),
+    }
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
         
-    return FileResponse(file_path)
+    return FileResponse(file_path, headers=headers)
 
 
-def extract_words_with_boxes(image: Image.Image) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+def save_page_image(image: Image.Image, page_number: int, kind: str) -> str:
     """
-    Returns list of (word, (x, y, w, h)) tuples from OCR output.
+    Save a page image to TEMP_DIR as JPEG, named after a hash of the encoded bytes.
+    Identical images (e.g. the same PDF analyzed again) share one file, which is only written once.
     
     Args:
-        image: PIL image to extract text from
+        image: RGB PIL image to save
+        page_number: 1-based page number, used in the file name
+        kind: File name suffix, e.g. "orig" or "hl"
         
     Returns:
-        List of tuples containing (word, bounding_box)
+        Name of the file within TEMP_DIR
     """
-    # Ensure image is in RGB mode for OCR
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    # Configure Tesseract for better text detection
-    custom_config = r'--oem 3 --psm 6 -l eng'  # Assume uniform text block
-    data = pytesseract.image_to_data(image, config=custom_config, output_type=pytesseract.Output.DICT)
-    
-    words = []
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=80, optimize=True)
+    data = buf.getvalue()
+    content_id = hashlib.blake2b(data, digest_size=8).hexdigest()
+    filename = f"page{page_number}_{content_id}_{kind}.jpg"
+    file_path = os.path.join(TEMP_DIR, filename)
+    if os.path.exists(file_path):
+        os.utime(file_path) # Reused: keep it from being cleaned up as old
+    else:
+        with open(file_path, "wb") as f:
+            f.write(data)
+    return filename
+
+
+def extract_words_with_boxes_batch(images: List[Image.Image]) -> List[List[Tuple[str, str, Tuple[int, int, int, int]]]]:
+    """
+    OCR several images with a single Tesseract process (see tesseract_words_batch)
+    and keep the confident words.
     
-    for i in range(len(data['text'])):
-        word = data['text'][i].strip()
-        conf = int(data['conf'][i])
+    Args:
+        images: PIL images to extract text from
         
-        # Lower confidence threshold for better recall
-        if conf > 30 and word:  # Lower threshold from 50 to 30
-            # Use actual pixel coordinates
-            bbox = (
-                int(data['left'][i]),     # x
-                int(data['top'][i]),      # y
-                int(data['width'][i]),    # width
-                int(data['height'][i])    # height
-            )
-            words.append((word, bbox))
-    
+    Returns:
+        One list of (word, normalized_word, bounding_box) tuples per image, in input order
+    """
+    words: List[List[Tuple[str, str, Tuple[int, int, int, int]]]] = []
+    for page_rows in tesseract_words_batch(images):
+        page_words = []
+        for word, conf, bbox in page_rows:
+            norm = normalize_word(word)
+            # Lower confidence threshold for better recall
+            if norm and conf > 30:
+                page_words.append((word, norm, bbox))
+        words.append(page_words)
     return words
 
 
-def normalize_word(word: str) -> str:
+async def ocr_pages(images: Dict[int, Image.Image]) -> Dict[int, List[Tuple[str, str, Tuple[int, int, int, int]]]]:
     """
-    Normalize word for comparison by removing punctuation and converting to lowercase.
+    OCR several page images, split into at most OCR_CONCURRENCY batches that run in parallel.
+    Each batch is a single Tesseract process (see extract_words_with_boxes_batch).
     
     Args:
-        word: Word to normalize
+        images: PIL images keyed by page index
         
     Returns:
-        Normalized word
+        OCR words with boxes keyed by page index; empty for pages where OCR failed
     """
-    return ''.join(c.lower() for c in word if c.isalnum())
+    indices = list(images)
+    num_batches = max(1, min(settings.OCR_CONCURRENCY, len(indices)))
+    batches = [indices[b::num_batches] for b in range(num_batches)]
+
+    async def ocr_batch(batch: List[int]):
+        try:
+            words = await asyncio.to_thread(extract_words_with_boxes_batch, [images[idx] for idx in batch])
+        except Exception as e:
+            logger.error(f"OCR failed for pages {[idx + 1 for idx in batch]}: {e}", exc_info=True)
+            words = [[] for _ in batch]
+        return list(zip(batch, words))
+
+    results = await asyncio.gather(*(ocr_batch(batch) for batch in batches if batch))
+    return {idx: words for batch_result in results for idx, words in batch_result}
 
 
 def highlight_similar_words(
     image: Image.Image,
     words_to_highlight: Set[str],
-    word_data: List[Tuple[str, Tuple[int, int, int, int]]]
+    word_data: List[Tuple[str, str, Tuple[int, int, int, int]]]
 ) -> Image.Image:
     """
-    Highlight similar words on the image.
+    Highlight similar words on a copy of the image.
+    Boxes are blended with NumPy slicing on the pixel array; the rest of the page is left untouched.
     
     Args:
-        image: PIL image to highlight
-        words_to_highlight: Set of words to highlight
-        word_data: List of (word, bbox) tuples
+        image: PIL image to highlight (not modified)
+        words_to_highlight: Set of normalized words to highlight
+        word_data: List of (word, normalized_word, bbox) tuples
         
     Returns:
-        PIL image with highlights
+        New RGB PIL image with highlights
     """
-    # Convert to RGBA for transparency
-    if image.mode != 'RGBA':
-        image = image.convert('RGBA')
-    
-    overlay = Image.new('RGBA', image.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
-    
-    # Normalize words to highlight
-    normalized_words = set(normalize_word(word) for word in words_to_highlight)
+    arr = np.array(image if image.mode == 'RGB' else image.convert('RGB'))
+    height, width = arr.shape[:2]
     
-    # Find words to highlight
-    for word, bbox in word_data:
-        if normalize_word(word) in normalized_words:
-            x, y, w, h = bbox
-            # Draw rectangle with padding
-            padding = 2
-            draw.rectangle(
-                [(x-padding, y-padding), (x+w+padding, y+h+padding)],
-                fill=(255, 255, 0, 100),  # Yellow with 40% opacity
-                outline=(255, 165, 0, 200),  # Orange outline
-                width=2
-            )
+    # Find words to highlight; word_data already carries the normalized form
+    padding = 2
+    for _, norm, (x, y, w, h) in word_data:
+        if norm not in words_to_highlight:
+            continue
+        # Padded box, clipped to the page (negative slice bounds would wrap around)
+        x1, y1 = max(x - padding, 0), max(y - padding, 0)
+        x2, y2 = min(x + w + padding + 1, width), min(y + h + padding + 1, height)
+        if x1 >= x2 or y1 >= y2:
+            continue
+        region = arr[y1:y2, x1:x2]
+        region[:] = region * (1 - _HIGHLIGHT_ALPHA) + _HIGHLIGHT_TINT
+        # 2 px outline
+        region[:2] = _HIGHLIGHT_OUTLINE
+        region[-2:] = _HIGHLIGHT_OUTLINE
+        region[:, :2] = _HIGHLIGHT_OUTLINE
+        region[:, -2:] = _HIGHLIGHT_OUTLINE
     
-    # Combine original image with overlay
-    return Image.alpha_composite(image, overlay)
+    return Image.fromarray(arr)
 
 
 @router.post("/intra-document")
@@ -195,98 +225,84 @@ async def analyze_intra_document(
     Raises:
         HTTPException: If analysis fails
     """
+    temp_file_path = os.path.join(SCRATCH_DIR, f"{uuid.uuid4()}_{file.filename}")
     try:
         logger.info(f"Starting intra-document analysis with TF-IDF threshold {threshold} for {file.filename}")
         
-        temp_file_path = os.path.join(TEMP_DIR, f"{uuid.uuid4()}_{file.filename}")
-        with open(temp_file_path, "wb") as f:
-            f.write(await file.read())
+        await asyncio.to_thread(save_upload, file, temp_file_path)
         
         # 1. Extract text from all pages
         page_texts = extract_pages_from_pdf(temp_file_path)
         if not page_texts:
-            os.unlink(temp_file_path)
             logger.warning(f"Could not extract any text from {file.filename}")
             raise HTTPException(status_code=400, detail="Could not extract text from document.")
         
         logger.info(f"Extracted text from {len(page_texts)} pages.")
 
-        # 2. Initial images for all pages (non-highlighted)
-        page_images_pil = convert_from_path(temp_file_path, dpi=300) # For targeted OCR later
-        if len(page_images_pil) != len(page_texts):
-            logger.warning(f"Mismatch between text page count ({len(page_texts)}) and image page count ({len(page_images_pil)}). Using lower count.")
-            # Adjust to the minimum to prevent index errors, though this indicates a problem
-            min_pages = min(len(page_texts), len(page_images_pil))
-            page_texts = page_texts[:min_pages]
-            page_images_pil = page_images_pil[:min_pages]
-            if not min_pages:
-                os.unlink(temp_file_path)
-                raise HTTPException(status_code=500, detail="Failed to convert PDF pages to images consistently.")
-
-        page_data_response = []
-        preserved_files = set()
-        for i, p_img in enumerate(page_images_pil):
-            unique_id = str(uuid.uuid4())[:8]
-            img_path = os.path.join(TEMP_DIR, f"page{i+1}_{unique_id}_orig.png")
-            p_img.save(img_path, "PNG")
-            preserved_files.add(os.path.basename(img_path))
-            page_data_response.append({
-                "pageNumber": i + 1,
-                "imageUrl": f"/analyze/tmp/{os.path.basename(img_path)}", # Changed prefix to /analyze
-                "ocrWordCount": 0 # Will be updated if OCR is done for highlighting
-            })
-
-        # 3. TF-IDF based similarity analysis
+        # 2. TF-IDF based similarity analysis, before any rendering so only pages in a pair are rasterized at full resolution
         # Note: tfidf_analyze_document_pages expects list of texts and returns 0-indexed pairs
         tfidf_similar_pairs = tfidf_analyze_document_pages(page_texts, threshold=threshold)
         logger.info(f"Found {len(tfidf_similar_pairs)} page pairs with TF-IDF similarity >= {threshold}")
+        needed_idx = {idx for pair in tfidf_similar_pairs for idx in (pair["page1_idx"], pair["page2_idx"])}
+
+        # 3. Page images: ANALYSIS_DPI for pages needed for OCR highlighting, 72 DPI thumbnails for the rest
+        page_images_pil: Dict[int, Image.Image] = {} # Full-resolution images keyed by 0-based page index
+        page_data_response = []
+        with fitz.open(temp_file_path) as doc:
+            if len(doc) != len(page_texts):
+                logger.warning(f"Mismatch between text page count ({len(page_texts)}) and image page count ({len(doc)}). Using lower count.")
+            page_count = min(len(doc), len(page_texts))
+            if not page_count:
+                raise HTTPException(status_code=500, detail="Failed to convert PDF pages to images consistently.")
+            page_texts = page_texts[:page_count]
+            tfidf_similar_pairs = [pair for pair in tfidf_similar_pairs if max(pair["page1_idx"], pair["page2_idx"]) < page_count]
+
+            for i in range(page_count):
+                p_img = render_page(doc.load_page(i), dpi=settings.ANALYSIS_DPI if i in needed_idx else 72)
+                if i in needed_idx:
+                    page_images_pil[i] = p_img
+                img_name = save_page_image(p_img, i + 1, "orig")
+                page_data_response.append({
+                    "pageNumber": i + 1,
+                    "imageUrl": f"/analyze/tmp/{img_name}", # Changed prefix to /analyze
+                    "ocrWordCount": 0 # Will be updated if OCR is done for highlighting
+                })
 
         # 4. Targeted OCR and Highlighting for TF-IDF similar pairs
+        # Each page is OCR'd once, with the Tesseract runs spread over a bounded set of worker threads
+        ocr_results = await ocr_pages(page_images_pil)
+        # Normalized OCR vocabulary of each page, built once rather than for every pair the page is in
+        normalized_sets: Dict[int, Set[str]] = {
+            idx: {norm for _, norm, _ in words} for idx, words in ocr_results.items()
+        }
         highlighted_page_info = {} # Store info about highlighted pages: {page_num_1_based: new_url}
 
+        # Collect each page's highlight words over all pairs it is in, so every page is rendered once
+        highlights_per_page: Dict[int, Set[str]] = defaultdict(set)
         for pair in tfidf_similar_pairs:
             idx1, idx2 = pair["page1_idx"], pair["page2_idx"]
             similarity_score = pair["similarity"]
             logger.info(f"Processing TF-IDF similar pair: Page {idx1+1} and Page {idx2+1} (Similarity: {similarity_score:.4f})")
 
+            # Update OCR word count for these pages in page_data_response (entry i is page i+1)
+            page_data_response[idx1]["ocrWordCount"] = len(normalized_sets[idx1])
+            page_data_response[idx2]["ocrWordCount"] = len(normalized_sets[idx2])
+
+            common_words_for_highlight = normalized_sets[idx1] & normalized_sets[idx2]
+            if not common_words_for_highlight:
+                logger.info(f"No common OCR words found between page {idx1+1} and {idx2+1} despite TF-IDF similarity.")
+                continue
+            highlights_per_page[idx1] |= common_words_for_highlight
+            highlights_per_page[idx2] |= common_words_for_highlight
+
+        for idx, words_to_highlight in highlights_per_page.items():
             try:
-                img1_pil = page_images_pil[idx1]
-                img2_pil = page_images_pil[idx2]
-
-                words_data1 = extract_words_with_boxes(img1_pil)
-                words_data2 = extract_words_with_boxes(img2_pil)
-
-                # Update OCR word count for these pages in page_data_response
-                for p_data in page_data_response:
-                    if p_data["pageNumber"] == idx1 + 1:
-                        p_data["ocrWordCount"] = len(set(normalize_word(w) for w, _ in words_data1))
-                    if p_data["pageNumber"] == idx2 + 1:
-                        p_data["ocrWordCount"] = len(set(normalize_word(w) for w, _ in words_data2))
-
-                common_words_for_highlight = set(normalize_word(w) for w, _ in words_data1).intersection(
-                                           set(normalize_word(w) for w, _ in words_data2)
-                                         )
-                if not common_words_for_highlight:
-                    logger.info(f"No common OCR words found between page {idx1+1} and {idx2+1} despite TF-IDF similarity.")
-                    continue
-
-                hl_img1 = highlight_similar_words(img1_pil.copy(), common_words_for_highlight, words_data1)
-                hl_img2 = highlight_similar_words(img2_pil.copy(), common_words_for_highlight, words_data2)
-                
-                hl_unique_id = str(uuid.uuid4())[:8]
-                hl_img_path1 = os.path.join(TEMP_DIR, f"page{idx1+1}_{hl_unique_id}_hl.png")
-                hl_img_path2 = os.path.join(TEMP_DIR, f"page{idx2+1}_{hl_unique_id}_hl.png")
-                
-                hl_img1.save(hl_img_path1, "PNG")
-                hl_img2.save(hl_img_path2, "PNG")
-                preserved_files.add(os.path.basename(hl_img_path1))
-                preserved_files.add(os.path.basename(hl_img_path2))
-
-                highlighted_page_info[idx1 + 1] = f"/analyze/tmp/{os.path.basename(hl_img_path1)}"
-                highlighted_page_info[idx2 + 1] = f"/analyze/tmp/{os.path.basename(hl_img_path2)}"
-            except Exception as e_ocr:
-                logger.error(f"Error during OCR/highlighting for pages {idx1+1}, {idx2+1}: {e_ocr}", exc_info=True)
-                # Continue to next pair
+                hl_img = highlight_similar_words(page_images_pil[idx], words_to_highlight, ocr_results[idx])
+                hl_img_name = save_page_image(hl_img, idx + 1, "hl")
+                highlighted_page_info[idx + 1] = f"/analyze/tmp/{hl_img_name}"
+            except Exception as e_hl:
+                logger.error(f"Error during highlighting for page {idx+1}: {e_hl}", exc_info=True)
+                # Continue to next page
 
         # Update image URLs in page_data_response if highlighted versions exist
         for p_data in page_data_response:
@@ -294,13 +310,9 @@ async def analyze_intra_document(
                 p_data["imageUrl"] = highlighted_page_info[p_data["pageNumber"]]
 
         # 5. Medical Confidence
-        medical_confidences = [measure_medical_confidence(text) for text in page_texts if text.strip()]
+        medical_confidences = measure_medical_confidence_batch([text for text in page_texts if text.strip()])
         avg_medical_confidence = sum(medical_confidences) / len(medical_confidences) if medical_confidences else 0.0
 
-        # Clean up the original uploaded PDF file
-        os.unlink(temp_file_path)
-        cleanup_old_temp_files(TEMP_DIR, max_age_hours=1, preserve_files=preserved_files)
-        
         # Prepare final highSimilarityPairs with 1-based indexing
         final_high_similarity_pairs = [
             {"page1": pair["page1_idx"] + 1, "page2": pair["page2_idx"] + 1, "similarity": pair["similarity"]}
@@ -321,10 +333,12 @@ async def analyze_intra_document(
     except Exception as e:
         # Log the specific error before raising a generic one
         logger.error(f"Intra-document analysis failed for {file.filename}: {str(e)}", exc_info=True)
-        # Clean up temp file in case of failure before unlinking
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as e_clean:
-                logger.error(f"Failed to cleanup temp file {temp_file_path} on error: {e_clean}")
-        raise HTTPException(status_code=500, detail=f"Intra-document analysis failed: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Intra-document analysis failed: {str(e)}")
+    finally:
+        # Only the uploaded PDF is removed here; page images are swept by the app's periodic temp cleanup
+        try:
+            os.unlink(temp_file_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e_clean:
+            logger.error(f"Failed to cleanup temp file {temp_file_path}: {e_clean}")
@@ -0,0 +1,36 @@
+"""
+Helpers shared by the API routers.
+"""
+
+import shutil
+
+from fastapi import UploadFile
+
+
+def save_upload(upload: UploadFile, path: str) -> None:
+    """
+    Write an uploaded file to disk in 1 MiB chunks instead of reading it into memory.
+    Blocking; async endpoints run it with asyncio.to_thread to keep it off the event loop.
+
+    Args:
+        upload: Uploaded file
+        path: Destination path
+    """
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f, 1 << 20)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag, using the weak comparison
+    the header calls for (W/ prefixes are ignored) and accepting lists and "*".
+    """
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
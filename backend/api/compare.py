@@ -3,72 +3,113 @@ Document comparison API endpoints.
 Provides routes for comparing documents and visualizing differences.
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 from backend.services.extractor import extract_text_and_pages
 from backend.services.diff_utils import compute_text_diff, compute_changed_bounding_boxes
-from pdf2image import convert_from_path
-import pytesseract
-from PIL import Image, ImageDraw
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+import asyncio
+import atexit
+import hashlib
 import os
-import tempfile
+import queue
+import threading
 import uuid
 import time
 import logging
-from typing import List, Tuple, Dict, Any
+from email.utils import formatdate
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple, Dict, Any
 
 from ingestion.pdf_reader import extract_text_from_pdf
+from utils.config import settings
+from utils.extraction_cache import file_fingerprint, image_fingerprint, get_cached_page_words, cache_page_words
 from similarity.engine import SimilarityEngine
+from backend.services.ocr_utils import normalize_word, render_page, tesseract_words_batch
+from backend.api.common import etag_matches, save_upload
 
 # Create temporary directory for storing images
 TEMP_DIR = os.path.abspath("storage/tmp")
 os.makedirs(TEMP_DIR, exist_ok=True)
 os.chmod(TEMP_DIR, 0o755)
 
+# Uploaded PDFs are only read back by this process, so they go to scratch space
+SCRATCH_DIR = os.path.abspath(settings.SCRATCH_PATH)
+os.makedirs(SCRATCH_DIR, exist_ok=True)
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Pages are OCR'd by parallel Tesseract engines; keep each one single-threaded so they don't oversubscribe the CPU.
+# Set before tesserocr is imported, since OpenMP reads it when libtesseract loads.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Optional in-process OCR: tesserocr keeps the engine and language model loaded between pages
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Idle tesserocr engines, shared by the OCR worker threads (a PyTessBaseAPI must not be used by two threads at once)
+_TESS_APIS: "queue.SimpleQueue" = queue.SimpleQueue()
+
+# OCR words of recently seen page images, keyed by image_fingerprint; backed by the shared Redis cache
+_OCR_CACHE_SIZE = 64
+_OCR_CACHE: "OrderedDict[str, PageWords]" = OrderedDict()
+_OCR_CACHE_LOCK = threading.Lock()
+
+# Highlighted pages are PNG-encoded here so encoding overlaps with OCR of the next window
+_ENCODER = ThreadPoolExecutor(max_workers=4, thread_name_prefix="compare-encode")
+
+# Highlight colors: 50% red over each group of matched words, with a solid red outline
+_HIGHLIGHT_ALPHA = 128 / 255
+_HIGHLIGHT_TINT = np.array((255, 0, 0), dtype=np.float32) * _HIGHLIGHT_ALPHA
+_HIGHLIGHT_OUTLINE = np.array((255, 0, 0), dtype=np.uint8)
+
 # Create router
 router = APIRouter()
 
 
-def cleanup_old_temp_files(temp_dir: str, max_age_hours: int = 1, preserve_files: set = None):
+def cleanup_old_temp_files(temp_dir: str, max_age_hours: int = 1):
     """
-    Clean up temporary files older than max_age_hours, preserving specified files.
+    Clean up temporary files older than max_age_hours.
+    Used by the app's periodic sweeper for both the compare and analyze images.
     
     Args:
         temp_dir: Directory to clean up
         max_age_hours: Maximum age of files to keep in hours
-        preserve_files: Set of filenames to preserve
     """
-    if preserve_files is None:
-        preserve_files = set()
-        
     current_time = time.time()
-    for filename in os.listdir(temp_dir):
-        file_path = os.path.join(temp_dir, filename)
-        if not os.path.isfile(file_path):
-            continue
-        if filename in preserve_files:
-            continue
-        if current_time - os.path.getmtime(file_path) > (max_age_hours * 3600):
+    # scandir reports the file type from the directory entry, so only one stat call is made per file
+    with os.scandir(temp_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
             try:
-                os.remove(file_path)
-                logger.debug(f"Removed old temp file: {filename}")
+                if current_time - entry.stat().st_mtime > (max_age_hours * 3600):
+                    os.remove(entry.path)
+                    logger.debug(f"Removed old temp file: {entry.name}")
             except Exception as e:
-                logger.error(f"Failed to remove old temp file {filename}: {e}")
+                logger.error(f"Failed to remove old temp file {entry.name}: {e}")
 
 
 @router.get("/tmp/{filename}")
-async def get_temp_image(filename: str):
+async def get_temp_image(filename: str, request: Request):
     """
     Serve a temporary image file.
+    Responses carry an ETag so the browser can revalidate instead of downloading the image again.
     
     Args:
         filename: Name of the image file
+        request: Incoming request, checked for If-None-Match
         
     Returns:
-        Image file
+        Image file, or an empty 304 response if the client's copy is current
         
     Raises:
         HTTPException: If image is not found
@@ -79,160 +120,267 @@ async def get_temp_image(filename: str):
     if not os.path.exists(file_path):
         logger.warning(f"File not found at: {file_path}")
         raise HTTPException(status_code=404, detail=f"Image not found: {filename}")
+    
+    mtime = os.path.getmtime(file_path)
+    etag = f'"{hashlib.md5(f"{file_path}:{mtime}".encode()).hexdigest()}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=3600",
+        "Last-Modified": formatdate(mtime, usegmt=True),
+    }
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
         
-    return FileResponse(file_path)
+    return FileResponse(file_path, headers=headers)
+
+
+def _acquire_tess_api():
+    """Take an idle Tesseract engine from the pool, creating one if none is free."""
+    try:
+        return _TESS_APIS.get_nowait()
+    except queue.Empty:
+        # Same settings as tesseract_words_batch: LSTM engine, uniform text block
+        return tesserocr.PyTessBaseAPI(lang='eng', psm=tesserocr.PSM.SINGLE_BLOCK, oem=tesserocr.OEM.DEFAULT)
+
+
+@atexit.register
+def _end_tess_apis():
+    """Release the pooled Tesseract engines at interpreter exit."""
+    while True:
+        try:
+            _TESS_APIS.get_nowait().End()
+        except queue.Empty:
+            break
+
+
+def _ocr_words_tesserocr(image: Image.Image) -> List[Tuple[str, float, Tuple[int, int, int, int]]]:
+    """Recognize words with a pooled in-process Tesseract engine; returns (word, conf, bbox) tuples."""
+    api = _acquire_tess_api()
+    try:
+        api.SetImage(image)
+        api.Recognize()
+        words = []
+        level = tesserocr.RIL.WORD
+        for word_it in tesserocr.iterate_level(api.GetIterator(), level):
+            box = word_it.BoundingBox(level)
+            if box is None:
+                continue
+            x1, y1, x2, y2 = box
+            words.append(((word_it.GetUTF8Text(level) or "").strip(), word_it.Confidence(level), (x1, y1, x2 - x1, y2 - y1)))
+        return words
+    finally:
+        api.Clear()
+        _TESS_APIS.put(api)
+
 
+@dataclass
+class PageWords:
+    """Column-oriented OCR words of one page; every column has one entry per word."""
+    words: List[str]
+    norms: List[str]
+    boxes: np.ndarray  # (N, 4) int32 array of (x, y, w, h)
 
-def extract_words_with_boxes(image: Image.Image) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+    @classmethod
+    def from_words(cls, words: List[str], boxes: List[Tuple[int, int, int, int]]) -> "PageWords":
+        """Build the columns from recognized words and their boxes, normalizing each word once."""
+        return cls(words, [normalize_word(word) for word in words], np.asarray(boxes, dtype=np.int32).reshape(-1, 4))
+
+
+def _confident_words(rows: List[Tuple[str, float, Tuple[int, int, int, int]]]) -> PageWords:
+    """Keep the confident words of one page's (word, conf, bbox) OCR output."""
+    # Lower confidence threshold for better recall
+    kept = [(word, bbox) for word, conf, bbox in rows if conf > 30 and word]
+    return PageWords.from_words([word for word, _ in kept], [bbox for _, bbox in kept])
+
+
+def _recognize_words(image: Image.Image) -> PageWords:
+    """Run OCR on the image with a pooled tesserocr engine and keep the confident words."""
+    page_words = _confident_words(_ocr_words_tesserocr(image))
+    logger.debug(f"Extracted {len(page_words.words)} words from image")
+    return page_words
+
+
+def _recognize_words_batch(images: List[Image.Image]) -> List[PageWords]:
+    """OCR several images with a single Tesseract process (see tesseract_words_batch)."""
+    return [_confident_words(rows) for rows in tesseract_words_batch(images)]
+
+
+def _cached_words(fingerprint: str) -> Optional[PageWords]:
+    """Look up OCR words by image fingerprint in the in-process LRU, then the shared Redis cache."""
+    with _OCR_CACHE_LOCK:
+        page_words = _OCR_CACHE.get(fingerprint)
+        if page_words is not None:
+            _OCR_CACHE.move_to_end(fingerprint)
+            return page_words
+    cached = get_cached_page_words(fingerprint)
+    if cached is None:
+        return None
+    words, norms, boxes = cached
+    page_words = PageWords(words, norms, np.asarray(boxes, dtype=np.int32).reshape(-1, 4))
+    _remember_words(fingerprint, page_words)
+    return page_words
+
+
+def _remember_words(fingerprint: str, page_words: PageWords, shared: bool = False):
+    """Store OCR words in the in-process LRU, and in the shared Redis cache if shared is set."""
+    if shared:
+        cache_page_words(fingerprint, page_words.words, page_words.norms, page_words.boxes.tolist())
+    with _OCR_CACHE_LOCK:
+        _OCR_CACHE[fingerprint] = page_words
+        if len(_OCR_CACHE) > _OCR_CACHE_SIZE:
+            _OCR_CACHE.popitem(last=False)
+
+
+def extract_words_with_boxes_batch(images: List[Image.Image]) -> List[PageWords]:
     """
-    Returns list of (word, (x, y, w, h)) tuples from OCR output.
+    OCR several images, e.g. the same page of both compared documents.
+    Results are cached by image content. Uncached images go to pooled in-process
+    Tesseract engines when tesserocr is installed, otherwise to a single Tesseract
+    process for the whole batch.
     
     Args:
-        image: PIL image to extract text from
+        images: PIL images to extract text from
         
     Returns:
-        List of tuples containing (word, bounding_box)
+        The words, normalized words and (x, y, w, h) boxes of each image, in input order
     """
-    # Ensure image is in RGB mode for OCR
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    # Configure Tesseract for better text detection
-    custom_config = r'--oem 3 --psm 6 -l eng'  # Assume uniform text block
-    data = pytesseract.image_to_data(image, config=custom_config, output_type=pytesseract.Output.DICT)
-    
-    words = []
-    logger.debug(f"Processing OCR data with {len(data['text'])} elements")
-    
-    for i in range(len(data['text'])):
-        word = data['text'][i].strip()
-        conf = int(data['conf'][i])
-        
-        # Lower confidence threshold for better recall
-        if conf > 30 and word:  # Lower threshold from 50 to 30
-            logger.debug(f"Found word '{word}' with confidence {conf}")
-            # Use actual pixel coordinates
-            bbox = (
-                int(data['left'][i]),     # x
-                int(data['top'][i]),      # y
-                int(data['width'][i]),    # width
-                int(data['height'][i])    # height
-            )
-            words.append((word, bbox))
+    # Tesseract takes grayscale or RGB input
+    images = [image if image.mode in ('L', 'RGB') else image.convert('RGB') for image in images]
     
-    logger.debug(f"Extracted {len(words)} words from image")
-    return words
+    # Identical pages (re-uploads, repeated pages within or across documents) are OCR'd only once
+    fingerprints = [image_fingerprint(image) for image in images]
+    results = [_cached_words(fingerprint) for fingerprint in fingerprints]
+    missing = [n for n, page_words in enumerate(results) if page_words is None]
+    logger.debug(f"OCR cache hits: {len(images) - len(missing)} of {len(images)} images")
+    if missing:
+        if tesserocr is not None:
+            fresh = [_recognize_words(images[n]) for n in missing]
+        else:
+            fresh = _recognize_words_batch([images[n] for n in missing])
+        for n, page_words in zip(missing, fresh):
+            _remember_words(fingerprints[n], page_words, shared=True)
+            results[n] = page_words
+    return results
 
 
-def normalize_word(word: str) -> str:
+def extract_words_with_boxes(image: Image.Image) -> PageWords:
     """
-    Normalize word for comparison by removing punctuation and converting to lowercase.
+    Returns the words, normalized words and (x, y, w, h) boxes from OCR output.
+    See extract_words_with_boxes_batch.
     
     Args:
-        word: Word to normalize
+        image: PIL image to extract text from
         
     Returns:
-        Normalized word
+        Column-oriented OCR words of the image
     """
-    return ''.join(c.lower() for c in word if c.isalnum())
+    return extract_words_with_boxes_batch([image])[0]
 
 
-def group_boxes(word_data: List[Tuple[str, Tuple[int, int, int, int]]], words_to_highlight: set) -> List[List[Tuple[int, int, int, int]]]:
+def group_boxes(page_words: PageWords, highlighted: np.ndarray, dpi: int = 300) -> np.ndarray:
     """
     Group adjacent word boxes into larger regions.
+    A group is a run of consecutive highlighted words, each starting within
+    1/6 inch (50 pixels at 300 DPI) of the right edge of the word before it.
     
     Args:
-        word_data: List of (word, bbox) tuples
-        words_to_highlight: Set of words to highlight
+        page_words: OCR words of the page
+        highlighted: Boolean mask of the words to highlight, one entry per word
+        dpi: Resolution of the image the boxes were measured on
         
     Returns:
-        List of lists of bounding boxes
+        (G, 4) int32 array of group extents as (min_x, min_y, max_x, max_y)
     """
-    groups = []
-    current_group = []
-    
-    for word, bbox in word_data:
-        if normalize_word(word) in words_to_highlight:
-            if not current_group:
-                current_group.append(bbox)
-            else:
-                last_bbox = current_group[-1]
-                # Check if current word is adjacent to the last word
-                if abs(bbox[0] - (last_bbox[0] + last_bbox[2])) < 50:  # 50 pixels threshold
-                    current_group.append(bbox)
-                else:
-                    if current_group:
-                        groups.append(current_group)
-                    current_group = [bbox]
-        else:
-            if current_group:
-                groups.append(current_group)
-            current_group = []
+    boxes = page_words.boxes
+    num_words = len(page_words.norms)
+    highlighted_idx = np.flatnonzero(highlighted)
+    if highlighted_idx.size == 0:
+        return np.empty((0, 4), dtype=np.int32)
     
-    if current_group:
-        groups.append(current_group)
+    # A highlighted word extends the previous word's group if that word is highlighted and adjacent to it
+    adjacent = np.abs(boxes[1:, 0] - (boxes[:-1, 0] + boxes[:-1, 2])) < dpi / 6  # 1/6 inch threshold
+    continues = np.zeros(num_words, dtype=bool)
+    continues[1:] = highlighted[:-1] & adjacent
     
-    return groups
+    # Groups are contiguous runs of the highlighted boxes, so their extents reduce in one pass each
+    group_starts = np.flatnonzero(~continues[highlighted_idx])
+    grouped = boxes[highlighted_idx]
+    mins = np.minimum.reduceat(grouped[:, :2], group_starts, axis=0)
+    maxs = np.maximum.reduceat(grouped[:, :2] + grouped[:, 2:], group_starts, axis=0)
+    return np.hstack([mins, maxs])
 
 
-def highlight_words_on_image(image: Image.Image, words_to_highlight: set, word_data: List[Tuple[str, Tuple[int, int, int, int]]]) -> Image.Image:
+def highlight_words_on_image(image: Image.Image, highlighted: np.ndarray, page_words: PageWords, scale: float = 1.0, dpi: int = 300) -> Image.Image:
     """
-    Draw highlights directly on the image for the specified words.
+    Draw highlights for the specified words onto a copy of the image.
+    Only the pixels inside each group's box are touched, through slices of the pixel array.
     
     Args:
-        image: PIL image to highlight
-        words_to_highlight: Set of words to highlight
-        word_data: List of (word, bbox) tuples
+        image: PIL image to highlight (not modified)
+        highlighted: Boolean mask of the words to highlight, one entry per word
+        page_words: OCR words of the page
+        scale: Factor from page_words box coordinates to image coordinates
+        dpi: Resolution the page_words boxes were measured at
         
     Returns:
-        PIL image with highlights
+        New RGB PIL image with highlights
     """
-    # Ensure image is in RGBA mode
-    if image.mode != 'RGBA':
-        image = image.convert('RGBA')
-    
-    draw = ImageDraw.Draw(image, 'RGBA')
-    words_to_highlight = set(normalize_word(word) for word in words_to_highlight)
+    arr = np.array(image if image.mode == 'RGB' else image.convert('RGB'))
+    height, width = arr.shape[:2]
     
-    logger.debug(f"Words to highlight: {words_to_highlight}")
-    logger.debug(f"Word data length: {len(word_data)}")
+    logger.debug(f"Words to highlight: {int(highlighted.sum())} of {len(page_words.words)}")
     
     # Group adjacent word boxes
-    groups = group_boxes(word_data, words_to_highlight)
+    groups = group_boxes(page_words, highlighted, dpi)
+    if scale != 1.0:
+        # Boxes come from the OCR rendering, which can be at a different resolution than the image
+        groups = np.rint(groups * scale).astype(np.int32)
     logger.debug(f"Found {len(groups)} groups of similar text")
     
+    # Add padding, then clip to the page (negative slice bounds would wrap around); box ends are inclusive
+    padding = 5
+    groups = groups + np.array([-padding, -padding, padding + 1, padding + 1], dtype=np.int32)
+    groups[:, 0::2] = groups[:, 0::2].clip(0, width)
+    groups[:, 1::2] = groups[:, 1::2].clip(0, height)
+    
     highlighted_count = 0
-    for group in groups:
-        if not group:
+    for min_x, min_y, max_x, max_y in groups.tolist():
+        if min_x >= max_x or min_y >= max_y:
             continue
-            
-        # Calculate the bounding box for the entire group
-        min_x = min(bbox[0] for bbox in group)
-        min_y = min(bbox[1] for bbox in group)
-        max_x = max(bbox[0] + bbox[2] for bbox in group)
-        max_y = max(bbox[1] + bbox[3] for bbox in group)
-        
-        # Add padding
-        padding = 5
-        min_x -= padding
-        min_y -= padding
-        max_x += padding
-        max_y += padding
-        
-        # Draw highlight for the group
-        overlay = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        overlay_draw = ImageDraw.Draw(overlay)
-        overlay_draw.rectangle(
-            [(min_x, min_y), (max_x, max_y)],
-            fill=(255, 0, 0, 128),     # Red with 50% opacity
-            outline=(255, 0, 0, 255),  # Solid red outline
-            width=2
-        )
-        image = Image.alpha_composite(image, overlay)
+        # Red with 50% opacity, then a solid 2 px red outline
+        region = arr[min_y:max_y, min_x:max_x]
+        region[:] = region * (1 - _HIGHLIGHT_ALPHA) + _HIGHLIGHT_TINT
+        region[:2] = _HIGHLIGHT_OUTLINE
+        region[-2:] = _HIGHLIGHT_OUTLINE
+        region[:, :2] = _HIGHLIGHT_OUTLINE
+        region[:, -2:] = _HIGHLIGHT_OUTLINE
         highlighted_count += 1
     
     logger.debug(f"Highlighted {highlighted_count} groups of similar text")
-    return image
+    return Image.fromarray(arr)
+
+
+def matching_word_masks(words1: PageWords, words2: PageWords) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the words two pages have in common in the same order.
+    Only words inside the matching blocks of the two normalized word sequences are marked,
+    so a word that merely occurs somewhere on both pages is not highlighted.
+    
+    Args:
+        words1: OCR words of the first page
+        words2: OCR words of the second page
+        
+    Returns:
+        Boolean masks over the words of each page
+    """
+    mask1 = np.zeros(len(words1.norms), dtype=bool)
+    mask2 = np.zeros(len(words2.norms), dtype=bool)
+    # autojunk stops very frequent words (e.g. "the" on a long page) from anchoring matches on their own
+    matcher = SequenceMatcher(a=words1.norms, b=words2.norms, autojunk=True)
+    for start1, start2, size in matcher.get_matching_blocks():
+        mask1[start1:start1 + size] = True
+        mask2[start2:start2 + size] = True
+    return mask1, mask2
 
 
 def calculate_similarity_score(words1_set: set, words2_set: set) -> float:
@@ -246,16 +394,42 @@ def calculate_similarity_score(words1_set: set, words2_set: set) -> float:
     Returns:
         Jaccard similarity score (0-1)
     """
-    intersection = len(words1_set.intersection(words2_set))
-    union = len(words1_set.union(words2_set))
+    intersection = len(words1_set & words2_set)
+    # |A ∪ B| = |A| + |B| - |A ∩ B|, so the union set never has to be built
+    union = len(words1_set) + len(words2_set) - intersection
     return intersection / union if union > 0 else 0.0
 
 
-@router.post("/")
+def render_identical_pages(path: str) -> List[Dict[str, Any]]:
+    """
+    Render the pages of a document compared against an identical copy of itself.
+    No OCR or highlighting is needed: every page matches exactly.
+    
+    Args:
+        path: Path to the PDF file
+        
+    Returns:
+        Page entries with image URLs and a similarity of 1.0
+    """
+    pages = []
+    unique_id = str(uuid.uuid4())[:8]
+    with fitz.open(path) as doc:
+        for i in range(len(doc)):
+            img_path = os.path.join(TEMP_DIR, f"same_page{i}_{unique_id}.png")
+            render_page(doc[i], dpi=settings.COMPARE_DISPLAY_DPI).save(img_path, "PNG", compress_level=1)
+            pages.append({
+                "pageNumber": i + 1,
+                "imageUrl": f"/compare/tmp/{os.path.basename(img_path)}",
+                "similarity": 1.0
+            })
+    return pages
+
+
+@router.post("/", response_class=ORJSONResponse)
 async def compare_documents(
     file1: UploadFile = File(...),
     file2: UploadFile = File(...)
-) -> Dict[str, Any]:
+) -> ORJSONResponse:
     """
     Compare two PDF documents and highlight similarities.
     
@@ -269,17 +443,41 @@ async def compare_documents(
     Raises:
         HTTPException: If comparison fails
     """
+    # Save uploaded files temporarily; the prefix keeps two uploads with the same name apart
+    path1 = os.path.join(SCRATCH_DIR, f"{uuid.uuid4()}_{file1.filename}")
+    path2 = os.path.join(SCRATCH_DIR, f"{uuid.uuid4()}_{file2.filename}")
     try:
         logger.debug("Starting document comparison")
-        # Save uploaded files temporarily
-        path1 = os.path.join(TEMP_DIR, file1.filename)
-        path2 = os.path.join(TEMP_DIR, file2.filename)
         
         # Ensure files are written before attempting to read for TF-IDF
-        with open(path1, "wb") as f_wb1:
-            f_wb1.write(await file1.read())
-        with open(path2, "wb") as f_wb2:
-            f_wb2.write(await file2.read())
+        # Both uploads are copied at once, each in its own worker thread
+        await asyncio.gather(
+            asyncio.to_thread(save_upload, file1, path1),
+            asyncio.to_thread(save_upload, file2, path2),
+        )
+
+        # Byte-identical uploads are common when deduplicating; they need no TF-IDF, OCR or highlighting
+        fingerprint1, fingerprint2 = await asyncio.gather(
+            asyncio.to_thread(file_fingerprint, path1),
+            asyncio.to_thread(file_fingerprint, path2),
+        )
+        if fingerprint1 == fingerprint2:
+            logger.debug(f"Uploaded files are identical ({fingerprint1}); skipping OCR comparison")
+            pages = await asyncio.to_thread(render_identical_pages, path1)
+            return ORJSONResponse({
+                "doc1": {
+                    "text": "Documents are identical",
+                    "filename": file1.filename,
+                    "pages": pages
+                },
+                "doc2": {
+                    "text": "Documents are identical",
+                    "filename": file2.filename,
+                    "pages": pages
+                },
+                "similarity": 1.0,
+                "ocr_similarity": 1.0
+            })
 
         # Calculate TF-IDF based document similarity
         tfidf_similarity = 0.0
@@ -300,92 +498,98 @@ async def compare_documents(
             logger.error(f"Error calculating TF-IDF similarity: {e}", exc_info=True)
             # Continue with OCR comparison even if TF-IDF fails
 
-        logger.debug("Converting PDFs to images for OCR-based comparison")
-        # Convert PDFs to images with higher DPI for better OCR
-        pages1 = convert_from_path(path1, dpi=300)
-        pages2 = convert_from_path(path2, dpi=300)
-
-        logger.debug(f"Processing {len(pages1)} pages from first document")
-        logger.debug(f"Processing {len(pages2)} pages from second document")
-
         doc1_pages = []
         doc2_pages = []
         total_similarity = 0.0
         total_pages = 0
-        preserved_files = set()  # Track files to preserve
-
-        # Process each page
-        for i, (page1, page2) in enumerate(zip(pages1, pages2)):
-            logger.debug(f"Processing page {i+1}")
-            
-            # Convert to RGB if needed
-            if page1.mode != 'RGB':
-                page1 = page1.convert('RGB')
-            if page2.mode != 'RGB':
-                page2 = page2.convert('RGB')
-            
-            # Get OCR words and their positions
-            words1 = extract_words_with_boxes(page1)
-            words2 = extract_words_with_boxes(page2)
-            
-            # Get normalized words from each page
-            words1_set = set(normalize_word(word) for word, _ in words1)
-            words2_set = set(normalize_word(word) for word, _ in words2)
-            
-            # Calculate page similarity
-            page_similarity = calculate_similarity_score(words1_set, words2_set)
-            total_similarity += page_similarity
-            total_pages += 1
-            
-            logger.debug(f"Page {i+1} similarity: {page_similarity:.2f}")
-            
-            # Find common words (similarities)
-            common = words1_set.intersection(words2_set)
-            
-            logger.debug(f"Page {i+1} common words: {len(common)}")
-            logger.debug(f"Sample common words: {list(common)[:5]}")
-            
-            # Convert images to RGBA for highlighting
-            page1_rgba = page1.convert('RGBA')
-            page2_rgba = page2.convert('RGBA')
-            
-            # Highlight common words on images
-            highlighted1 = highlight_words_on_image(page1_rgba, common, words1)
-            highlighted2 = highlight_words_on_image(page2_rgba, common, words2)
-            
-            # Save highlighted images
-            unique_id = str(uuid.uuid4())[:8]
-            img_path1 = os.path.join(TEMP_DIR, f"doc1_page{i}_{unique_id}.png")
-            img_path2 = os.path.join(TEMP_DIR, f"doc2_page{i}_{unique_id}.png")
-            highlighted1.save(img_path1, "PNG")
-            highlighted2.save(img_path2, "PNG")
-            
-            # Add to preserved files
-            preserved_files.add(os.path.basename(img_path1))
-            preserved_files.add(os.path.basename(img_path2))
-            
-            doc1_pages.append({
-                "pageNumber": i + 1,
-                "imageUrl": f"/compare/tmp/{os.path.basename(img_path1)}",
-                "similarity": round(page_similarity, 4)
-            })
-            
-            doc2_pages.append({
-                "pageNumber": i + 1,
-                "imageUrl": f"/compare/tmp/{os.path.basename(img_path2)}",
-                "similarity": round(page_similarity, 4)
-            })
+        save_futures = []  # Pending PNG writes, awaited before responding
+
+        # Pages are rendered, OCR'd, highlighted and saved a window at a time, so only one
+        # window of page images is in memory however long the documents are.
+        # OCR runs on grayscale ANALYSIS_DPI renderings; the highlighted pages are rendered
+        # separately in RGB at COMPARE_DISPLAY_DPI and the word boxes scaled to match.
+        box_scale = settings.COMPARE_DISPLAY_DPI / settings.ANALYSIS_DPI
+        window_size = max(1, settings.OCR_CONCURRENCY)
+        loop = asyncio.get_running_loop()
+        with fitz.open(path1) as doc1, fitz.open(path2) as doc2, \
+                ThreadPoolExecutor(max_workers=window_size) as executor:
+            logger.debug(f"Processing {len(doc1)} pages from first document")
+            logger.debug(f"Processing {len(doc2)} pages from second document")
+            page_count = min(len(doc1), len(doc2))
+
+            for window_start in range(0, page_count, window_size):
+                indices = range(window_start, min(window_start + window_size, page_count))
+                ocr_pairs = [
+                    [render_page(doc[i], dpi=settings.ANALYSIS_DPI, grayscale=True) for doc in (doc1, doc2)]
+                    for i in indices
+                ]
+                # OCR the window's page pairs in parallel; each pair is a single OCR batch
+                window_words = await asyncio.gather(*(
+                    loop.run_in_executor(executor, extract_words_with_boxes_batch, pair) for pair in ocr_pairs
+                ))
+                del ocr_pairs
+
+                for offset, i in enumerate(indices):
+                    logger.debug(f"Processing page {i+1}")
+                    page1 = render_page(doc1[i], dpi=settings.COMPARE_DISPLAY_DPI)
+                    page2 = render_page(doc2[i], dpi=settings.COMPARE_DISPLAY_DPI)
+                    
+                    # OCR words and their positions
+                    words1, words2 = window_words[offset]
+                    
+                    # Get normalized words from each page
+                    words1_set = set(words1.norms)
+                    words2_set = set(words2.norms)
+                    
+                    # Calculate page similarity
+                    page_similarity = calculate_similarity_score(words1_set, words2_set)
+                    total_similarity += page_similarity
+                    total_pages += 1
+                    
+                    logger.debug(f"Page {i+1} similarity: {page_similarity:.2f}")
+                    
+                    # Find the text the pages share in the same order (similarities)
+                    matched1, matched2 = matching_word_masks(words1, words2)
+                    
+                    logger.debug(f"Page {i+1} matched words: {int(matched1.sum())}")
+                    
+                    # Highlight matched words on images
+                    highlighted1 = highlight_words_on_image(page1, matched1, words1, box_scale, settings.ANALYSIS_DPI)
+                    highlighted2 = highlight_words_on_image(page2, matched2, words2, box_scale, settings.ANALYSIS_DPI)
+                    
+                    # Save highlighted images
+                    unique_id = str(uuid.uuid4())[:8]
+                    img_path1 = os.path.join(TEMP_DIR, f"doc1_page{i}_{unique_id}.png")
+                    img_path2 = os.path.join(TEMP_DIR, f"doc2_page{i}_{unique_id}.png")
+                    # zlib level 1 encodes several times faster than the default 6 for slightly larger files
+                    save_futures.append(_ENCODER.submit(highlighted1.save, img_path1, "PNG", compress_level=1))
+                    save_futures.append(_ENCODER.submit(highlighted2.save, img_path2, "PNG", compress_level=1))
+                    
+                    doc1_pages.append({
+                        "pageNumber": i + 1,
+                        "imageUrl": f"/compare/tmp/{os.path.basename(img_path1)}",
+                        "similarity": page_similarity
+                    })
+                    
+                    doc2_pages.append({
+                        "pageNumber": i + 1,
+                        "imageUrl": f"/compare/tmp/{os.path.basename(img_path2)}",
+                        "similarity": page_similarity
+                    })
+
+                # Drop this window's images before rendering the next one
+                del window_words, page1, page2, highlighted1, highlighted2
+
+        # The image URLs are only valid once their files are written
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in save_futures))
 
         # Calculate overall OCR-based similarity (average of page Jaccard scores)
         ocr_overall_similarity = total_similarity / total_pages if total_pages > 0 else 0.0
         logger.debug(f"Overall OCR-based document similarity: {ocr_overall_similarity:.2f}")
 
-        # Clean up only the PDF files, preserve the processed images
-        os.unlink(path1)
-        os.unlink(path2)
-        cleanup_old_temp_files(TEMP_DIR, max_age_hours=1, preserve_files=preserved_files)
-
-        return {
+        # Returned as a response directly so orjson serializes it without a jsonable_encoder pass;
+        # similarities are sent at full precision and formatted by the client
+        return ORJSONResponse({
             "doc1": {
                 "text": "Highlighted similarities shown in images",
                 "filename": file1.filename,
@@ -396,10 +600,19 @@ async def compare_documents(
                 "filename": file2.filename,
                 "pages": doc2_pages
             },
-            "similarity": round(tfidf_similarity, 4),  # TF-IDF based overall document similarity
-            "ocr_similarity": round(ocr_overall_similarity, 4) # OCR based average page similarity
-        }
+            "similarity": float(tfidf_similarity),  # TF-IDF based overall document similarity
+            "ocr_similarity": ocr_overall_similarity  # OCR based average page similarity
+        })
 
     except Exception as e:
         logger.error(f"Comparison failed: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Comparison failed: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Comparison failed: {e}")
+    finally:
+        # Only the uploaded PDFs are removed here; the processed images are swept by the app's periodic temp cleanup
+        for path in (path1, path2):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e_clean:
+                logger.warning(f"Failed to clean up temp file {path}: {e_clean}")
\ No newline at end of file
@@ -4,17 +4,28 @@ Provides routes for medical content analysis, document clustering, and topic mod
 """
 
 import os
+import re
+import hashlib
 import uuid
+import atexit
+import asyncio
 import logging
+import multiprocessing
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Body
 from fastapi.responses import FileResponse, JSONResponse
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import tempfile
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.decomposition import NMF, MiniBatchNMF
 
 from backend.services.extractor import extract_text_and_pages, analyze_document_content
-from ingestion.preprocessing import measure_medical_confidence, extract_medical_terms
+from ingestion.preprocessing import measure_medical_confidence, extract_medical_terms, detect_section_headers
 from utils.config import settings
 from backend.services.medical_analyzer_service import detect_specialty, determine_document_specialty
+from backend.api.common import save_upload
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -22,6 +33,123 @@ logger = logging.getLogger(__name__)
 # Create router
 router = APIRouter(prefix="/data-science", tags=["Data Science"])
 
+# Term fragments used to bucket medical terms in /content
+MEDICATION_SUFFIXES = ('mg', 'mcg', 'ml', 'g')
+CONDITION_MARKERS = ('itis', 'osis', 'emia')
+PROCEDURE_MARKERS = ('ectomy', 'otomy', 'plasty', 'scopy')
+
+# Classifies a lowercased term in one match; the alternatives are tried in priority order
+# (medication suffix, then condition marker, then procedure marker) and lastgroup names the bucket
+_TERM_CATEGORY_RE = re.compile(
+    r"(?=.*(?:%s)\Z)(?P<medication>)|(?=.*(?:%s))(?P<condition>)|(?=.*(?:%s))(?P<procedure>)" % (
+        "|".join(MEDICATION_SUFFIXES), "|".join(CONDITION_MARKERS), "|".join(PROCEDURE_MARKERS)
+    ),
+    re.DOTALL
+)
+
+# Only the first characters of each document feed the topic model, bounding tokenization cost
+TOPIC_TEXT_MAX_CHARS = 200_000
+
+# Topic models over at least this many documents are fitted in mini-batches of this size
+TOPIC_MINIBATCH_SIZE = 128
+
+# Topics of recently analyzed corpora, keyed by topic count and the digests of the texts in order
+_TOPIC_CACHE_SIZE = 32
+_TOPIC_CACHE: "OrderedDict[Tuple, List[Dict[str, Any]]]" = OrderedDict()
+
+# Process pool for PDF text extraction across uploaded files, created lazily.
+_EXTRACTOR_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _get_extractor_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Return the process pool used to extract several uploaded PDFs at once,
+    or None to fall back to the event loop's default thread pool.
+    """
+    global _EXTRACTOR_POOL
+    if settings.PAGE_WORKERS <= 1 or multiprocessing.current_process().daemon:
+        return None
+    if _EXTRACTOR_POOL is None:
+        _EXTRACTOR_POOL = ProcessPoolExecutor(max_workers=settings.PAGE_WORKERS)
+        atexit.register(_EXTRACTOR_POOL.shutdown)
+    return _EXTRACTOR_POOL
+
+
+def _analyze_document_file(pdf_path: str) -> Optional[Tuple[str, int, List[str], List[str]]]:
+    """
+    Extract a PDF and compute the per-document statistics used by /content.
+    Runs in an extractor pool worker, so only the text and its summary cross back
+    to the request, not the per-page data.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        
+    Returns:
+        Tuple of (full_text, word count, medical terms, lowercased section names),
+        or None if no text could be extracted
+    """
+    full_text, _ = extract_text_and_pages(pdf_path)
+    if not full_text:
+        return None
+    sections = detect_section_headers(full_text)
+    return (
+        full_text,
+        len(full_text.split()),
+        extract_medical_terms(full_text),
+        [section["section"].lower() for section in sections]
+    )
+
+
+def _extract_topics(texts: List[str], n_topics: int) -> List[Dict[str, Any]]:
+    """
+    Fit a TF-IDF + NMF topic model over the texts and describe each topic by its top words.
+    Results are memoized by the texts' digests, so re-uploading the same documents skips the fit.
+    
+    Args:
+        texts: Document texts, already truncated to TOPIC_TEXT_MAX_CHARS
+        n_topics: Number of topics to extract
+        
+    Returns:
+        List of topics with their id, top 10 words and mean weight
+    """
+    corpus_key = (n_topics,) + tuple(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest() for text in texts
+    )
+    topics = _TOPIC_CACHE.get(corpus_key)
+    if topics is not None:
+        _TOPIC_CACHE.move_to_end(corpus_key)
+        return topics
+    
+    # Create TF-IDF representation
+    vectorizer = TfidfVectorizer(max_features=1000, stop_words='english', dtype=np.float32)
+    tfidf = vectorizer.fit_transform(texts)
+    
+    # Extract topics
+    if tfidf.shape[0] >= TOPIC_MINIBATCH_SIZE:
+        # Mini-batch updates avoid a full-matrix product per iteration on large uploads
+        nmf = MiniBatchNMF(n_components=n_topics, batch_size=TOPIC_MINIBATCH_SIZE, init="nndsvda", random_state=42)
+    else:
+        nmf = NMF(n_components=n_topics, random_state=42)
+    nmf.fit(tfidf)
+    
+    # Get feature names
+    feature_names = vectorizer.get_feature_names_out()
+    
+    # Create topics
+    topics = []
+    for topic_idx, topic in enumerate(nmf.components_):
+        top_words = [feature_names[i] for i in topic.argsort()[:-11:-1]]
+        topics.append({
+            "topic_id": topic_idx,
+            "words": top_words,
+            "weight": float(topic.sum() / topic.size)
+        })
+    
+    _TOPIC_CACHE[corpus_key] = topics
+    if len(_TOPIC_CACHE) > _TOPIC_CACHE_SIZE:
+        _TOPIC_CACHE.popitem(last=False)
+    return topics
+
 
 @router.post("/medical")
 async def analyze_medical_content(file: UploadFile = File(...)):
@@ -38,47 +166,49 @@ async def analyze_medical_content(file: UploadFile = File(...)):
         HTTPException: If analysis fails
     """
     try:
-        # Save uploaded file temporarily
-        temp_path = f"storage/tmp/{uuid.uuid4()}_{file.filename}"
-        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-        
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Extract document content
-        full_text, pages_data = extract_text_and_pages(temp_path)
-        
-        # Check if text extraction was successful
-        if not full_text:
-            raise HTTPException(status_code=400, detail="Could not extract text from document")
-        
-        # Analyze document
-        doc_analysis = analyze_document_content(temp_path)
-        
-        # Analyze pages for medical content
-        pages_analysis = []
-        medical_pages = 0
-        
-        for i, page in enumerate(pages_data):
-            page_text = page.get("text", "")
-            medical_confidence = page.get("medical_confidence", 0.0)
-            medical_terms = page.get("medical_terms", [])
+        # Save uploaded file to a per-request directory that is removed however the analysis ends
+        os.makedirs(settings.SCRATCH_PATH, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=settings.SCRATCH_PATH) as temp_dir:
+            temp_path = os.path.join(temp_dir, file.filename)
+            
+            await asyncio.to_thread(save_upload, file, temp_path)
             
-            # Determine if page is medical
-            is_medical = medical_confidence > 0.6
-            if is_medical:
-                medical_pages += 1
+            # Extract document content
+            full_text, pages_data = extract_text_and_pages(temp_path)
+            
+            # Check if text extraction was successful
+            if not full_text:
+                raise HTTPException(status_code=400, detail="Could not extract text from document")
             
-            # Add page analysis
-            pages_analysis.append({
+            # Analyze document
+            doc_analysis = analyze_document_content(temp_path)
+        
+        # Analyze pages for medical content
+        page_texts = [page.get("text", "") for page in pages_data]
+        page_terms = [page.get("medical_terms", []) for page in pages_data]
+        confidences = [page.get("medical_confidence", 0.0) for page in pages_data]
+        
+        # Determine which pages are medical and their term ratios for all pages at once
+        is_medical_mask = np.asarray(confidences, dtype=np.float64) > 0.6
+        medical_pages = int(is_medical_mask.sum())
+        term_counts = np.array([len(terms) for terms in page_terms], dtype=np.float64)
+        word_counts = np.array([len(text.split()) for text in page_texts], dtype=np.float64)
+        term_ratios = np.divide(term_counts, word_counts, out=np.zeros_like(term_counts), where=word_counts > 0)
+        
+        # Add page analysis; specialty detection only runs on medical pages
+        pages_analysis = [
+            {
                 "page_num": i + 1,
                 "is_medical": is_medical,
                 "confidence": medical_confidence,
                 "specialty": detect_specialty(page_text, medical_terms) if is_medical else None,
-                "term_ratio": len(medical_terms) / len(page_text.split()) if page_text else 0,
+                "term_ratio": term_ratio,
                 "terms": medical_terms[:20] if len(medical_terms) > 0 else None
-            })
+            }
+            for i, (page_text, medical_terms, medical_confidence, is_medical, term_ratio) in enumerate(
+                zip(page_texts, page_terms, confidences, is_medical_mask.tolist(), term_ratios.tolist())
+            )
+        ]
         
         # Determine the overall specialty
         overall_specialty = determine_document_specialty(pages_analysis)
@@ -97,12 +227,6 @@ async def analyze_medical_content(file: UploadFile = File(...)):
             "pages": pages_analysis
         }
         
-        # Clean up
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
-        
         return result
         
     except HTTPException:
@@ -131,53 +255,43 @@ async def analyze_content(files: List[UploadFile] = File(...)):
         if not files:
             raise HTTPException(status_code=400, detail="No files uploaded")
         
-        # Save uploaded files temporarily
-        temp_paths = []
-        
-        for file in files:
-            temp_path = f"storage/tmp/{uuid.uuid4()}_{file.filename}"
-            os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+        # Save uploaded files to a per-request directory that is removed however the analysis ends
+        os.makedirs(settings.SCRATCH_PATH, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=settings.SCRATCH_PATH) as temp_dir:
+            temp_paths = [os.path.join(temp_dir, f"{i}_{file.filename}") for i, file in enumerate(files)]
+            await asyncio.gather(*[
+                asyncio.to_thread(save_upload, file, temp_path)
+                for file, temp_path in zip(files, temp_paths)
+            ])
             
-            with open(temp_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-                
-            temp_paths.append(temp_path)
+            # Extract and analyze all documents concurrently; PDF parsing is CPU-bound and independent per file.
+            # Scanned pages fall back to Tesseract, so at most OCR_CONCURRENCY files are in flight per request.
+            loop = asyncio.get_running_loop()
+            pool = _get_extractor_pool()
+            semaphore = asyncio.Semaphore(max(1, settings.OCR_CONCURRENCY))
+            
+            async def analyze_file(temp_path: str):
+                async with semaphore:
+                    return await loop.run_in_executor(pool, _analyze_document_file, temp_path)
+            
+            analyzed = await asyncio.gather(*[analyze_file(temp_path) for temp_path in temp_paths])
         
         # Process documents
         all_texts = []
         all_terms = []
-        section_counts = {}
+        section_counts = Counter()
         avg_word_count = 0
         
-        for temp_path in temp_paths:
-            # Extract document content
-            full_text, pages_data = extract_text_and_pages(temp_path)
-            
+        for document in analyzed:
             # Skip if text extraction failed
-            if not full_text:
+            if document is None:
                 continue
-                
-            all_texts.append(full_text)
             
-            # Count words
-            word_count = len(full_text.split())
+            full_text, word_count, terms, section_names = document
+            all_texts.append(full_text)
             avg_word_count += word_count
-            
-            # Extract medical terms
-            terms = extract_medical_terms(full_text)
             all_terms.extend(terms)
-            
-            # Detect sections
-            from ingestion.preprocessing import detect_section_headers
-            sections = detect_section_headers(full_text)
-            
-            for section in sections:
-                section_name = section["section"].lower()
-                if section_name in section_counts:
-                    section_counts[section_name] += 1
-                else:
-                    section_counts[section_name] = 1
+            section_counts.update(section_names)
         
         # Calculate average word count
         avg_word_count = avg_word_count / len(all_texts) if all_texts else 0
@@ -185,87 +299,36 @@ async def analyze_content(files: List[UploadFile] = File(...)):
         # Extract topics using a simple TF-IDF approach
         topics = []
         if all_texts:
-            from sklearn.feature_extraction.text import TfidfVectorizer
-            from sklearn.decomposition import NMF
-            
             # Number of topics to extract
             n_topics = min(5, len(all_texts))
             
             if n_topics > 1:
-                # Create TF-IDF representation
-                vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
-                tfidf = vectorizer.fit_transform(all_texts)
-                
-                # Extract topics
-                nmf = NMF(n_components=n_topics, random_state=42)
-                nmf.fit(tfidf)
-                
-                # Get feature names
-                feature_names = vectorizer.get_feature_names_out()
-                
-                # Create topics
-                for topic_idx, topic in enumerate(nmf.components_):
-                    top_words = [feature_names[i] for i in topic.argsort()[:-11:-1]]
-                    topics.append({
-                        "topic_id": topic_idx,
-                        "words": top_words,
-                        "weight": float(topic.sum() / topic.size)
-                    })
+                topics = _extract_topics([text[:TOPIC_TEXT_MAX_CHARS] for text in all_texts], n_topics)
         
         # Process medical terms
-        term_counts = {}
-        medication_counts = {}
-        condition_counts = {}
-        procedure_counts = {}
-        
-        for term in all_terms:
-            term_lower = term.lower()
-            
-            # Count general medical terms
-            if term_lower in term_counts:
-                term_counts[term_lower] += 1
-            else:
-                term_counts[term_lower] = 1
-            
-            # Attempt to categorize term
-            if term_lower.endswith(('mg', 'mcg', 'ml', 'g')):
-                # Likely a medication
-                if term_lower in medication_counts:
-                    medication_counts[term_lower] += 1
-                else:
-                    medication_counts[term_lower] = 1
-            elif any(suffix in term_lower for suffix in ('itis', 'osis', 'emia')):
-                # Likely a condition
-                if term_lower in condition_counts:
-                    condition_counts[term_lower] += 1
-                else:
-                    condition_counts[term_lower] = 1
-            elif any(suffix in term_lower for suffix in ('ectomy', 'otomy', 'plasty', 'scopy')):
-                # Likely a procedure
-                if term_lower in procedure_counts:
-                    procedure_counts[term_lower] += 1
-                else:
-                    procedure_counts[term_lower] = 1
-        
-        # Format section data
-        sections_data = []
-        for section_name, count in section_counts.items():
-            sections_data.append({
-                "name": section_name,
-                "count": count
-            })
-        
-        # Sort sections by frequency
-        sections_data.sort(key=lambda x: x["count"], reverse=True)
-        
-        # Format term data
-        def format_term_counts(counts_dict):
-            return [{"term": term, "count": count} for term, count in sorted(counts_dict.items(), key=lambda x: x[1], reverse=True)]
-        
-        medical_terms = format_term_counts(term_counts)
-        medications = format_term_counts(medication_counts)
-        conditions = format_term_counts(condition_counts)
-        procedures = format_term_counts(procedure_counts)
+        term_counts = Counter(term.lower() for term in all_terms)
+        category_counts = {"medication": Counter(), "condition": Counter(), "procedure": Counter()}
+        
+        # Categorize each distinct term once: likely a medication, condition or procedure
+        for term_lower, count in term_counts.items():
+            match = _TERM_CATEGORY_RE.match(term_lower)
+            if match:
+                category_counts[match.lastgroup][term_lower] = count
+        medication_counts = category_counts["medication"]
+        condition_counts = category_counts["condition"]
+        procedure_counts = category_counts["procedure"]
+        
+        # Format section data, sorted by frequency
+        sections_data = [{"name": section_name, "count": count} for section_name, count in section_counts.most_common()]
+        
+        # Format term data; most_common(k) keeps a k-sized heap instead of sorting every distinct term
+        def format_term_counts(counts: Counter, k: int):
+            return [{"term": term, "count": count} for term, count in counts.most_common(k)]
+        
+        medical_terms = format_term_counts(term_counts, 50)
+        medications = format_term_counts(medication_counts, 30)
+        conditions = format_term_counts(condition_counts, 30)
+        procedures = format_term_counts(procedure_counts, 30)
         
         # Create response
         result = {
@@ -274,21 +337,14 @@ async def analyze_content(files: List[UploadFile] = File(...)):
             "total_documents": len(all_texts),
             "topics": topics,
             "sections": sections_data,
-            "medical_terms": medical_terms[:50],
-            "medications": medications[:30],
-            "conditions": conditions[:30],
-            "procedures": procedures[:30],
+            "medical_terms": medical_terms,
+            "medications": medications,
+            "conditions": conditions,
+            "procedures": procedures,
             "average_document_length": avg_word_count,
             "average_word_count": avg_word_count
         }
         
-        # Clean up
-        for temp_path in temp_paths:
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-        
         return result
         
     except HTTPException:
@@ -297,6 +353,3 @@ async def analyze_content(files: List[UploadFile] = File(...)):
         logger.error(f"Content analysis failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Content analysis failed: {str(e)}")
 
-
-# Helper functions
-# calculate_node_positions function has been moved to backend.services.clustering_service
\ No newline at end of file
@@ -1,13 +1,14 @@
 """
 API endpoints for performing actions and retrieving analysis for documents stored in the database.
 """
+import asyncio
 import logging
 from fastapi import APIRouter, HTTPException, Depends, Path
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 
 from utils.database import get_db
-from backend.services.medical_analyzer_service import analyze_document_medical_content
+from backend.services.medical_analyzer_service import analyze_document_medical_content, get_document_medical_analysis
 # We will need a Pydantic model for the response of the medical analysis
 from backend.models.schemas import DocumentMedicalAnalysisResponse # UPDATED
 
@@ -32,7 +33,8 @@ async def trigger_document_medical_analysis(
     """
     try:
         logger.info(f"Received request to trigger medical analysis for doc_id: {doc_id}")
-        analysis_summary = analyze_document_medical_content(db=db, doc_id=doc_id)
+        # Run the analysis off the event loop; the session is only used from that thread meanwhile
+        analysis_summary = await asyncio.to_thread(analyze_document_medical_content, db, doc_id)
         return analysis_summary
     except ValueError as ve:
         logger.warning(f"Value error during medical analysis for doc_id {doc_id}: {str(ve)}")
@@ -48,16 +50,13 @@ async def get_document_medical_analysis_results(
     db: Session = Depends(get_db)
 ):
     """
-    Retrieves (or re-calculates) the medical content analysis for a specified document.
-    Note: Currently, this re-runs the analysis. For pre-computed results, 
-    the service and storage mechanism would need to be adapted.
+    Retrieves the medical content analysis for a specified document.
+    The stored summary is returned while the document's content is unchanged;
+    otherwise the analysis is run (and stored) first.
     """
     try:
         logger.info(f"Received request to get medical analysis for doc_id: {doc_id}")
-        # For now, this re-runs the analysis. If analysis is computationally expensive 
-        # and results are stable post-analysis, consider storing the summary 
-        # or parts of it in DocumentMetadata or a dedicated AnalysisResults table.
-        analysis_summary = analyze_document_medical_content(db=db, doc_id=doc_id)
+        analysis_summary = await asyncio.to_thread(get_document_medical_analysis, db, doc_id)
         return analysis_summary
     except ValueError as ve:
         logger.warning(f"Value error retrieving medical analysis for doc_id {doc_id}: {str(ve)}")
@@ -3,14 +3,19 @@ Upload API endpoints for handling file uploads and analysis.
 """
 
 from fastapi import APIRouter, UploadFile, HTTPException, File
-import uuid
+from utils.ids import next_uuid
+import asyncio
 import os
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
 import logging
 
-from backend.tasks.pipeline_tasks import process_document_task
+from backend.tasks.pipeline_tasks import process_document_chain
 from backend.models.schemas import AsyncUploadResponse
+from backend.api.common import save_upload
 from utils.config import settings, get_temp_path
-from utils.duplicate_analysis import compute_document_hash, compute_document_tfidf_vector
+from utils.duplicate_analysis import compute_document_hash
+from ingestion.pdf_reader import extract_text_from_pdf
 from similarity.engine import SimilarityEngine
 from typing import List
 import tempfile
@@ -21,6 +26,33 @@ logger = logging.getLogger(__name__)
 # Create router
 router = APIRouter(tags=["Upload"])
 
+# Number of extracted batch-upload texts vectorized together by one transform call
+VECTORIZE_BATCH_SIZE = 32
+
+
+def _vectorize_pending(engine: SimilarityEngine, pending: List[dict], document_entries: List[dict]) -> None:
+    """
+    Vectorize the pending batch-upload entries with a single transform call, moving each
+    one into document_entries with its sparse TF-IDF row in place of its text.
+    
+    Args:
+        engine: Similarity engine used for vectorization
+        pending: Entries with filename, path, hash and text; emptied on return
+        document_entries: List the vectorized entries are appended to
+    """
+    vectors = engine.vectorize_batch([entry["text"] for entry in pending], as_sparse=True)
+    for entry, vector in zip(pending, vectors):
+        if vector is None:
+            logger.warning(f"Failed to compute TF-IDF vector for: {entry['filename']}")
+            continue
+            
+        document_entries.append({
+            "filename": entry["filename"],
+            "path": entry["path"],
+            "hash": entry["hash"],
+            "tfidf_vector": vector
+        })
+    pending.clear()
 
 
 @router.post("/", response_model=AsyncUploadResponse)
@@ -45,21 +77,25 @@ async def upload_document(file: UploadFile = File(...)):
 
     temp_path = None
     try:
-        doc_id = str(uuid.uuid4())
+        doc_id = next_uuid()
         temp_path = get_temp_path(f"{doc_id}_{file.filename}")
 
         logger.debug(f"Saving uploaded file to {temp_path}")
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        await asyncio.to_thread(save_upload, file, temp_path)
 
-        celery_task = process_document_task.delay(temp_path, file.filename, doc_id)
+        celery_task = process_document_chain(temp_path, file.filename, doc_id)
 
         logger.debug(f"Queued Celery task {celery_task.id} for {doc_id}")
         return {"message": "File queued for processing", "doc_id": doc_id, "task_id": celery_task.id}
 
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        # The upload was never queued, so nothing else will remove it
+        if temp_path and os.path.exists(temp_path):
+            try:
+                os.unlink(temp_path)
+            except Exception as e_clean:
+                logger.warning(f"Failed to clean up temp file {temp_path}: {e_clean}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
@@ -77,43 +113,55 @@ async def analyze_batch_folder(files: List[UploadFile] = File(...)):
     Raises:
         HTTPException: If analysis fails
     """
+    # Save uploaded files temporarily; every one is removed when the request ends
+    temp_files = []
     try:
-        # Save uploaded files temporarily
-        temp_files = []
         document_entries = []
+        os.makedirs(settings.SCRATCH_PATH, exist_ok=True)
         
+        engine = SimilarityEngine()
+        pending = []  # Uploads with their hash and text, awaiting vectorization
         for file in files:
             if not file.filename.endswith('.pdf'):
                 logger.warning(f"Skipping non-PDF file: {file.filename}")
                 continue
                 
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=settings.SCRATCH_PATH) as tmp:
+                temp_files.append(tmp.name)
                 content = await file.read()
                 if not content:
                     logger.warning(f"Skipping empty file: {file.filename}")
                     continue
                     
                 tmp.write(content)
-                temp_files.append(tmp.name)
                 
-                # Process each document
-                doc_hash = compute_document_hash(tmp.name)
-                if doc_hash is None:
-                    logger.warning(f"Failed to compute hash for: {file.filename}")
-                    continue
-                    
-                # Get document TF-IDF vector
-                vector = compute_document_tfidf_vector(tmp.name)
-                if vector is None:
-                    logger.warning(f"Failed to compute TF-IDF vector for: {file.filename}")
-                    continue
-                    
-                document_entries.append({
-                    "filename": file.filename,
-                    "path": tmp.name,
-                    "hash": doc_hash,
-                    "tfidf_vector": vector
-                })
+            # Process each document (after the file is closed, so its contents are flushed to disk)
+            doc_hash = compute_document_hash(tmp.name)
+            if doc_hash is None:
+                logger.warning(f"Failed to compute hash for: {file.filename}")
+                continue
+                
+            try:
+                text = extract_text_from_pdf(tmp.name)
+            except Exception as e:
+                logger.error(f"Error extracting text from {file.filename}: {e}")
+                text = ""
+            if not text:
+                logger.warning(f"Failed to compute TF-IDF vector for: {file.filename}")
+                continue
+                
+            pending.append({
+                "filename": file.filename,
+                "path": tmp.name,
+                "hash": doc_hash,
+                "text": text
+            })
+            # Vectorize in fixed-size batches so only a batch of extracted texts is held at once
+            if len(pending) >= VECTORIZE_BATCH_SIZE:
+                _vectorize_pending(engine, pending, document_entries)
+
+        if pending:
+            _vectorize_pending(engine, pending, document_entries)
 
         if not document_entries:
             raise HTTPException(status_code=400, detail="No valid PDF files were uploaded")
@@ -142,34 +190,25 @@ async def analyze_batch_folder(files: List[UploadFile] = File(...)):
                             "type": "exact_duplicate"
                         })
         
-        # Find near duplicates by vector similarity
-        for i in range(len(document_entries)):
-            for j in range(i+1, len(document_entries)):
-                # Skip if already identified as exact duplicates
-                if document_entries[i]["hash"] == document_entries[j]["hash"]:
-                    continue
-                    
-                # Compute similarity
-                engine = SimilarityEngine()
-                sim = engine.compute_similarity(
-                    document_entries[i]["tfidf_vector"], 
-                    document_entries[j]["tfidf_vector"]
-                )
+        # Find near duplicates by vector similarity: cosine similarity of every pair from one
+        # sparse product of the L2-normalized rows (same normalization as SimilarityEngine.compute_similarity).
+        # The hashed feature space is too wide to stack the batch densely.
+        vectors = normalize(sp.vstack([entry["tfidf_vector"] for entry in document_entries], format="csr"))
+        sims = sp.triu(vectors @ vectors.T, k=1, format="csr")
+        sims.sort_indices()
+        sims = sims.tocoo()
+        high = sims.data > 0.9  # High similarity threshold
+        for i, j, sim in zip(sims.row[high], sims.col[high], sims.data[high]):
+            # Skip if already identified as exact duplicates
+            if document_entries[i]["hash"] == document_entries[j]["hash"]:
+                continue
                 
-                if sim > 0.9:  # High similarity threshold
-                    results["near_duplicates"].append({
-                        "file1": document_entries[i]["filename"],
-                        "file2": document_entries[j]["filename"],
-                        "type": "near_duplicate",
-                        "similarity": float(sim)
-                    })
-
-        # Clean up temporary files
-        for tmp_path in temp_files:
-            try:
-                os.unlink(tmp_path)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temp file {tmp_path}: {str(e)}")
+            results["near_duplicates"].append({
+                "file1": document_entries[i]["filename"],
+                "file2": document_entries[j]["filename"],
+                "type": "near_duplicate",
+                "similarity": float(sim)
+            })
 
         # Combine results
         combined_results = results["exact_duplicates"] + results["near_duplicates"]
@@ -183,11 +222,12 @@ async def analyze_batch_folder(files: List[UploadFile] = File(...)):
     except HTTPException:
         raise
     except Exception as e:
-        # Clean up any remaining temporary files
+        logger.error(f"Batch analysis failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
+    finally:
+        # Clean up temporary files
         for tmp_path in temp_files:
             try:
                 os.unlink(tmp_path)
-            except:
-                pass
-        logger.error(f"Batch analysis failed: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
\ No newline at end of file
+            except Exception as e:
+                logger.warning(f"Failed to clean up temp file {tmp_path}: {str(e)}")
\ No newline at end of file
@@ -4,27 +4,42 @@ Creates and configures the FastAPI app with all routes and middleware.
 """
 
 import os
+import asyncio
+import logging
+import PIL
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 
 # Import API routes
 from backend.api.upload import router as upload_router
-from backend.api.compare import router as compare_router
+from backend.api.compare import router as compare_router, cleanup_old_temp_files, TEMP_DIR, SCRATCH_DIR
 from backend.api.documents import router as documents_router
 from backend.api.page import router as page_router
 from backend.api.data_science import router as data_science_router
 from backend.api.analyze import router as analyze_router
 
 # Import TF-IDF vectorizer functions
-from similarity.tfidf import fit_vectorizer_and_save
+from similarity.tfidf import fit_vectorizer_and_save, load_fitted_tfidf_vectorizer
+
+logger = logging.getLogger(__name__)
+
+# How often the temp image directory is swept for files older than an hour
+TEMP_CLEANUP_INTERVAL_SECONDS = 15 * 60
+
+# Pillow-SIMD is a drop-in replacement for Pillow; its releases carry a ".postN" version suffix
+if ".post" in PIL.__version__:
+    logger.info(f"Using Pillow-SIMD {PIL.__version__} for image conversion and compositing")
+else:
+    logger.info(f"Using Pillow {PIL.__version__}; install pillow-simd for faster image conversion and compositing")
 
 # Create the FastAPI application
 app = FastAPI(
     title="Duplicate Document Detection",
     description="A system for detecting and managing duplicate medical PDFs",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS for frontend access
@@ -54,6 +69,32 @@ app.include_router(analyze_router, prefix="/analyze")
 app.mount("/images", StaticFiles(directory="storage/page_images"), name="images")
 app.mount("/temp", StaticFiles(directory="storage/tmp"), name="temp")
 
+async def sweep_temp_files():
+    """
+    Periodically delete old comparison and analysis images from the temp directory,
+    and upload copies left in the scratch directory by crashed requests.
+    Runs for the lifetime of the app, so no request ever waits on a directory scan.
+    """
+    sweep_dirs = [TEMP_DIR] if SCRATCH_DIR == TEMP_DIR else [TEMP_DIR, SCRATCH_DIR]
+    while True:
+        try:
+            for sweep_dir in sweep_dirs:
+                await asyncio.to_thread(cleanup_old_temp_files, sweep_dir, 1)
+        except Exception as e:
+            logger.error(f"Temp file cleanup failed: {e}")
+        await asyncio.sleep(TEMP_CLEANUP_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def start_temp_file_sweeper():
+    """Start the periodic temp file cleanup."""
+    # Keep a reference so the task is not garbage collected
+    app.state.temp_sweeper = asyncio.create_task(sweep_temp_files())
+
+@app.on_event("shutdown")
+async def stop_temp_file_sweeper():
+    """Stop the periodic temp file cleanup."""
+    app.state.temp_sweeper.cancel()
+
 # Example texts to fit the vectorizer
 example_texts = [
     "This is a sample document.",
@@ -61,8 +102,10 @@ example_texts = [
     "More sample text for vectorizer fitting."
 ]
 
-# Initialize the TF-IDF vectorizer during application startup
-fit_vectorizer_and_save(example_texts)
+# Initialize the TF-IDF vectorizer during application startup, unless one has already been
+# fitted (a refit on these examples would overwrite the corpus-fitted vectorizer)
+if load_fitted_tfidf_vectorizer() is None:
+    fit_vectorizer_and_save(example_texts)
 
 @app.get("/debug/available-images")
 async def list_available_images():
@@ -1,7 +1,10 @@
 # backend/services/clustering_service.py
 import logging
 import numpy as np
+import scipy.sparse as sp
 from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import normalize
 # from sklearn.metrics.pairwise import cosine_similarity # DBSCAN with metric='cosine' handles this
 
 # Assuming your modified similarity.tfidf module has a function to get vectors
@@ -29,11 +32,11 @@ class ClusteringService:
         logger.info(f"ClusteringService initialized with DBSCAN eps: {self.dbscan_eps}, min_samples: {self.dbscan_min_samples}")
 
 
-    def _fetch_tfidf_vectors(self) -> tuple[list[str], list[str], np.ndarray | None]:
+    def _fetch_tfidf_vectors(self) -> tuple[list[str], list[str], sp.csr_matrix | None]:
         """
         Fetches all TF-IDF vectors, their corresponding document IDs, and filenames from the database.
         Returns: 
-            A tuple containing (list of document_ids, list of filenames, NumPy matrix of vectors)
+            A tuple containing (list of document_ids, list of filenames, sparse CSR matrix of vectors)
             Returns ([], [], None) if no data or error.
         """
         logger.info("Fetching TF-IDF vectors and filenames from database...")
@@ -45,7 +48,7 @@ class ClusteringService:
         try:
             with get_db() as db:
                 # Step 1: Get all document vectors
-                all_vectors_data = get_all_document_vectors(db, vector_type='tfidf')
+                all_vectors_data = get_all_document_vectors(db, vector_type='tfidf', as_sparse=True)
             
                 if not all_vectors_data:
                     logger.warning("No TF-IDF vectors found in the database.")
@@ -85,17 +88,12 @@ class ClusteringService:
                 logger.warning("No documents with both valid vectors and filenames found. Cannot perform clustering.")
                 return [], [], None
 
-            vector_matrix = np.array(final_vectors_list)
-            
-            if vector_matrix.ndim == 1 and len(final_vectors_list) == 1:
-                 vector_matrix = vector_matrix.reshape(1, -1)
-            elif vector_matrix.ndim == 1 and len(final_vectors_list) > 1:
-                logger.error(f"Vector matrix is 1D but contains {len(final_vectors_list)} vectors. This indicates inconsistent vector shapes or an issue in data.")
-                try:
-                    vector_matrix = np.vstack(final_vectors_list)
-                except ValueError as ve:
-                    logger.error(f"Failed to stack vectors into a matrix due to shape inconsistency: {ve}")
-                    return [], [], None
+            # Keep the matrix sparse; DBSCAN's cosine metric accepts CSR input
+            try:
+                vector_matrix = sp.vstack(final_vectors_list, format="csr")
+            except ValueError as ve:
+                logger.error(f"Failed to stack vectors into a matrix due to shape inconsistency: {ve}")
+                return [], [], None
 
             logger.info(f"Fetched {len(final_doc_ids)} documents with TF-IDF vectors and filenames. Matrix shape: {vector_matrix.shape}")
             return final_doc_ids, final_filenames, vector_matrix
@@ -127,6 +125,20 @@ class ClusteringService:
             logger.info(f"Successfully stored all {updated_count} cluster assignments.")
 
 
+    def _dbscan_labels(self, vector_matrix: sp.csr_matrix) -> np.ndarray:
+        """
+        Run DBSCAN over the sparse vectors via a precomputed eps-neighborhood graph.
+        The graph holds only pairs within eps (cosine distance), computed in parallel
+        chunks on the L2-normalized CSR matrix, so no dense pairwise matrix is built.
+        Labels are the same as DBSCAN(metric="cosine") on the raw vectors.
+        """
+        unit_vectors = normalize(vector_matrix, norm="l2", copy=True)
+        neighbors = NearestNeighbors(radius=self.dbscan_eps, metric="cosine", algorithm="brute", n_jobs=-1)
+        graph = neighbors.fit(unit_vectors).radius_neighbors_graph(unit_vectors, mode="distance")
+        logger.debug(f"eps-neighborhood graph: {graph.shape[0]} documents, {graph.nnz} neighbor pairs")
+        dbscan = DBSCAN(eps=self.dbscan_eps, min_samples=self.dbscan_min_samples, metric="precomputed")
+        return dbscan.fit_predict(graph)
+
     def run_dbscan_clustering(self) -> dict:
         """
         Retrieves TF-IDF vectors, runs DBSCAN, stores assignments, and returns results.
@@ -166,8 +178,7 @@ class ClusteringService:
             }
 
         try:
-            dbscan = DBSCAN(eps=self.dbscan_eps, min_samples=self.dbscan_min_samples, metric="cosine")
-            cluster_labels = dbscan.fit_predict(vector_matrix)
+            cluster_labels = self._dbscan_labels(vector_matrix)
         except ValueError as ve:
             if "Found array with 0 feature(s) (shape=(n_samples, 0))" in str(ve):
                 logger.error(f"DBSCAN failed: Input data has 0 features. Vector matrix shape: {vector_matrix.shape}. This might happen if TF-IDF vocab is empty or not fitted.", exc_info=True)
@@ -185,7 +196,7 @@ class ClusteringService:
         # self._store_cluster_assignments(None, doc_ids, cluster_labels) # Passing None as db for now
 
         num_clusters = len(set(label for label in cluster_labels if label != -1))
-        num_outliers = np.sum(cluster_labels == -1)
+        num_outliers = int(np.sum(cluster_labels == -1)) # Plain int so the result is JSON serializable
 
         logger.info(f"Clustering complete: {num_clusters} clusters found, {num_outliers} outliers.")
 
@@ -197,12 +208,15 @@ class ClusteringService:
 
         cluster_summary = []
         if num_clusters > 0:
-            for label_id in sorted(list(set(l for l in cluster_labels if l != -1))):
-                docs_in_cluster = [doc_ids[i] for i, lbl in enumerate(cluster_labels) if lbl == label_id]
+            # Group members with one stable sort instead of rescanning every label per cluster
+            clustered = np.flatnonzero(cluster_labels != -1)
+            order = clustered[np.argsort(cluster_labels[clustered], kind="stable")]
+            label_ids, starts, counts = np.unique(cluster_labels[order], return_index=True, return_counts=True)
+            for label_id, start, count in zip(label_ids, starts, counts):
                 cluster_summary.append({
                     "cluster_id": f"cluster_{label_id}",
-                    "documents": docs_in_cluster,
-                    "doc_count": len(docs_in_cluster)
+                    "documents": [doc_ids[i] for i in order[start:start + count]],
+                    "doc_count": int(count)
                 })
         
         return {
@@ -7,6 +7,8 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Union, Any
 import os
 import logging
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
 
 from sqlalchemy.orm import Session
 from utils.database import get_db, DocumentMetadata
@@ -192,37 +194,41 @@ class DuplicateService:
                         })
         
         # Second pass: near-duplicate detection using vector similarity
-        paths_to_vectors = {}
+        texts = {}
         for pdf_path in paths:
             text = extract_text_from_pdf(str(pdf_path))
             if text:
-                vector = self.engine.vectorize(text)
-                paths_to_vectors[str(pdf_path)] = vector
+                texts[str(pdf_path)] = text
+        paths_to_vectors = {
+            p: vector
+            for p, vector in zip(texts, self.engine.vectorize_batch(list(texts.values()), as_sparse=True))
+            if vector is not None
+        }
         
-        # Compare vectors for near-duplicates
+        # Compare vectors for near-duplicates: cosine similarity of every pair from one sparse
+        # product of the L2-normalized rows (same normalization as SimilarityEngine.compute_similarity)
         paths_list = list(paths_to_vectors.keys())
-        for i in range(len(paths_list)):
-            for j in range(i+1, len(paths_list)):
-                # Skip if already identified as exact duplicates
-                is_exact = any(
-                    (d["file1"] == paths_list[i] and d["file2"] == paths_list[j]) or
-                    (d["file1"] == paths_list[j] and d["file2"] == paths_list[i])
-                    for d in results["exact_duplicates"]
-                )
+        if len(paths_list) > 1:
+            # The hashed feature space is too wide to stack the batch densely
+            vectors = normalize(sp.vstack([paths_to_vectors[p] for p in paths_list], format="csr"))
+            sims = sp.triu(vectors @ vectors.T, k=1, format="csr")
+            sims.sort_indices()
+            sims = sims.tocoo()
+            
+            # Skip pairs already identified as exact duplicates
+            path_hashes = {p: h for h, group in hash_to_paths.items() for p in group}
+            mask = sims.data > DOC_SIMILARITY_THRESHOLD
+            for i, j, sim in zip(sims.row[mask], sims.col[mask], sims.data[mask]):
+                hash_i = path_hashes.get(paths_list[i])
+                if hash_i is not None and hash_i == path_hashes.get(paths_list[j]):
+                    continue
                 
-                if not is_exact:
-                    sim = self.engine.compute_similarity(
-                        paths_to_vectors[paths_list[i]],
-                        paths_to_vectors[paths_list[j]]
-                    )
-                    
-                    if sim > DOC_SIMILARITY_THRESHOLD:
-                        results["near_duplicates"].append({
-                            "file1": paths_list[i],
-                            "file2": paths_list[j],
-                            "type": "near_duplicate",
-                            "similarity": float(sim)
-                        })
+                results["near_duplicates"].append({
+                    "file1": paths_list[i],
+                    "file2": paths_list[j],
+                    "type": "near_duplicate",
+                    "similarity": float(sim)
+                })
         
         # Combine results
         combined_results = results["exact_duplicates"] + results["near_duplicates"]
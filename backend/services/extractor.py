@@ -4,14 +4,14 @@ Extracts and processes text from PDF documents.
 """
 
 import os
-import uuid
+from utils.ids import next_uuid
 import logging
 from typing import Tuple, List, Dict, Any, Optional
 
 from ingestion.pdf_reader import extract_text_from_pdf, extract_pages_from_pdf
 from ingestion.preprocessing import normalize_medical_text, measure_medical_confidence, extract_medical_terms
 from utils.page_tracker import hash_text
-from similarity.hashing import compute_document_hash
+from similarity.hashing import compute_document_hash_from_text
 from utils.duplicate_analysis import compute_document_tfidf_vector
 
 # Configure logging
@@ -37,7 +37,7 @@ def extract_text_and_pages(pdf_path: str, doc_id: str = None) -> Tuple[str, List
     
     # Generate document ID if not provided
     if not doc_id:
-        doc_id = str(uuid.uuid4())
+        doc_id = next_uuid()
     
     try:
         # Extract full text
@@ -127,7 +127,7 @@ def analyze_document_content(pdf_path: str) -> Dict[str, Any]:
         avg_medical_confidence = sum(medical_confidences) / len(medical_confidences) if medical_confidences else 0.0
         
         # Compute document hash and TF-IDF vector
-        doc_hash = compute_document_hash(pdf_path)
+        doc_hash = compute_document_hash_from_text(full_text)
         tfidf_vec = compute_document_tfidf_vector(pdf_path)
         
         # Determine if document is medical
@@ -2,15 +2,33 @@
 Service for performing medical content analysis on documents.
 """
 import logging
+from collections import Counter
 from typing import List, Dict, Optional, Any
 
 from sqlalchemy.orm import Session
-from utils.database import DocumentMetadata, Page, MedicalEntity, get_document_metadata_by_id, get_pages_by_document_id, create_user # Assuming create_user is placeholder, we need a way to add MedicalEntity
+from utils.database import DocumentMetadata, Page, MedicalEntity, get_document_metadata_by_id, get_pages_by_document_id, get_cached_medical_analysis, save_medical_analysis, create_user # Assuming create_user is placeholder, we need a way to add MedicalEntity
 from ingestion.preprocessing import measure_medical_confidence, extract_medical_terms
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Specialty keywords used by detect_specialty
+SPECIALTY_KEYWORDS = {
+    "cardiology": ["heart", "cardiac", "ecg", "ekg", "coronary", "arrhythmia", "myocardial"],
+    "neurology": ["brain", "neural", "neuro", "seizure", "epilepsy", "cognitive"],
+    "oncology": ["cancer", "tumor", "oncology", "malignant", "chemotherapy", "radiation"],
+    "orthopedics": ["bone", "joint", "fracture", "orthopedic", "musculoskeletal"],
+    "pediatrics": ["child", "pediatric", "infant", "adolescent"],
+    "radiology": ["imaging", "ct scan", "mri", "xray", "x-ray", "radiograph"]
+}
+
+# Flattened (keyword, specialty) pairs, so each check is a single substring test
+_KEYWORD_SPECIALTIES = tuple(
+    (keyword, specialty)
+    for specialty, keywords in SPECIALTY_KEYWORDS.items()
+    for keyword in keywords
+)
+
 # Helper functions (originally from data_science.py)
 
 def detect_specialty(text: str, medical_terms: List[str]) -> Optional[str]:
@@ -25,33 +43,20 @@ def detect_specialty(text: str, medical_terms: List[str]) -> Optional[str]:
     Returns:
         Detected specialty or None
     """
-    # Define specialty keywords
-    specialties = {
-        "cardiology": ["heart", "cardiac", "ecg", "ekg", "coronary", "arrhythmia", "myocardial"],
-        "neurology": ["brain", "neural", "neuro", "seizure", "epilepsy", "cognitive"],
-        "oncology": ["cancer", "tumor", "oncology", "malignant", "chemotherapy", "radiation"],
-        "orthopedics": ["bone", "joint", "fracture", "orthopedic", "musculoskeletal"],
-        "pediatrics": ["child", "pediatric", "infant", "adolescent"],
-        "radiology": ["imaging", "ct scan", "mri", "xray", "x-ray", "radiograph"]
-    }
-    
     # Count specialty term occurrences
-    specialty_counts = {specialty: 0 for specialty in specialties}
+    specialty_counts = {specialty: 0 for specialty in SPECIALTY_KEYWORDS}
     
     # Check text
     text_lower = text.lower()
-    for specialty, keywords in specialties.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                specialty_counts[specialty] += 1
+    for keyword, specialty in _KEYWORD_SPECIALTIES:
+        if keyword in text_lower:
+            specialty_counts[specialty] += 1
     
-    # Check medical terms
-    for term in medical_terms:
-        term_lower = term.lower()
-        for specialty, keywords in specialties.items():
-            for keyword in keywords:
-                if keyword in term_lower:
-                    specialty_counts[specialty] += 1
+    # Check medical terms; repeated terms are scanned once and weighted by their count
+    for term_lower, occurrences in Counter(term.lower() for term in medical_terms).items():
+        for keyword, specialty in _KEYWORD_SPECIALTIES:
+            if keyword in term_lower:
+                specialty_counts[specialty] += occurrences
     
     # Find specialty with highest count
     max_count = 0
@@ -201,6 +206,18 @@ def analyze_document_medical_content(db: Session, doc_id: str) -> Dict[str, Any]
     # doc_meta.overall_specialty = overall_doc_specialty (Example)
     # db.add(doc_meta)
 
+    summary = {
+        "doc_id": doc_id,
+        "filename": doc_meta.filename,
+        "overall_specialty": overall_doc_specialty,
+        "total_pages_analyzed": len(db_pages),
+        "medical_pages_count": medical_pages_count,
+        "average_medical_confidence": round(average_confidence, 4),
+        "pages_analysis": pages_analysis_results
+    }
+    # Persist the summary with the page updates, so later reads can skip recomputation
+    save_medical_analysis(db, doc_id, doc_meta.content_hash, summary)
+
     try:
         db.commit()
         logger.info(f"Successfully completed medical analysis and updated DB for document ID: {doc_id}")
@@ -212,14 +229,33 @@ def analyze_document_medical_content(db: Session, doc_id: str) -> Dict[str, Any]
         # Re-raising an error might be cleaner for the caller to handle.
         raise Exception(f"Database update failed during medical analysis for doc {doc_id}: {str(e)}")
 
-    return {
-        "doc_id": doc_id,
-        "filename": doc_meta.filename,
-        "overall_specialty": overall_doc_specialty,
-        "total_pages_analyzed": len(db_pages),
-        "medical_pages_count": medical_pages_count,
-        "average_medical_confidence": round(average_confidence, 4),
-        "pages_analysis": pages_analysis_results
-    }
+    return summary
+
+def get_document_medical_analysis(db: Session, doc_id: str) -> Dict[str, Any]:
+    """
+    Returns the medical analysis of a document, reusing the stored summary when it was
+    computed for the document's current content and analyzing the document otherwise.
+
+    Args:
+        db: SQLAlchemy session.
+        doc_id: The ID of the document.
+
+    Returns:
+        A dictionary summarizing the medical analysis of the document.
+
+    Raises:
+        ValueError: If the document with the given doc_id is not found.
+    """
+    doc_meta = get_document_metadata_by_id(db, doc_id)
+    if not doc_meta:
+        logger.error(f"Document with ID {doc_id} not found for medical analysis.")
+        raise ValueError(f"Document with ID {doc_id} not found.")
+
+    cached = get_cached_medical_analysis(db, doc_id, doc_meta.content_hash)
+    if cached is not None:
+        logger.debug(f"Using stored medical analysis for document ID: {doc_id}")
+        return cached
+
+    return analyze_document_medical_content(db, doc_id)
 
 # More service functions will be added here to orchestrate analysis for DB documents. 
\ No newline at end of file
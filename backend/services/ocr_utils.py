@@ -0,0 +1,115 @@
+"""
+OCR helpers shared by the analysis and comparison endpoints.
+Renders PDF pages and recognizes words with Tesseract, many pages per process.
+"""
+
+import csv
+import io
+import os
+import re
+import subprocess
+import tempfile
+import logging
+from functools import lru_cache
+from typing import List, Tuple
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+
+from utils.config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Tesseract work files are only read back by this process, so they go to scratch space
+SCRATCH_DIR = os.path.abspath(settings.SCRATCH_PATH)
+os.makedirs(SCRATCH_DIR, exist_ok=True)
+
+# Anything that is not a letter or digit (\W does not match "_", so it is listed explicitly)
+_NON_ALNUM_RE = re.compile(r'[\W_]+')
+
+
+@lru_cache(maxsize=65536)
+def normalize_word(word: str) -> str:
+    """
+    Normalize word for comparison by removing punctuation and converting to lowercase.
+
+    Args:
+        word: Word to normalize
+
+    Returns:
+        Normalized word
+    """
+    return _NON_ALNUM_RE.sub('', word).lower()
+
+
+def render_page(page: fitz.Page, dpi: int = 300, grayscale: bool = False) -> Image.Image:
+    """
+    Rasterize a single PDF page in-process with PyMuPDF.
+
+    Args:
+        page: PDF page object
+        dpi: Render resolution
+        grayscale: Render a single-channel image, e.g. for OCR
+
+    Returns:
+        RGB (or L, if grayscale) PIL image of the page
+    """
+    matrix = fitz.Matrix(dpi / 72, dpi / 72)
+    # Copy straight out of the pixmap's buffer; pix.samples would first make an intermediate bytes copy
+    if grayscale:
+        pix = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+        return Image.frombytes("L", (pix.width, pix.height), pix.samples_mv)
+    pix = page.get_pixmap(matrix=matrix, alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples_mv)
+
+
+def tesseract_words_batch(images: List[Image.Image]) -> List[List[Tuple[str, float, Tuple[int, int, int, int]]]]:
+    """
+    OCR several images with a single Tesseract process, so the engine starts once per batch.
+    The images are passed to Tesseract as a list file, and the combined TSV output is
+    split back into pages by its page_num column.
+
+    Args:
+        images: PIL images to extract text from
+
+    Returns:
+        One list of (word, confidence, (x, y, w, h)) tuples per image, in input order;
+        empty words are skipped
+
+    Raises:
+        subprocess.CalledProcessError: If Tesseract fails
+    """
+    words: List[List[Tuple[str, float, Tuple[int, int, int, int]]]] = [[] for _ in images]
+    if not images:
+        return words
+
+    with tempfile.TemporaryDirectory(dir=SCRATCH_DIR) as work_dir:
+        image_paths = []
+        for n, image in enumerate(images):
+            # Tesseract binarizes internally, so a grayscale TIFF loses nothing and is much cheaper to write than RGB PNG
+            image_path = os.path.join(work_dir, f"{n}.tif")
+            image.convert('L').save(image_path, "TIFF", compression="tiff_lzw")
+            image_paths.append(image_path)
+        list_path = os.path.join(work_dir, "images.txt")
+        with open(list_path, "w") as f:
+            f.write("\n".join(image_paths) + "\n")
+
+        # LSTM engine, text assumed to be a uniform block
+        result = subprocess.run(
+            [pytesseract.pytesseract.tesseract_cmd, list_path, "stdout", "--oem", "3", "--psm", "6", "-l", "eng", "tsv"],
+            capture_output=True, text=True, check=True,
+        )
+
+    for row in csv.DictReader(io.StringIO(result.stdout), delimiter="\t", quoting=csv.QUOTE_NONE):
+        # Level 5 rows are single words
+        if row.get("level") != "5":
+            continue
+        word = (row.get("text") or "").strip()
+        if not word:
+            continue
+        page_idx = int(row["page_num"]) - 1
+        if 0 <= page_idx < len(words):
+            words[page_idx].append((word, float(row["conf"]), (int(row["left"]), int(row["top"]), int(row["width"]), int(row["height"]))))
+    return words
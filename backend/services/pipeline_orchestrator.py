@@ -1,16 +1,17 @@
 # backend/services/pipeline_orchestrator.py
 import logging
 import os
-import uuid
+from utils.ids import next_uuid
 import pickle # For LSH index
 import shutil # ADDED for file operations
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 
-from ingestion.pdf_reader import extract_text_from_pdf, extract_pages_from_pdf
+from ingestion.pdf_reader import extract_pages_and_text_from_pdf
 from ingestion.preprocessing import measure_medical_confidence
 from similarity.hashing import (
-    compute_document_hash, 
+    compute_document_hash_from_text, 
     get_minhash, 
+    serialize_minhash,
     create_lsh_index, 
     query_lsh_index,
     get_lsh_index_instance
@@ -22,6 +23,8 @@ from similarity.tfidf import (
     load_fitted_tfidf_vectorizer 
 )
 from utils.page_tracker import process_document_pages
+from utils.extraction_cache import file_fingerprint, get_cached_extraction, cache_extraction
+from utils.pipeline_state import store_stage_text, load_stage_text, delete_stage_text
 from backend.services.logger import log_upload 
 from utils.config import settings # For LSH_THRESHOLD, DOC_SIMILARITY_THRESHOLD
 
@@ -45,39 +48,102 @@ logger = logging.getLogger(__name__)
 # def get_lsh_index_instance(): ... 
 # def save_lsh_index_instance(lsh_index): ...
 
+
 class PipelineOrchestrator:
     def __init__(self):
         self.similarity_engine = SimilarityEngine()
+        # (doc_id, text) of the last document handled, so stages run in the same process fetch it once
+        self._text_cache: Tuple[Optional[str], str] = (None, "")
         if load_fitted_tfidf_vectorizer() is None:
              logger.warning("TF-IDF Vectorizer is not loaded or not fitted via similarity.tfidf._load_vectorizer(). "
                           "Ensure it's initialized (e.g., via fit_vectorizer_and_save during app startup).")
+        else:
+            # One throwaway transform so the first real document doesn't pay for first-call setup.
+            # The vectorizer is frozen at runtime: transform never grows it, and unseen terms
+            # land in their hashed columns.
+            try:
+                self.similarity_engine.vectorize("warmup corpus")
+            except Exception as e:
+                logger.warning(f"TF-IDF vectorizer warm-up failed: {e}")
 
-    # This method is called by the Celery task defined in backend.tasks.pipeline_tasks.py
-    def process_document(self, pdf_path: str, original_filename: str, doc_id: Optional[str] = None, task_self=None) -> Dict:
+    def _load_full_text(self, state: Dict) -> str:
+        """Extracted text of the document, from the shared stage store unless this process just handled it."""
+        doc_id = state["doc_id"]
+        if self._text_cache[0] != doc_id:
+            text = load_stage_text(doc_id)
+            if text is None:
+                raise RuntimeError(f"Extracted text for {doc_id} is missing from the pipeline state store (expired or never stored)")
+            self._text_cache = (doc_id, text)
+        return self._text_cache[1]
+
+    def _discard_full_text(self, state: Dict) -> None:
+        doc_id = state.get("doc_id")
+        if self._text_cache[0] == doc_id:
+            self._text_cache = (None, "")
+        if doc_id:
+            delete_stage_text(doc_id)
+
+    def _fail(self, state: Dict, status: str, stage_key: str, stage_message: str, message: str) -> Dict:
+        """Mark the state as terminally failed; later stages pass it through untouched."""
+        doc_id, original_filename = state["doc_id"], state["filename"]
+        with get_db() as db:
+            upsert_document_metadata(db, doc_id, status=status)
+        log_upload(doc_id, original_filename, status)
+        state["stages"][stage_key] = stage_message
+        state["final_status"] = status
+        state["status"] = "error"
+        state["message"] = message
+        self._discard_full_text(state)
+        return state
+
+    def _fail_critical(self, state: Dict, e: Exception) -> Dict:
+        doc_id, original_filename = state["doc_id"], state["filename"]
+        logger.error(f"[{doc_id}] Critical error in pipeline for {original_filename}: {e}", exc_info=True)
+        state["stages"]["critical_error"] = str(e)
+        state["final_status"] = "error_pipeline_critical"
+        state["status"] = "error"
+        state["message"] = str(e)
+        try:
+            with get_db() as db:
+                upsert_document_metadata(db, doc_id, status="error_pipeline_critical", filename=original_filename, file_path=state.get("file_path")) # Ensure file_path is logged on error if available
+        except Exception as db_err:
+            logger.error(f"[{doc_id}] Failed to log critical error to DB: {db_err}")
+        log_upload(doc_id, original_filename, "error_pipeline_critical")
+        self._discard_full_text(state)
+        return state
+
+    # --- Pipeline stages ---
+    # Each stage takes and returns a JSON-serializable state dict so the stages can run either
+    # back to back (process_document) or as separate Celery tasks in a chain (backend.tasks.pipeline_tasks).
+    # Once a stage sets state["status"], the document is finished and later stages return the state unchanged.
+
+    def run_extraction_stage(self, pdf_path: str, original_filename: str, doc_id: Optional[str] = None) -> Dict:
+        """
+        Stage 0: copy the upload to persistent storage, extract and store its pages.
+        The temporary upload at pdf_path is always removed afterwards.
+        """
         if not doc_id:
-            doc_id = str(uuid.uuid4())
+            doc_id = next_uuid()
+
+        state = {"doc_id": doc_id, "filename": original_filename, "stages": {}, "final_status": "processing_started"}
 
-        processing_status = {"doc_id": doc_id, "filename": original_filename, "stages": {}, "final_status": "processing_started"}
-        
         # Define the persistent filename and path
         # Using doc_id.pdf for consistency and to avoid issues with original_filename characters.
         persistent_doc_filename = f"{doc_id}.pdf"
         # New documents will initially be placed in the 'flagged_for_review' subpath.
         # This path can be changed later by the update_document_status API based on review.
         initial_persistent_file_path = os.path.join(settings.DOCUMENT_PATH, settings.FLAGGED_DOCS_SUBPATH, persistent_doc_filename)
-        
-        # Celery progress update example (if task_self is passed)
-        if task_self:
-            task_self.update_state(state='PROGRESS', meta={'current_stage': 'InitialSetup', 'progress': 1, 'doc_id': doc_id})
 
         try:
+            # One session for the whole stage; it only holds a pooled connection while a transaction is open
             with get_db() as db:
                 # Ensure the destination directory exists
                 os.makedirs(os.path.dirname(initial_persistent_file_path), exist_ok=True)
                 
                 # Copy the uploaded file from its temporary location (pdf_path) to the persistent path
                 shutil.copy2(pdf_path, initial_persistent_file_path)
-                logger.info(f"[{doc_id}] Copied uploaded file from {pdf_path} to persistent storage at {initial_persistent_file_path}")
+                state["file_path"] = initial_persistent_file_path
+                logger.debug("[%s] Copied uploaded file from %s to persistent storage at %s", doc_id, pdf_path, initial_persistent_file_path)
 
                 # Initial metadata entry, now including the file_path
                 upsert_document_metadata(
@@ -88,57 +154,71 @@ class PipelineOrchestrator:
                     status="processing_extraction"
                 )
 
-            # --- Stage 0: Text Extraction & Initial Page Processing ---
-            logger.info(f"[{doc_id}] Stage 0: Extracting text for {original_filename}")
-            full_text = extract_text_from_pdf(pdf_path)
-            if not full_text:
-                logger.warning(f"[{doc_id}] No text extracted from {original_filename}.")
-                with get_db() as db:
-                    upsert_document_metadata(db, doc_id, status="error_text_extraction")
-                log_upload(doc_id, original_filename, "error_text_extraction")
-                processing_status["stages"]["text_extraction"] = "Failed: No text"
-                processing_status["final_status"] = "error_text_extraction"
-                return {"status": "error", "message": "Text extraction failed", **processing_status}
-
-            page_texts = extract_pages_from_pdf(pdf_path)
-            medical_confidences = [measure_medical_confidence(pt) for pt in page_texts if pt]
-            # Using doc_id for page_tracker, assuming it's the central ID
-            
-            # The call to page processing is moved into the DB session block below
-            # update_page_hash_map( 
-            #     doc_id=doc_id, filename=original_filename, page_texts=page_texts,
-            #     medical_confidences=medical_confidences, image_paths=[None]*len(page_texts)
-            # )
-            # processing_status["stages"]["text_extraction"] = "Completed" # Moved after DB block
+                logger.debug("[%s] Stage 0: Extracting text for %s", doc_id, original_filename)
+                # Identical files (retries, re-uploads) reuse the cached extraction and skip OCR
+                fingerprint = file_fingerprint(pdf_path)
+                cached = get_cached_extraction(fingerprint)
+                if cached:
+                    logger.debug("[%s] Reusing cached extraction for %s.", doc_id, original_filename)
+                    page_texts, full_text, medical_confidences = cached
+                else:
+                    # Parse the PDF once for both the page texts and the full text. The full text is
+                    # normalized as a whole, like extract_text_from_pdf, so its hash matches stored documents.
+                    page_texts, full_text = extract_pages_and_text_from_pdf(pdf_path)
+                # Bail out before any per-page work when there is nothing worth comparing
+                # (empty text or a few characters of OCR noise from an image-only scan).
+                if len(full_text.strip()) < settings.MIN_PIPELINE_CHARS:
+                    logger.warning(f"[{doc_id}] Insufficient text extracted from {original_filename} ({len(full_text.strip())} chars).")
+                    return self._fail(state, "error_text_extraction", "text_extraction", "Failed: insufficient text", "Text extraction failed")
+
+                if not cached:
+                    # One score per page (empty pages score 0.0) so indices line up with page numbers
+                    medical_confidences = [measure_medical_confidence(pt) for pt in page_texts]
+                    cache_extraction(fingerprint, page_texts, full_text, medical_confidences)
 
-            with get_db() as db:
                 # Process pages and store them in the database
                 process_document_pages( 
                     db=db,
                     doc_id=doc_id, 
                     page_texts=page_texts,
-                    medical_confidences=medical_confidences, # process_document_pages handles length alignment
-                    image_paths=[None]*len(page_texts)    # process_document_pages handles length alignment
+                    medical_confidences=medical_confidences,
                 )
                 # Update document metadata after successful page processing
                 upsert_document_metadata(db, doc_id, status="processing_hash_check", page_count=len(page_texts))
-            
-            processing_status["stages"]["text_extraction"] = "Completed"
 
+            # Hand the text to the later stages through the shared store rather than the task payload;
+            # they may run on other hosts. The final stage deletes it, and it expires otherwise.
+            store_stage_text(doc_id, full_text)
+            self._text_cache = (doc_id, full_text)
+            # Hash while the text is in hand so Stage 1 is a pure DB lookup
+            state["content_hash"] = compute_document_hash_from_text(full_text)
 
-            # --- Stage 1: Exact Duplicate Check (Hash Check) ---
-            logger.info(f"[{doc_id}] Stage 1: Performing exact hash check.")
-            # Assuming pdf_path is a temporary path to the file content for hashing
-            doc_hash = compute_document_hash(pdf_path) 
+            state["stages"]["text_extraction"] = "Completed"
+            return state
+
+        except Exception as e:
+            return self._fail_critical(state, e)
+        finally:
+            # Ensure the temporary upload file is removed; later stages only need the extracted text
+            try:
+                if pdf_path and os.path.exists(pdf_path):
+                    os.remove(pdf_path)
+                    logger.debug(f"[{doc_id}] Deleted temporary file {pdf_path}")
+            except Exception as cleanup_err:
+                logger.warning(f"[{doc_id}] Failed to delete temporary file {pdf_path}: {cleanup_err}")
+
+    def run_hash_check_stage(self, state: Dict) -> Dict:
+        """Stage 1: exact duplicate check on the hash of the extracted text."""
+        if state.get("status"):
+            return state
+        doc_id, original_filename = state["doc_id"], state["filename"]
+        try:
+            logger.debug("[%s] Stage 1: Performing exact hash check.", doc_id)
+            doc_hash = state.get("content_hash") or compute_document_hash_from_text(self._load_full_text(state))
             
             if not doc_hash:
                 logger.warning(f"[{doc_id}] Could not compute content hash for {original_filename}.")
-                with get_db() as db:
-                    upsert_document_metadata(db, doc_id, status="error_hash_computation")
-                log_upload(doc_id, original_filename, "error_hash_computation")
-                processing_status["stages"]["exact_hash_check"] = "Failed: Hash computation error"
-                processing_status["final_status"] = "error_hash_computation"
-                return {"status": "error", "message": "Hash computation failed", **processing_status}
+                return self._fail(state, "error_hash_computation", "exact_hash_check", "Failed: Hash computation error", "Hash computation failed")
 
             with get_db() as db:
                 existing_doc_meta = get_document_by_hash(db, doc_hash)
@@ -146,115 +226,122 @@ class PipelineOrchestrator:
                     logger.info(f"[{doc_id}] Exact duplicate of {existing_doc_meta.doc_id} found by hash {doc_hash[:10]}.")
                     upsert_document_metadata(db, doc_id, status="exact_duplicate", matched_doc_id=existing_doc_meta.doc_id, content_hash=doc_hash)
                     log_upload(doc_id, original_filename, "exact_duplicate")
-                    processing_status["stages"]["exact_hash_check"] = f"Exact duplicate of {existing_doc_meta.doc_id}"
-                    processing_status["final_status"] = "exact_duplicate"
-                    return {"status": "exact_duplicate", "matched_doc_id": existing_doc_meta.doc_id, **processing_status}
+                    state["stages"]["exact_hash_check"] = f"Exact duplicate of {existing_doc_meta.doc_id}"
+                    state["final_status"] = "exact_duplicate"
+                    state["status"] = "exact_duplicate"
+                    state["matched_doc_id"] = existing_doc_meta.doc_id
+                    self._discard_full_text(state)
+                    return state
                 else:
                     # No exact duplicate, or it's the same document being reprocessed. Store hash for current doc.
                     upsert_document_metadata(db, doc_id, content_hash=doc_hash, status="processing_lsh")
-            processing_status["stages"]["exact_hash_check"] = "No exact match found or hash updated."
-
+            state["stages"]["exact_hash_check"] = "No exact match found or hash updated."
+            return state
+        except Exception as e:
+            return self._fail_critical(state, e)
 
-            # --- Stage 2: Near Duplicate Check (MinHash LSH) ---
-            logger.info(f"[{doc_id}] Stage 2: Performing MinHash LSH check.")
-            # Use LSH_NUM_PERM from hashing.py (via settings) or define it if needed from settings directly
-            minhash_obj = get_minhash(full_text) # NUM_PERM is now default in get_minhash from settings
+    def run_minhash_stage(self, state: Dict) -> Dict:
+        """Stage 2: near duplicate check against the MinHash LSH index."""
+        if state.get("status"):
+            return state
+        doc_id = state["doc_id"]
+        try:
+            logger.debug("[%s] Stage 2: Performing MinHash LSH check.", doc_id)
+            minhash_obj = get_minhash(self._load_full_text(state)) # NUM_PERM is now default in get_minhash from settings
             
             # Load the LSH index on demand to get the latest version
             current_lsh_index = get_lsh_index_instance() # This now comes from similarity.hashing
             potential_duplicates_ids = query_lsh_index(current_lsh_index, minhash_obj)
-            potential_duplicates_ids = [pid for pid in potential_duplicates_ids if pid != doc_id] # Filter self
-
-            minhash_signature_hex = ''.join(format(x, '02x') for x in minhash_obj.hashvalues.tobytes())
+            potential_duplicates_ids.discard(doc_id) # Filter self
+            # Candidates for Stage 3; kept as a sorted list so the state stays JSON-serializable
+            state["lsh_candidates"] = sorted(potential_duplicates_ids)
 
+            minhash_signature = serialize_minhash(minhash_obj)
 
             if potential_duplicates_ids:
-                logger.info(f"[{doc_id}] Potential LSH matches: {potential_duplicates_ids}.")
-                processing_status["stages"]["minhash_lsh_check"] = f"Potential LSH matches found: {len(potential_duplicates_ids)}"
+                logger.debug("[%s] Potential LSH matches: %s.", doc_id, potential_duplicates_ids)
+                state["stages"]["minhash_lsh_check"] = f"Potential LSH matches found: {len(potential_duplicates_ids)}"
             else:
-                processing_status["stages"]["minhash_lsh_check"] = "No LSH matches"
+                state["stages"]["minhash_lsh_check"] = "No LSH matches"
             
             with get_db() as db: # Store MinHash signature
-                upsert_document_metadata(db, doc_id, minhash_signature=minhash_signature_hex, status="processing_tfidf")
+                upsert_document_metadata(db, doc_id, minhash_signature=minhash_signature, status="processing_tfidf")
             
-            # The LSH_INDEX is now considered read-only in this context.
-            # It's updated by a separate, periodic Celery task.
-            # We no longer add to it or save it here to avoid concurrency issues.
-            # MinHash signature is saved to DB, LSH index rebuild task will pick it up.
-
+            # The LSH index is read-only here; it is rebuilt from the stored signatures by a periodic Celery task.
+            return state
+        except Exception as e:
+            return self._fail_critical(state, e)
 
-            # --- Stage 3: Content Similarity (TF-IDF) & Vector Storage ---
-            logger.info(f"[{doc_id}] Stage 3: TF-IDF vectorization and similarity check.")
-            tfidf_vector = self.similarity_engine.vectorize(full_text)
+    def run_tfidf_stage(self, state: Dict) -> Dict:
+        """Stage 3: TF-IDF vectorization, vector storage and content similarity check. Final stage."""
+        if state.get("status"):
+            return state
+        doc_id, original_filename = state["doc_id"], state["filename"]
+        try:
+            logger.debug("[%s] Stage 3: TF-IDF vectorization and similarity check.", doc_id)
+            tfidf_vector = self.similarity_engine.vectorize(self._load_full_text(state))
 
             if tfidf_vector is not None:
+                # Search before storing so the document cannot match its own vector.
+                # Only the LSH candidates are scored, unless LSH negatives aren't trusted,
+                # in which case the whole corpus is scanned once instead.
+                candidate_ids = (state.get("lsh_candidates") or []) if settings.TRUST_LSH_NEGATIVES else None
                 with get_db() as db:
-                   store_tfidf_vector_in_db(db, doc_id, tfidf_vector) # vector_type='tfidf' is default
-                logger.info(f"[{doc_id}] TF-IDF vector computed and stored in DB.")
-                processing_status["stages"]["tfidf_vectorization"] = "Completed"
+                    best_match_info = search_tfidf_vectors_in_db(tfidf_vector, threshold=settings.DOC_SIMILARITY_THRESHOLD, candidate_ids=candidate_ids, db=db)
 
-                with get_db() as db:
-                   best_match_info = search_tfidf_vectors_in_db(db, tfidf_vector, threshold=settings.DOC_SIMILARITY_THRESHOLD)
-                
-                if best_match_info and best_match_info.get("matched_doc") != doc_id : # Ensure not matching self
-                    matched_doc_id = best_match_info['matched_doc']
-                    similarity = best_match_info['similarity']
-                    logger.info(f"[{doc_id}] TF-IDF duplicate found: {matched_doc_id} with similarity {similarity:.4f}")
-                    processing_status["stages"]["tfidf_similarity_check"] = f"Content duplicate of {matched_doc_id}"
-                    processing_status["final_status"] = "content_duplicate"
-                    with get_db() as db:
+                    # The vector insert is committed together with the final status update below
+                    store_tfidf_vector_in_db(db, doc_id, tfidf_vector, commit=False) # vector_type='tfidf' is default
+                    state["stages"]["tfidf_vectorization"] = "Completed"
+                    
+                    if best_match_info and best_match_info.get("matched_doc") != doc_id : # Ensure not matching self
+                        matched_doc_id = best_match_info['matched_doc']
+                        similarity = best_match_info['similarity']
+                        logger.debug("[%s] TF-IDF duplicate found: %s with similarity %.4f", doc_id, matched_doc_id, similarity)
+                        state["stages"]["tfidf_similarity_check"] = f"Content duplicate of {matched_doc_id}"
+                        state["final_status"] = "content_duplicate"
                         upsert_document_metadata(db, doc_id, status="content_duplicate", matched_doc_id=matched_doc_id, similarity_score=similarity)
-                    log_upload(doc_id, original_filename, "content_duplicate")
-                else:
-                    logger.info(f"[{doc_id}] No significant TF-IDF similarity found.")
-                    processing_status["stages"]["tfidf_similarity_check"] = "Unique by content"
-                    processing_status["final_status"] = "unique"
-                    with get_db() as db:
+                    else:
+                        logger.debug("[%s] No significant TF-IDF similarity found.", doc_id)
+                        state["stages"]["tfidf_similarity_check"] = "Unique by content"
+                        state["final_status"] = "unique"
                         upsert_document_metadata(db, doc_id, status="unique")
-                    log_upload(doc_id, original_filename, "unique")
+                logger.debug("[%s] TF-IDF vector computed and stored in DB.", doc_id)
+                log_upload(doc_id, original_filename, state["final_status"])
             else:
                 logger.warning(f"[{doc_id}] TF-IDF vector could not be generated for {original_filename}.")
-                processing_status["stages"]["tfidf_vectorization"] = "Failed"
-                processing_status["final_status"] = "error_tfidf_vectorization"
+                state["stages"]["tfidf_vectorization"] = "Failed"
+                state["final_status"] = "error_tfidf_vectorization"
                 with get_db() as db:
                    upsert_document_metadata(db, doc_id, status="error_tfidf_vectorization")
                 log_upload(doc_id, original_filename, "error_tfidf_vectorization")
 
-            # --- Stage 4: Trigger DBSCAN Clustering Update (Placeholder) ---
-            # Clustering is now handled by a separate, periodic Celery Beat task
-            # and is no longer triggered after each individual document processing.
-            # if processing_status["final_status"] not in ["exact_duplicate", "error_text_extraction", "error_tfidf_vectorization", "error_hash_computation"]:
-            #     logger.info(f"[{doc_id}] Stage 4: DBSCAN clustering update is now periodic, not triggered here.")
-            #     # run_clustering_task.delay() # REMOVED
-            #     processing_status["stages"]["dbscan_trigger"] = "Handled by periodic task"
-            #     if task_self:
-            #         task_self.update_state(state='PROGRESS', meta={'current_stage': 'DBSCAN Trigger Skipped (Periodic)', 'progress': 95, 'doc_id': doc_id})
+            # Clustering is handled by a separate, periodic Celery Beat task
+            # and is not triggered after each individual document.
+            # The one INFO line per document; per-stage progress above is logged at DEBUG
+            logger.info(f"[{doc_id}] Pipeline processing completed for {original_filename} with status: {state['final_status']} (stages: {state['stages']})")
+            state["status"] = state["final_status"]
+            self._discard_full_text(state)
+            return state
+        except Exception as e:
+            return self._fail_critical(state, e)
 
-            logger.info(f"[{doc_id}] Pipeline processing completed for {original_filename} with status: {processing_status['final_status']}")
-            # Final state update is handled by the calling Celery task in pipeline_tasks.py
-            return {"status": processing_status["final_status"], **processing_status}
+    # This method is called by the Celery task defined in backend.tasks.pipeline_tasks.py
+    def process_document(self, pdf_path: str, original_filename: str, doc_id: Optional[str] = None, task_self=None) -> Dict:
+        """
+        Run all pipeline stages back to back in the current process.
+        For stage-level parallelism across documents, use the Celery chain in
+        backend.tasks.pipeline_tasks.process_document_chain instead.
+        """
+        # Celery progress update example (if task_self is passed)
+        if task_self:
+            task_self.update_state(state='PROGRESS', meta={'current_stage': 'InitialSetup', 'progress': 1, 'doc_id': doc_id})
 
-        except Exception as e:
-            logger.error(f"[{doc_id}] Critical error in pipeline for {original_filename}: {e}", exc_info=True)
-            processing_status["stages"]["critical_error"] = str(e)
-            processing_status["final_status"] = "error_pipeline_critical"
-            try:
-                with get_db() as db:
-                    upsert_document_metadata(db, doc_id, status="error_pipeline_critical", filename=original_filename, file_path=initial_persistent_file_path if 'initial_persistent_file_path' in locals() else None) # Ensure file_path is logged on error if available
-            except Exception as db_err:
-                logger.error(f"[{doc_id}] Failed to log critical error to DB: {db_err}")
-            log_upload(doc_id, original_filename, "error_pipeline_critical")
-            # Celery task failure is handled by the calling Celery task in pipeline_tasks.py
-            return {"status": "error", "message": str(e), **processing_status}
-        finally:
-            # Ensure the temporary upload file is removed after processing
-            try:
-                if pdf_path and os.path.exists(pdf_path):
-                    os.remove(pdf_path)
-                    logger.debug(f"[{doc_id}] Deleted temporary file {pdf_path}")
-            except Exception as cleanup_err:
-                logger.warning(f"[{doc_id}] Failed to delete temporary file {pdf_path}: {cleanup_err}")
-            logger.debug(f"[{doc_id}] Orchestrator finished processing for {pdf_path}")
+        state = self.run_extraction_stage(pdf_path, original_filename, doc_id)
+        for stage in (self.run_hash_check_stage, self.run_minhash_stage, self.run_tfidf_stage):
+            state = stage(state)
+        # Final state update is handled by the calling Celery task in pipeline_tasks.py
+        logger.debug(f"[{state['doc_id']}] Orchestrator finished processing for {pdf_path}")
+        return state
 
 # Example of how this might be used if not a Celery task directly:
 # if __name__ == '__main__':
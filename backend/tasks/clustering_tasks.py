@@ -21,11 +21,10 @@ def run_clustering_task():
         logger.info(f"Clusters found: {results.get('num_clusters')}, Outliers: {results.get('num_outliers')}")
         # Further actions can be taken here, like notifying an admin,
         # or storing aggregated stats, though the service itself handles individual assignments.
+        # Full service result, so the clustering status endpoint can return clusters and nodes
         return {
+            **results,
             "status": "SUCCESS",
-            "message": results.get('message'),
-            "num_clusters": results.get('num_clusters'),
-            "num_outliers": results.get('num_outliers'),
             "total_documents_processed_in_batch": results.get('total_documents')
         }
     except Exception as e:
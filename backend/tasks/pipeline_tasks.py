@@ -1,6 +1,9 @@
 # backend/tasks/pipeline_tasks.py
 import logging
 import os
+from typing import Dict, Optional
+from celery import chain
+from celery.signals import worker_process_init
 from backend.celery_app import app
 from backend.services.pipeline_orchestrator import PipelineOrchestrator
 from utils.config import settings # For any task-specific configurations if needed
@@ -82,4 +85,83 @@ def process_document_task(self, pdf_path: str, original_filename: str, doc_id: s
             'error_message': str(e)
         })
         # Re-raise the exception to ensure Celery marks it as a failure if not using custom states
-        raise 
\ No newline at end of file
+        raise 
+
+
+# --- Stage-level tasks ---
+# Each pipeline stage runs as its own task so different documents can occupy different
+# stages at the same time. Only a small state dict travels between tasks; the extracted
+# text is handed over through Redis (see utils.pipeline_state).
+
+_orchestrator: Optional[PipelineOrchestrator] = None
+
+
+def _get_orchestrator() -> PipelineOrchestrator:
+    """Reuse one orchestrator (and its loaded vectorizer) per worker process."""
+    global _orchestrator
+    if _orchestrator is None:
+        _orchestrator = PipelineOrchestrator()
+    return _orchestrator
+
+
+@worker_process_init.connect
+def _warm_orchestrator(**kwargs):
+    """Build the orchestrator when a worker process starts so the first document doesn't pay for it."""
+    try:
+        _get_orchestrator()
+    except Exception as e:
+        logger.warning(f"Failed to pre-warm the pipeline orchestrator: {e}")
+
+
+@app.task(bind=True, name="pipeline.extract_stage")
+def extract_stage_task(self, pdf_path: str, original_filename: str, doc_id: str = None) -> Dict:
+    """Stage 0: copy the upload to persistent storage and extract its pages."""
+    self.update_state(state='PROGRESS', meta={'current_stage': 'TextExtraction', 'doc_id': doc_id})
+    return _get_orchestrator().run_extraction_stage(pdf_path, original_filename, doc_id)
+
+
+@app.task(bind=True, name="pipeline.hash_check_stage")
+def hash_check_stage_task(self, state: Dict) -> Dict:
+    """Stage 1: exact duplicate check. Exact duplicates end the chain here."""
+    self.update_state(state='PROGRESS', meta={'current_stage': 'ExactHashCheck', 'doc_id': state.get('doc_id')})
+    return _get_orchestrator().run_hash_check_stage(state)
+
+
+@app.task(bind=True, name="pipeline.minhash_stage")
+def minhash_stage_task(self, state: Dict) -> Dict:
+    """Stage 2: MinHash LSH near duplicate check."""
+    self.update_state(state='PROGRESS', meta={'current_stage': 'MinHashLSH', 'doc_id': state.get('doc_id')})
+    return _get_orchestrator().run_minhash_stage(state)
+
+
+@app.task(bind=True, name="pipeline.tfidf_stage")
+def tfidf_stage_task(self, state: Dict) -> Dict:
+    """Stage 3: TF-IDF vectorization and content similarity check."""
+    self.update_state(state='PROGRESS', meta={'current_stage': 'TFIDF', 'doc_id': state.get('doc_id')})
+    result = _get_orchestrator().run_tfidf_stage(state)
+    if "error" in result.get("status", "unknown_error").lower():
+        logger.error(f"Pipeline processing failed for {result.get('filename')}. Result: {result}")
+    else:
+        logger.info(f"Pipeline processing successful for {result.get('filename')}. Status: {result.get('status')}")
+    return result
+
+
+def process_document_chain(pdf_path: str, original_filename: str, doc_id: str = None):
+    """
+    Dispatch the pipeline as a chain of stage tasks.
+
+    The exact hash check is routed to settings.PIPELINE_FAST_QUEUE when configured, so a
+    dedicated worker can reject exact duplicates without waiting behind slower stages.
+
+    Returns:
+        AsyncResult of the final stage; its id can be polled like process_document_task's.
+    """
+    hash_check = hash_check_stage_task.s()
+    if settings.PIPELINE_FAST_QUEUE:
+        hash_check = hash_check.set(queue=settings.PIPELINE_FAST_QUEUE)
+    return chain(
+        extract_stage_task.s(pdf_path, original_filename, doc_id),
+        hash_check,
+        minhash_stage_task.s(),
+        tfidf_stage_task.s(),
+    ).apply_async()
@@ -3,11 +3,14 @@ from sqlalchemy.orm import joinedload
 
 from ..celery_app import app
 from utils.database import get_db, DocumentMetadata, Page
-from similarity.tfidf import fit_vectorizer_and_save, tfidf_vectorize, insert_document_vector, VECTORIZER_FILE
+from similarity.tfidf import fit_vectorizer_and_save, tfidf_vectorize_batch, insert_document_vectors, is_vectorizer_fitted, VECTORIZER_FILE
 import os
 
 logger = logging.getLogger(__name__)
 
+# Documents re-vectorized by one transform call and stored in one transaction after a refit
+REVECTORIZE_BATCH_SIZE = 500
+
 @app.task(name="tasks.manage_tfidf_vectorizer")
 def manage_tfidf_vectorizer_task(force_refit: bool = False):
     """
@@ -67,29 +70,27 @@ def manage_tfidf_vectorizer_task(force_refit: bool = False):
             # This function saves the vectorizer to VECTORIZER_FILE
             new_vectorizer = fit_vectorizer_and_save(all_doc_texts)
             
-            if new_vectorizer is None or not hasattr(new_vectorizer, 'vocabulary_') or not new_vectorizer.vocabulary_:
+            if new_vectorizer is None or not is_vectorizer_fitted(new_vectorizer):
                 logger.error("Failed to fit or save a valid TF-IDF vectorizer. Aborting re-vectorization.")
                 return
 
             logger.info("TF-IDF vectorizer fitted and saved. Now re-calculating and updating all document vectors.")
             
-            # Re-vectorize all documents that had text
-            # This assumes fit_vectorizer_and_save has updated the global VECTORIZER
-            # or that tfidf_vectorize will load the newly saved one.
-            for i, doc_id in enumerate(doc_ids_for_revectorization):
-                doc_text = all_doc_texts[i] # Get the corresponding text
-                logger.debug(f"Re-vectorizing document {doc_id} ({i+1}/{len(doc_ids_for_revectorization)})")
-                vector = tfidf_vectorize(doc_text) # Uses the newly fitted vectorizer
-                if vector is not None:
-                    try:
-                        insert_document_vector(db, doc_id, vector, vector_type='tfidf')
-                        # db.commit() might be too frequent here if insert_document_vector doesn't commit
-                        # insert_document_vector in similarity/tfidf.py does its own commit.
-                    except Exception as e_insert:
-                        logger.error(f"Error updating vector for document {doc_id} in DB: {e_insert}", exc_info=True)
-                        # Potentially rollback session or handle error, for now just log
-                else:
-                    logger.warning(f"Failed to generate TF-IDF vector for document {doc_id} after refitting. Skipping DB update for this doc.")
+            # Re-vectorize documents that had text in fixed-size batches, keeping rows sparse
+            # (a dense row of the hashed feature space is about 1 MB), one transaction per batch.
+            for start in range(0, len(all_doc_texts), REVECTORIZE_BATCH_SIZE):
+                batch_ids = doc_ids_for_revectorization[start:start + REVECTORIZE_BATCH_SIZE]
+                vectors = tfidf_vectorize_batch(all_doc_texts[start:start + REVECTORIZE_BATCH_SIZE], as_sparse=True) # Uses the newly fitted vectorizer
+                doc_vectors = []
+                for doc_id, vector in zip(batch_ids, vectors):
+                    if vector is None:
+                        logger.warning(f"Failed to generate TF-IDF vector for document {doc_id} after refitting. Skipping DB update for this doc.")
+                        continue
+                    doc_vectors.append((doc_id, vector))
+                try:
+                    insert_document_vectors(db, doc_vectors, vector_type='tfidf')
+                except Exception as e_insert:
+                    logger.error(f"Error updating TF-IDF vectors in DB for batch starting at {start}: {e_insert}", exc_info=True)
             
             # db.commit() # Final commit if insert_document_vector doesn't do it.
             logger.info("Successfully re-calculated and updated TF-IDF vectors for all relevant documents.")
@@ -4,12 +4,11 @@ Provides functions for extracting text from PDF documents.
 """
 
 import os
-import io
 import fitz  # PyMuPDF
 import pytesseract
 from PIL import Image
 from tenacity import retry, stop_after_attempt, wait_fixed
-from typing import List, Optional, Generator, Dict
+from typing import List, Optional, Generator, Dict, Tuple
 import logging
 from ingestion.preprocessing import normalize_medical_text
 from utils.config import settings
@@ -26,6 +25,9 @@ def extract_page_text(
 ) -> str:
     """
     Try different text extraction methods to get content from a page.
+    Pages without any fonts have no text layer (e.g. scans), so they go
+    straight to OCR instead of rendering every text mode; the html and json
+    modes would otherwise decode and embed the page images.
     
     Args:
         page: PDF page object
@@ -33,31 +35,42 @@ def extract_page_text(
     Returns:
         Extracted text from the page
     """
-    modes = ["text", "html", "json", "raw"]
+    modes = ["text", "html", "json", "raw"] if page.get_fonts() else []
     text = ""
+    ocr_text = None  # OCR runs at most once per page, whichever mode asks for it
     for mode in modes:
         if mode != "text":
             logger.debug(f"{mode.upper()} mode{' (fallback)' if text.strip() else ''}")
         text = page.get_text(mode)
 
         if attempt_ocr and len(text.strip()) < min_length:
-            try:
-                pix = page.get_pixmap(dpi=ocr_dpi)
-                img_bytes = pix.tobytes("png")
-                image = Image.open(io.BytesIO(img_bytes))
-                ocr_text = pytesseract.image_to_string(image, lang=settings.OCR_LANGUAGE)
-                if len(ocr_text.strip()) > len(text.strip()):
-                    text = ocr_text
-            except Exception as e:
-                logger.error(
-                    f"OCR failed on page {page.number + 1 if hasattr(page, 'number') else ''}: {e}"
-                )
+            if ocr_text is None:
+                ocr_text = _ocr_page(page, ocr_dpi)
+            if len(ocr_text.strip()) > len(text.strip()):
+                text = ocr_text
         if len(text.strip()) >= min_length:
             break
 
+    if not modes and attempt_ocr:
+        text = _ocr_page(page, ocr_dpi)
+
     return text
 
 
+def _ocr_page(page: fitz.Page, ocr_dpi: int) -> str:
+    """Render a page and run Tesseract on it; returns "" if OCR fails."""
+    try:
+        # Grayscale is all Tesseract uses; wrap the raw samples rather than round-tripping through PNG
+        pix = page.get_pixmap(dpi=ocr_dpi, colorspace=fitz.csGRAY, alpha=False)
+        image = Image.frombytes("L", (pix.width, pix.height), pix.samples_mv)
+        return pytesseract.image_to_string(image, lang=settings.OCR_LANGUAGE)
+    except Exception as e:
+        logger.error(
+            f"OCR failed on page {page.number + 1 if hasattr(page, 'number') else ''}: {e}"
+        )
+        return ""
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
 def extract_text_from_pdf(
     pdf_path: str,
@@ -108,27 +121,20 @@ def extract_text_from_pdf(
         raise
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-def extract_pages_from_pdf(
+def _extract_pages(
     pdf_path: str,
-    ocr_dpi: int = settings.OCR_DPI,
-    attempt_ocr: bool = settings.ENABLE_OCR,
-    min_length: int = settings.MIN_TEXT_LENGTH,
-) -> List[str]:
+    ocr_dpi: int,
+    attempt_ocr: bool,
+    min_length: int,
+) -> Tuple[List[str], List[str]]:
     """
-    Extract and normalize text from PDF file page by page.
+    Extract text from a PDF file page by page.
     
-    Args:
-        pdf_path: Path to the PDF file
-        ocr_dpi: DPI setting when performing OCR on image-based pages
-        
     Returns:
-        List of normalized page texts
-        
-    Raises:
-        Exception: If text extraction fails
+        (normalized page texts with "" for empty pages, raw texts of the non-empty pages)
     """
     pages = []
+    raw_texts = []
     try:
         logger.debug(f"Opening PDF file: {pdf_path}")
         doc = fitz.open(pdf_path)
@@ -150,6 +156,7 @@ def extract_pages_from_pdf(
                 pages.append("")
                 continue
                 
+            raw_texts.append(text)
             normalized_text = normalize_medical_text(text)
             if normalized_text.strip():
                 pages.append(normalized_text)
@@ -160,13 +167,63 @@ def extract_pages_from_pdf(
         
         doc.close()
         logger.debug(f"Successfully processed {len(pages)} pages")
-        return pages
+        return pages, raw_texts
         
     except Exception as e:
         logger.error(f"Failed to extract pages from {pdf_path}: {e}", exc_info=True)
         raise
 
 
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+def extract_pages_from_pdf(
+    pdf_path: str,
+    ocr_dpi: int = settings.OCR_DPI,
+    attempt_ocr: bool = settings.ENABLE_OCR,
+    min_length: int = settings.MIN_TEXT_LENGTH,
+) -> List[str]:
+    """
+    Extract and normalize text from PDF file page by page.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        ocr_dpi: DPI setting when performing OCR on image-based pages
+        
+    Returns:
+        List of normalized page texts
+        
+    Raises:
+        Exception: If text extraction fails
+    """
+    return _extract_pages(pdf_path, ocr_dpi, attempt_ocr, min_length)[0]
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+def extract_pages_and_text_from_pdf(
+    pdf_path: str,
+    ocr_dpi: int = settings.OCR_DPI,
+    attempt_ocr: bool = settings.ENABLE_OCR,
+    min_length: int = settings.MIN_TEXT_LENGTH,
+) -> Tuple[List[str], str]:
+    """
+    Extract the normalized page texts and the normalized full text of a PDF file in one pass.
+    The full text is the same as extract_text_from_pdf's, so hashes of it match documents
+    stored before.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        ocr_dpi: DPI setting when performing OCR on image-based pages
+        
+    Returns:
+        (list of normalized page texts, normalized full text)
+        
+    Raises:
+        Exception: If text extraction fails
+    """
+    pages, raw_texts = _extract_pages(pdf_path, ocr_dpi, attempt_ocr, min_length)
+    full_text = " ".join(raw_texts)
+    return pages, normalize_medical_text(full_text) if full_text.strip() else ""
+
+
 def extract_pages_with_images(
     pdf_path: str,
     ocr_dpi: int = settings.OCR_DPI,
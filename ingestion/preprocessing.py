@@ -35,6 +35,37 @@ MEDICAL_STOPWORDS = {
     "examination", "assessment", "plan", "follow", "up", "referral"
 }
 
+# Patterns used by measure_medical_confidence and its helpers, compiled once at import
+_DOSAGE_RE = re.compile(r'\d+\s*(?:mg|mcg|g|ml|cc|units|mEq)', re.IGNORECASE)
+_ICD_RE = re.compile(r'(?:ICD-\d+:|ICD-\d+)\s*([A-Z]\d+\.\d+)')
+_MEDICAL_SUFFIX_RE = re.compile(r'\b\w+(?:itis|osis|emia|opathy|ectomy|otomy|plasty|scopy)\b', re.IGNORECASE)
+_MEASUREMENT_RE = re.compile(r'\d+\s*(?:mg|mcg|g|ml|cc|units|mEq|mmHg|cm|mm)', re.IGNORECASE)
+_LAB_RESULT_RE = re.compile(r'(?:WBC|RBC|Hgb|Hct|MCV|PLT|Plt)[\s:]*\d+(?:\.\d+)?', re.IGNORECASE)
+_ACRONYM_RE = re.compile(r'\b(?:' + '|'.join(map(re.escape, MEDICAL_ACRONYMS)) + r')\b', re.IGNORECASE)
+
+# Common medical document section headers, matched at the start of a line in a single scan
+_SECTION_HEADER_NAMES = [
+    r'chief\s+complaint|cc',
+    r'history\s+of\s+present\s+illness|hpi',
+    r'past\s+medical\s+history|pmh',
+    r'medications|meds',
+    r'allergies',
+    r'family\s+history|fh',
+    r'social\s+history|sh',
+    r'review\s+of\s+systems|ros',
+    r'physical\s+examination|pe',
+    r'assessment',
+    r'plan',
+    r'impression',
+    r'diagnosis|diagnoses',
+    r'orders',
+    r'follow\s*-?\s*up',
+]
+_SECTION_HEADER_RE = re.compile(
+    r'(?:^|\n)(?:\d+\.\s*)?(?:' + '|'.join(f'(?:{name})' for name in _SECTION_HEADER_NAMES) + r')(?:\s*:|\s*$)',
+    re.IGNORECASE
+)
+
 
 def normalize_medical_text(text: str) -> str:
     """
@@ -91,16 +122,13 @@ def extract_medical_terms(text: str) -> List[str]:
     
     # Look for terms that might be medical
     # Common patterns: dosages, measurements, diagnoses with ICD codes
-    dosage_pattern = r'\d+\s*(?:mg|mcg|g|ml|cc|units|mEq)'
-    terms.extend(re.findall(dosage_pattern, text, re.IGNORECASE))
+    terms.extend(_DOSAGE_RE.findall(text))
     
     # Look for ICD codes
-    icd_pattern = r'(?:ICD-\d+:|ICD-\d+)\s*([A-Z]\d+\.\d+)'
-    terms.extend(re.findall(icd_pattern, text))
+    terms.extend(_ICD_RE.findall(text))
     
     # Look for common medical suffixes
-    medical_suffix_pattern = r'\b\w+(?:itis|osis|emia|opathy|ectomy|otomy|plasty|scopy)\b'
-    terms.extend(re.findall(medical_suffix_pattern, text, re.IGNORECASE))
+    terms.extend(_MEDICAL_SUFFIX_RE.findall(text))
     
     # Clean up and deduplicate
     terms = [term.strip() for term in terms]
@@ -119,38 +147,14 @@ def detect_section_headers(text: str) -> List[Dict[str, str]]:
     Returns:
         List of dictionaries containing section names and their positions
     """
-    # Common medical document section headers
-    header_patterns = [
-        r'(?:^|\n)(?:\d+\.\s*)?(?:chief\s+complaint|cc)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:history\s+of\s+present\s+illness|hpi)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:past\s+medical\s+history|pmh)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:medications|meds)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:allergies)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:family\s+history|fh)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:social\s+history|sh)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:review\s+of\s+systems|ros)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:physical\s+examination|pe)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:assessment)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:plan)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:impression)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:diagnosis|diagnoses)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:orders)(?:\s*:|\s*$)',
-        r'(?:^|\n)(?:\d+\.\s*)?(?:follow\s*-?\s*up)(?:\s*:|\s*$)',
+    # One pass yields the headers in position order
+    return [
+        {
+            "section": match.group().strip().strip(':').strip(),
+            "position": match.start()
+        }
+        for match in _SECTION_HEADER_RE.finditer(text)
     ]
-    
-    headers = []
-    for pattern in header_patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        for match in matches:
-            headers.append({
-                "section": match.group().strip().strip(':').strip(),
-                "position": match.start()
-            })
-    
-    # Sort by position
-    headers.sort(key=lambda x: x["position"])
-    
-    return headers
 
 
 def measure_medical_confidence(text: str) -> float:
@@ -181,23 +185,35 @@ def measure_medical_confidence(text: str) -> float:
         indicators += 1
     
     # Check for measurements and values
-    if re.search(r'\d+\s*(?:mg|mcg|g|ml|cc|units|mEq|mmHg|cm|mm)', text, re.IGNORECASE):
+    if _MEASUREMENT_RE.search(text):
         indicators += 1
     
-    # Check for medical acronyms
-    acronym_count = 0
-    for acronym in MEDICAL_ACRONYMS.keys():
-        if re.search(r'\b' + re.escape(acronym) + r'\b', text, re.IGNORECASE):
-            acronym_count += 1
-    
-    if acronym_count >= 2:
-        indicators += 1
+    # Check for medical acronyms: at least two different ones, in a single scan
+    acronyms_found = set()
+    for match in _ACRONYM_RE.finditer(text):
+        acronyms_found.add(match.group().upper())
+        if len(acronyms_found) >= 2:
+            indicators += 1
+            break
     
     # Check for lab results pattern
-    if re.search(r'(?:WBC|RBC|Hgb|Hct|MCV|PLT|Plt)[\s:]*\d+(?:\.\d+)?', text, re.IGNORECASE):
+    if _LAB_RESULT_RE.search(text):
         indicators += 1
     
     # Calculate confidence score
     confidence = indicators / max_indicators
     
-    return min(confidence, 1.0)  # Cap at 1.0
\ No newline at end of file
+    return min(confidence, 1.0)  # Cap at 1.0
+
+
+def measure_medical_confidence_batch(texts: List[str]) -> List[float]:
+    """
+    Measure the medical confidence of several texts.
+    
+    Args:
+        texts: Texts to analyze
+        
+    Returns:
+        Confidence score (0-1) for each text, in input order
+    """
+    return [measure_medical_confidence(text) for text in texts]
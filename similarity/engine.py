@@ -10,6 +10,12 @@ from typing import List, Dict, Optional, Any, Union
 
 from similarity.vectorization import VectorizationStrategy, TFIDFStrategy
 
+# Optional SIMD kernels (AVX2/AVX-512/NEON) for pairwise vector similarity
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
 
 class SimilarityEngine:
     """
@@ -51,17 +57,18 @@ class SimilarityEngine:
         """
         return self.vectorizer.vectorize(text)
 
-    def vectorize_batch(self, texts: List[str]) -> List[np.ndarray]:
+    def vectorize_batch(self, texts: List[str], as_sparse: bool = False) -> List[np.ndarray]:
         """
         Convert multiple texts to vectors using the configured method.
         
         Args:
             texts: List of texts to vectorize
+            as_sparse: Return 1 x dim sparse rows instead of dense arrays
             
         Returns:
             List of vector representations
         """
-        return self.vectorizer.vectorize_batch(texts)
+        return self.vectorizer.vectorize_batch(texts, as_sparse=as_sparse)
 
     def add_document(self, text: str, doc_name: str) -> None:
         """
@@ -84,6 +91,15 @@ class SimilarityEngine:
         Returns:
             Cosine similarity score (0-1)
         """
+        if simsimd is not None:
+            vec1 = np.asarray(vec1, dtype=np.float64).ravel()
+            vec2 = np.asarray(vec2, dtype=np.float64).ravel()
+            # A zero vector has no direction; score it 0 like the NumPy path does
+            if not vec1.any() or not vec2.any():
+                return 0.0
+            # simsimd returns the cosine distance, computed in one pass without normalized copies
+            return float(1.0 - simsimd.cosine(vec1, vec2))
+        
         # Normalize vectors
         vec1_norm = vec1 / (np.linalg.norm(vec1) + 1e-8)
         vec2_norm = vec2 / (np.linalg.norm(vec2) + 1e-8)
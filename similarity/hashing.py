@@ -8,6 +8,7 @@ import re
 import os
 from typing import List, Dict, Optional, Set, Tuple, Any
 import logging
+import numpy as np
 from datasketch import MinHash, MinHashLSH
 import pickle
 
@@ -22,11 +23,16 @@ logger = logging.getLogger(__name__)
 # Constants
 NUM_PERM = settings.LSH_NUM_PERMUTATIONS if hasattr(settings, 'LSH_NUM_PERMUTATIONS') else 128
 JACCARD_THRESHOLD = settings.LSH_JACCARD_THRESHOLD if hasattr(settings, 'LSH_JACCARD_THRESHOLD') else 0.8
+SHINGLE_BATCH_SIZE = 4096  # Shingles hashed per MinHash.update_batch call
 LSH_INDEX_FILE = "storage/metadata/lsh_index.pkl"
 
 # Ensure metadata directory exists for LSH index
 os.makedirs(os.path.dirname(LSH_INDEX_FILE), exist_ok=True)
 
+# In-process copy of the LSH index file, reloaded only when the rebuild task replaces the file
+_LSH_INDEX_CACHE: Optional[MinHashLSH] = None
+_LSH_INDEX_MTIME: Optional[float] = None
+
 
 def compute_document_hash(pdf_path: str) -> Optional[str]:
     """
@@ -46,14 +52,31 @@ def compute_document_hash(pdf_path: str) -> Optional[str]:
             logger.warning(f"No text extracted from {pdf_path}")
             return None
         
-        # Normalize and hash
-        normalized_text = normalize_for_hash(text)
-        return hashlib.sha256(normalized_text.encode('utf-8')).hexdigest()
+        return compute_document_hash_from_text(text)
     except Exception as e:
         logger.error(f"Error computing document hash: {e}")
         return None
 
 
+def compute_document_hash_from_text(text: str) -> Optional[str]:
+    """
+    Compute a SHA-256 hash of already extracted document text.
+    Avoids re-parsing the PDF when the caller already holds its text.
+    
+    Args:
+        text: Extracted document text
+        
+    Returns:
+        Hash string or None if the text is empty
+    """
+    if not text:
+        return None
+    
+    # Normalize and hash
+    normalized_text = normalize_for_hash(text)
+    return hashlib.sha256(normalized_text.encode('utf-8')).hexdigest()
+
+
 def compute_page_hash(page_text: str) -> str:
     """
     Compute a SHA-256 hash of the page text.
@@ -105,20 +128,64 @@ def get_minhash(text: str, num_perm: int = NUM_PERM) -> MinHash:
         text: Document text
         num_perm: Number of permutations for MinHash
         
+    Returns:
+        MinHash object
+    """
+    return get_minhash_from_tokens(text.split(), num_perm=num_perm)
+
+
+def get_minhash_from_tokens(words: List[str], num_perm: int = NUM_PERM) -> MinHash:
+    """
+    Create a MinHash object from already tokenized document text.
+    All shingles are hashed in one update_batch call instead of one update per shingle.
+    
+    Args:
+        words: Document words, in order
+        num_perm: Number of permutations for MinHash
+        
     Returns:
         MinHash object
     """
     m = MinHash(num_perm=num_perm)
     
-    # Create shingles (3-word sequences)
-    words = text.split()
-    for i in range(len(words) - 2):
-        shingle = " ".join(words[i:i+3])
-        m.update(shingle.encode('utf-8'))
+    # Create shingles (3-word sequences) and hash them in bounded chunks: update_batch
+    # materializes a (shingles x num_perm) uint64 matrix, which for a long document
+    # would otherwise run to hundreds of megabytes.
+    for start in range(0, max(len(words) - 2, 0), SHINGLE_BATCH_SIZE):
+        stop = min(start + SHINGLE_BATCH_SIZE, len(words) - 2)
+        m.update_batch([" ".join(words[i:i+3]).encode('utf-8') for i in range(start, stop)])
         
     return m
 
 
+def serialize_minhash(minhash: MinHash) -> bytes:
+    """
+    Serialize a MinHash to the raw bytes of its uint64 hash values.
+    This is the format stored in DocumentMetadata.minhash_signature.
+    
+    Args:
+        minhash: MinHash object
+        
+    Returns:
+        Raw signature bytes (8 bytes per permutation)
+    """
+    return minhash.hashvalues.astype(np.uint64).tobytes()
+
+
+def deserialize_minhash(data: bytes) -> MinHash:
+    """
+    Rebuild a MinHash from bytes produced by serialize_minhash.
+    
+    Args:
+        data: Raw signature bytes
+        
+    Returns:
+        MinHash object
+    """
+    hashvalues = np.frombuffer(data, dtype=np.uint64)
+    return MinHash(num_perm=len(hashvalues), hashvalues=hashvalues)
+
+
 def create_lsh_index(threshold: float = JACCARD_THRESHOLD, num_perm: int = NUM_PERM) -> MinHashLSH:
     """
     Create an empty Locality-Sensitive Hashing (LSH) index.
@@ -149,7 +216,7 @@ def rebuild_lsh_index_from_db(lsh_index: MinHashLSH, db: Session) -> None:
             doc_id, minhash_bytes = doc_meta
             if minhash_bytes:
                 try:
-                    minhash_obj = MinHash.deserialize(minhash_bytes)
+                    minhash_obj = deserialize_minhash(minhash_bytes)
                     lsh_index.insert(doc_id, minhash_obj)
                     count += 1
                 except Exception as e: # More specific exceptions can be caught if needed
@@ -162,14 +229,22 @@ def rebuild_lsh_index_from_db(lsh_index: MinHashLSH, db: Session) -> None:
 def get_lsh_index_instance() -> MinHashLSH:
     """
     Loads the LSH index from disk. 
+    The loaded index is kept in process memory and only reloaded when the file's
+    modification time changes, so repeated queries don't unpickle the index each time.
     If the file doesn't exist, returns a new, empty LSH index and logs a warning.
     The periodic Celery task is responsible for creating and populating the index file.
     """
+    global _LSH_INDEX_CACHE, _LSH_INDEX_MTIME
     if os.path.exists(LSH_INDEX_FILE):
         try:
+            mtime = os.path.getmtime(LSH_INDEX_FILE)
+            if _LSH_INDEX_CACHE is not None and mtime == _LSH_INDEX_MTIME:
+                return _LSH_INDEX_CACHE
             with open(LSH_INDEX_FILE, 'rb') as f:
                 logger.info(f"Loading LSH index from {LSH_INDEX_FILE}")
-                return pickle.load(f)
+                _LSH_INDEX_CACHE = pickle.load(f)
+            _LSH_INDEX_MTIME = mtime
+            return _LSH_INDEX_CACHE
         except Exception as e:
             logger.error(f"Error loading LSH index from {LSH_INDEX_FILE}: {e}. Returning an empty index.")
             # Fall through to returning a new, empty index
@@ -201,7 +276,7 @@ def save_lsh_index_instance(lsh_index: MinHashLSH) -> None:
                 logger.error(f"Error removing temporary LSH index file {temp_file_path}: {rm_err}")
 
 
-def query_lsh_index(lsh_index: MinHashLSH, minhash: MinHash) -> List[str]:
+def query_lsh_index(lsh_index: MinHashLSH, minhash: MinHash) -> Set[str]:
     """
     Query the in-memory LSH index for similar documents.
     
@@ -210,14 +285,14 @@ def query_lsh_index(lsh_index: MinHashLSH, minhash: MinHash) -> List[str]:
         minhash: MinHash object for the query
         
     Returns:
-        List of similar document IDs
+        Set of candidate document IDs (bands overlap, so each ID appears once)
     """
     # Lock removed, operates on in-memory index.
     if minhash:
-        return lsh_index.query(minhash)
+        return set(lsh_index.query(minhash))
     else:
-        logger.warning("Attempted to query LSH index with None MinHash. Returning empty list.")
-        return []
+        logger.warning("Attempted to query LSH index with None MinHash. Returning empty set.")
+        return set()
 
 
 def compute_page_hashes(pdf_path: str) -> List[str]:
@@ -281,8 +356,8 @@ def fingerprint_document(pdf_path: str) -> Dict[str, Any]:
             logger.warning(f"No text extracted from {pdf_path}")
             return {"error": "No text extracted"}
         
-        # Get document hash
-        doc_hash = compute_document_hash(pdf_path)
+        # Get document hash from the text already in memory
+        doc_hash = compute_document_hash_from_text(text)
         
         # Get page hashes
         pages = extract_pages_from_pdf(pdf_path)
@@ -3,9 +3,16 @@ TF-IDF based document similarity.
 Implements term frequency-inverse document frequency for text comparison.
 """
 
+import hashlib
 import re
+import struct
+import threading
+from collections import OrderedDict
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import normalize
 from sklearn.metrics.pairwise import cosine_similarity
 import json
 import os
@@ -13,6 +20,9 @@ import pickle
 from typing import Dict, List, Optional, Tuple, Union, Any
 import logging
 
+from utils.config import settings
+from utils.extraction_cache import get_cached_vector, cache_vector
+
 # Attempt to import database utilities and model
 try:
     from utils.database import get_db, DocumentVector # Assuming DocumentVector is your SQLAlchemy model
@@ -39,30 +49,83 @@ CORPUS_TEXTS_FILE = "storage/metadata/tfidf_texts.json"
 # Ensure paths exist
 os.makedirs("storage/metadata", exist_ok=True)
 
-# Global vectorizer instance
+# Global vectorizer instance (hashing Pipeline, or a TfidfVectorizer pickled by older versions)
 VECTORIZER = None
+# Modification time of VECTORIZER_FILE when VECTORIZER was loaded or saved, to pick up refits by other processes
+_VECTORIZER_MTIME = None
+
+# Sparse TF-IDF rows of recently vectorized texts, keyed by _vector_cache_key; backed by the shared Redis cache
+_VECTOR_CACHE_SIZE = 256
+_VECTOR_CACHE: "OrderedDict[str, sp.csr_matrix]" = OrderedDict()
+_VECTOR_CACHE_LOCK = threading.Lock()
+# Header for cached vectors: dimension, non-zero count (followed by int32 indices and float32 values)
+_CACHED_VECTOR_HEADER = struct.Struct("<II")
+
+# Header for quantized vectors: magic, dimension, non-zero count, scale
+_QUANTIZED_MAGIC = b"Q8V1"
+_QUANTIZED_HEADER = struct.Struct("<4sIIf")
 
 # --- Database Helper Functions --- 
-def _vector_to_binary(vector: np.ndarray) -> bytes:
-    """Serialize numpy array to bytes."""
-    return pickle.dumps(vector) # Using pickle for numpy arrays is common
+def _vector_to_binary(vector: np.ndarray, vector_type: str = 'tfidf') -> bytes:
+    """
+    Serialize a 1-D TF-IDF vector as sparse int8 (indices int32, values int8, scale float32).
+    TF-IDF rows are mostly zeros with L2-normalized values, so this is a fraction
+    of the pickled float64 array. Other vector types and arrays are pickled losslessly.
+    A 1 x dim sparse TF-IDF row is serialized from its non-zeros without densifying it.
+    """
+    if vector_type == 'tfidf' and sp.issparse(vector) and vector.shape[0] == 1:
+        row = sp.csr_matrix(vector)
+        row.sum_duplicates()
+        row.eliminate_zeros()
+        dim = row.shape[1]
+        indices = row.indices.astype(np.int32)
+        values = row.data
+    else:
+        if sp.issparse(vector):
+            vector = vector.toarray().ravel()
+        vector = np.asarray(vector)
+        if vector_type != 'tfidf' or vector.ndim != 1 or not np.issubdtype(vector.dtype, np.floating):
+            return pickle.dumps(vector) # Using pickle for numpy arrays is common
+        dim = vector.shape[0]
+        indices = np.flatnonzero(vector).astype(np.int32)
+        values = vector[indices]
+    max_abs = float(np.abs(values).max()) if values.size else 0.0
+    scale = max_abs / 127.0 if max_abs > 0 else 1.0
+    quantized = np.round(values / scale).astype(np.int8)
+    header = _QUANTIZED_HEADER.pack(_QUANTIZED_MAGIC, dim, indices.size, scale)
+    return header + indices.tobytes() + quantized.tobytes()
 
 def _binary_to_vector(data: bytes) -> np.ndarray:
-    """Deserialize bytes to numpy array."""
-    return pickle.loads(data)
-
-def insert_document_vector(db: Session, doc_id: str, vector: np.ndarray, vector_type: str = 'tfidf'):
-    """Insert or update a document vector in the database."""
+    """Deserialize bytes to a dense float32 vector (legacy pickled arrays are returned as stored)."""
+    if not data.startswith(_QUANTIZED_MAGIC):
+        return pickle.loads(data)
+    return _binary_to_sparse(data).toarray()[0]
+
+def _binary_to_sparse(data: bytes) -> sp.csr_matrix:
+    """Deserialize bytes to a 1 x dim CSR row without densifying quantized vectors."""
+    if not data.startswith(_QUANTIZED_MAGIC):
+        return sp.csr_matrix(np.asarray(pickle.loads(data), dtype=np.float32).reshape(1, -1))
+    _, dim, nnz, scale = _QUANTIZED_HEADER.unpack_from(data)
+    offset = _QUANTIZED_HEADER.size
+    indices = np.frombuffer(data, dtype=np.int32, count=nnz, offset=offset)
+    values = np.frombuffer(data, dtype=np.int8, count=nnz, offset=offset + 4 * nnz).astype(np.float32) * np.float32(scale)
+    return sp.csr_matrix((values, indices, np.array([0, nnz])), shape=(1, dim))
+
+def insert_document_vector(db: Session, doc_id: str, vector: np.ndarray, vector_type: str = 'tfidf', commit: bool = True):
+    """
+    Insert or update a document vector in the database.
+    With commit=False the change is only flushed, so the caller can commit it with other updates.
+    """
     if not db or not DocumentVector:
         logger.error("Database session or DocumentVector model not available for insert_document_vector.")
         return
     try:
         existing_vector = db.query(DocumentVector).filter_by(document_id=doc_id, vector_type=vector_type).first()
-        binary_vector = _vector_to_binary(vector)
+        binary_vector = _vector_to_binary(vector, vector_type)
         
         if existing_vector:
             existing_vector.vector_data = binary_vector
-            logger.info(f"Updated vector for {doc_id} ({vector_type}) in DB.")
+            logger.debug("Updated vector for %s (%s) in DB.", doc_id, vector_type)
         else:
             db_vector = DocumentVector(
                 document_id=doc_id,
@@ -70,13 +133,44 @@ def insert_document_vector(db: Session, doc_id: str, vector: np.ndarray, vector_
                 vector_data=binary_vector
             )
             db.add(db_vector)
-            logger.info(f"Inserted new vector for {doc_id} ({vector_type}) into DB.")
-        db.commit()
+            logger.debug("Inserted new vector for %s (%s) into DB.", doc_id, vector_type)
+        if commit:
+            db.commit()
+        else:
+            db.flush()
     except Exception as e:
         db.rollback()
         logger.error(f"Error in insert_document_vector for {doc_id}: {e}", exc_info=True)
         raise
 
+def insert_document_vectors(db: Session, doc_vectors: List[Tuple[str, np.ndarray]], vector_type: str = 'tfidf'):
+    """Insert or update several document vectors in a single transaction."""
+    if not db or not DocumentVector:
+        logger.error("Database session or DocumentVector model not available for insert_document_vectors.")
+        return
+    if not doc_vectors:
+        return
+    try:
+        doc_ids = [doc_id for doc_id, _ in doc_vectors]
+        existing = {
+            v.document_id: v
+            for v in db.query(DocumentVector).filter(
+                DocumentVector.document_id.in_(doc_ids), DocumentVector.vector_type == vector_type
+            ).all()
+        }
+        for doc_id, vector in doc_vectors:
+            binary_vector = _vector_to_binary(vector, vector_type)
+            if doc_id in existing:
+                existing[doc_id].vector_data = binary_vector
+            else:
+                db.add(DocumentVector(document_id=doc_id, vector_type=vector_type, vector_data=binary_vector))
+        db.commit()
+        logger.info(f"Stored {len(doc_vectors)} {vector_type} vectors in DB ({len(existing)} updated).")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error in insert_document_vectors: {e}", exc_info=True)
+        raise
+
 def get_document_vector(db: Session, doc_id: str, vector_type: str = 'tfidf') -> Optional[np.ndarray]:
     """Retrieve a specific document vector from the database."""
     if not db or not DocumentVector:
@@ -91,14 +185,22 @@ def get_document_vector(db: Session, doc_id: str, vector_type: str = 'tfidf') ->
         logger.error(f"Error in get_document_vector for {doc_id}: {e}", exc_info=True)
         return None
 
-def get_all_document_vectors(db: Session, vector_type: str = 'tfidf') -> List[Tuple[str, np.ndarray]]:
-    """Retrieve all document vectors of a specific type from the database."""
+def get_all_document_vectors(db: Session, vector_type: str = 'tfidf', doc_ids: Optional[List[str]] = None, as_sparse: bool = False) -> List[Tuple[str, Any]]:
+    """
+    Retrieve all document vectors of a specific type from the database.
+    When doc_ids is given, only those documents' vectors are fetched.
+    With as_sparse=True each vector is returned as a 1 x dim CSR row instead of a dense array.
+    """
     if not db or not DocumentVector:
         logger.error("Database session or DocumentVector model not available for get_all_document_vectors.")
         return []
     try:
-        vectors_data = db.query(DocumentVector.document_id, DocumentVector.vector_data).filter_by(vector_type=vector_type).all()
-        return [(doc_id, _binary_to_vector(vec_data)) for doc_id, vec_data in vectors_data]
+        query = db.query(DocumentVector.document_id, DocumentVector.vector_data).filter_by(vector_type=vector_type)
+        if doc_ids is not None:
+            query = query.filter(DocumentVector.document_id.in_(doc_ids))
+        vectors_data = query.all()
+        decode = _binary_to_sparse if as_sparse else _binary_to_vector
+        return [(doc_id, decode(vec_data)) for doc_id, vec_data in vectors_data]
     except Exception as e:
         logger.error(f"Error in get_all_document_vectors for {vector_type}: {e}", exc_info=True)
         return []
@@ -125,15 +227,32 @@ def preprocess_text(text: str) -> str:
     return text
 
 
-def _load_vectorizer() -> Optional[TfidfVectorizer]:
+def is_vectorizer_fitted(vectorizer: Any) -> bool:
+    """Whether a loaded vectorizer can transform text (has idf weights or a vocabulary)."""
+    if isinstance(vectorizer, Pipeline):
+        return hasattr(vectorizer.named_steps.get('tfidf'), 'idf_')
+    return bool(getattr(vectorizer, 'vocabulary_', None))
+
+
+def _vectorizer_file_mtime() -> Optional[float]:
+    """Modification time of VECTORIZER_FILE, or None if it does not exist."""
+    try:
+        return os.path.getmtime(VECTORIZER_FILE)
+    except OSError:
+        return None
+
+
+def _load_vectorizer() -> Optional[Union[Pipeline, TfidfVectorizer]]:
     """
     Load the fitted TF-IDF vectorizer from file.
+    The in-process copy is reused until the file is replaced (e.g. refitted by a worker).
     Returns the fitted vectorizer if found and valid, otherwise None.
     """
-    global VECTORIZER
+    global VECTORIZER, _VECTORIZER_MTIME
+    file_mtime = _vectorizer_file_mtime()
     # Check cached instance first
-    if VECTORIZER is not None:
-        if hasattr(VECTORIZER, 'vocabulary_') and VECTORIZER.vocabulary_:
+    if VECTORIZER is not None and (file_mtime is None or file_mtime == _VECTORIZER_MTIME):
+        if is_vectorizer_fitted(VECTORIZER):
             # logger.debug("Returning cached fitted TF-IDF vectorizer.") # Optional: for verbose logging
             return VECTORIZER
         else:
@@ -146,8 +265,9 @@ def _load_vectorizer() -> Optional[TfidfVectorizer]:
                 loaded_vectorizer = pickle.load(f)
             logger.info(f"Successfully loaded TF-IDF vectorizer from {VECTORIZER_FILE}.")
             
-            if hasattr(loaded_vectorizer, 'vocabulary_') and loaded_vectorizer.vocabulary_:
+            if is_vectorizer_fitted(loaded_vectorizer):
                 VECTORIZER = loaded_vectorizer # Update cache with the good one
+                _VECTORIZER_MTIME = file_mtime
                 return VECTORIZER
             else:
                 logger.warning(f"Vectorizer loaded from {VECTORIZER_FILE} is not fitted. Discarding.")
@@ -163,12 +283,12 @@ def _load_vectorizer() -> Optional[TfidfVectorizer]:
         return None
 
 
-def load_fitted_tfidf_vectorizer() -> Optional[TfidfVectorizer]:
+def load_fitted_tfidf_vectorizer() -> Optional[Union[Pipeline, TfidfVectorizer]]:
     """Public wrapper for loading the fitted TF-IDF vectorizer."""
     return _load_vectorizer()
 
 
-def _save_vectorizer(vectorizer: TfidfVectorizer) -> None:
+def _save_vectorizer(vectorizer: Pipeline) -> None:
     """
     Save the fitted TF-IDF vectorizer to file.
     
@@ -265,7 +385,7 @@ def update_tfidf_corpus(text: str, doc_name: str) -> None:
         return
 
     vectorizer = _load_vectorizer()
-    if vectorizer is None or not hasattr(vectorizer, 'vocabulary_') or not vectorizer.vocabulary_:
+    if vectorizer is None or not is_vectorizer_fitted(vectorizer):
         logger.error(
             f"TF-IDF vectorizer is not fitted. Cannot process document {doc_name}. "
             "Please fit and save the vectorizer first (e.g., using fit_vectorizer_and_save())."
@@ -280,7 +400,7 @@ def update_tfidf_corpus(text: str, doc_name: str) -> None:
         return
 
     try:
-        new_vector = vectorizer.transform([processed_text]).toarray()[0]
+        new_vector = _transform_texts(vectorizer, [processed_text])
         
         with get_db() as db: # Assuming get_db is a context manager yielding a session
             insert_document_vector(db, doc_name, new_vector, 'tfidf')
@@ -289,9 +409,11 @@ def update_tfidf_corpus(text: str, doc_name: str) -> None:
         logger.error(f"Error vectorizing or storing document {doc_name}: {e}", exc_info=True)
         # Not re-raising here to allow batch processing to potentially continue
     
-def fit_vectorizer_and_save(texts: List[str], vectorizer_path: str = VECTORIZER_FILE) -> TfidfVectorizer:
+def fit_vectorizer_and_save(texts: List[str], vectorizer_path: str = VECTORIZER_FILE) -> Pipeline:
     """
-    Fits a new TfidfVectorizer on the provided texts and saves it.
+    Fits a new hashing TF-IDF pipeline on the provided texts and saves it.
+    Terms are hashed straight to column indices, so only the idf weights are learned
+    and no vocabulary dict is consulted at transform time.
     This should be called as part of a setup or retraining process.
 
     Args:
@@ -299,11 +421,21 @@ def fit_vectorizer_and_save(texts: List[str], vectorizer_path: str = VECTORIZER_
         vectorizer_path: Path to save the fitted vectorizer.
 
     Returns:
-        The fitted TfidfVectorizer instance.
+        The fitted Pipeline (HashingVectorizer + TfidfTransformer).
     """
-    global VECTORIZER
+    global VECTORIZER, _VECTORIZER_MTIME
     logger.info(f"Starting to fit a new TF-IDF vectorizer on {len(texts)} documents.")
-    new_vectorizer = TfidfVectorizer(ngram_range=(1, 2), stop_words='english', max_df=0.95, min_df=2)
+    new_vectorizer = Pipeline([
+        ('hash', HashingVectorizer(
+            n_features=settings.TFIDF_HASH_FEATURES,
+            ngram_range=(1, 2),
+            stop_words='english',
+            norm=None,
+            alternate_sign=False,
+            dtype=np.float32,
+        )),
+        ('tfidf', TfidfTransformer(sublinear_tf=True)),
+    ])
     
     processed_texts = [preprocess_text(text) for text in texts]
     new_vectorizer.fit(processed_texts)
@@ -311,9 +443,57 @@ def fit_vectorizer_and_save(texts: List[str], vectorizer_path: str = VECTORIZER_
     
     _save_vectorizer(new_vectorizer) # Save it to the default path or specified one
     VECTORIZER = new_vectorizer # Update global cache
+    _VECTORIZER_MTIME = _vectorizer_file_mtime()
     return new_vectorizer
 
     
+def _vector_cache_key(processed_text: str) -> Optional[str]:
+    """
+    Cache key for the vector of a preprocessed text under the loaded vectorizer.
+    Returns None when the vectorizer was not loaded from or saved to VECTORIZER_FILE,
+    since its version then cannot be identified.
+    """
+    if _VECTORIZER_MTIME is None:
+        return None
+    # The f32 suffix keeps entries written with float64 values by earlier versions from being read
+    return f"{hashlib.sha256(processed_text.encode('utf-8')).hexdigest()}:{_VECTORIZER_MTIME!r}:f32"
+
+
+def _cached_vector(key: str) -> Optional[sp.csr_matrix]:
+    """Look up a sparse 1 x D vector in the in-process LRU, then the shared Redis cache."""
+    with _VECTOR_CACHE_LOCK:
+        row = _VECTOR_CACHE.get(key)
+        if row is not None:
+            _VECTOR_CACHE.move_to_end(key)
+            return row
+    payload = get_cached_vector(key)
+    if payload is None:
+        return None
+    # Exact float32 values as produced by _transform_texts, unlike the quantized database format
+    dim, nnz = _CACHED_VECTOR_HEADER.unpack_from(payload)
+    offset = _CACHED_VECTOR_HEADER.size
+    indices = np.frombuffer(payload, dtype=np.int32, count=nnz, offset=offset)
+    values = np.frombuffer(payload, dtype=np.float32, count=nnz, offset=offset + indices.nbytes)
+    row = sp.csr_matrix((values, indices, np.array([0, nnz])), shape=(1, dim))
+    _remember_vector(key, row, shared=False)
+    return row
+
+
+def _remember_vector(key: str, row: sp.csr_matrix, shared: bool = True) -> None:
+    """Store a sparse 1 x D vector in the in-process LRU, and in the shared Redis cache if shared is set."""
+    if shared:
+        payload = (
+            _CACHED_VECTOR_HEADER.pack(row.shape[1], row.nnz)
+            + row.indices.astype(np.int32).tobytes()
+            + row.data.astype(np.float32).tobytes()
+        )
+        cache_vector(key, payload)
+    with _VECTOR_CACHE_LOCK:
+        _VECTOR_CACHE[key] = row
+        if len(_VECTOR_CACHE) > _VECTOR_CACHE_SIZE:
+            _VECTOR_CACHE.popitem(last=False)
+
+
 def tfidf_vectorize(text: str) -> Optional[np.ndarray]:
     """
     Convert text into a TF-IDF vector using the pre-fitted vectorizer.
@@ -328,7 +508,7 @@ def tfidf_vectorize(text: str) -> Optional[np.ndarray]:
         ValueError: If the vectorizer is not fitted (should be caught by check)
     """
     vectorizer = _load_vectorizer()
-    if vectorizer is None or not hasattr(vectorizer, 'vocabulary_') or not vectorizer.vocabulary_:
+    if vectorizer is None or not is_vectorizer_fitted(vectorizer):
         logger.error("The TF-IDF vectorizer is not fitted. Cannot vectorize text.")
         # raise ValueError("The TF-IDF vectorizer is not fitted") # Or return None
         return None 
@@ -340,16 +520,101 @@ def tfidf_vectorize(text: str) -> Optional[np.ndarray]:
         # For consistency, let's return a zero vector of the correct dimension or handle as error.
         # For now, returning None as TFIDF for empty string is problematic.
         return None
-    return vectorizer.transform([processed_text]).toarray()[0]
-
+    # Identical texts (re-uploads, repeated comparisons) are vectorized once per vectorizer version
+    key = _vector_cache_key(processed_text)
+    if key is not None:
+        cached = _cached_vector(key)
+        if cached is not None:
+            return cached.toarray()[0]
+    row = _transform_texts(vectorizer, [processed_text])
+    if key is not None:
+        _remember_vector(key, row)
+    return row.toarray()[0]
+
+
+def tfidf_vectorize_batch(texts: List[str], as_sparse: bool = False) -> List[Optional[Union[np.ndarray, sp.csr_matrix]]]:
+    """
+    Convert several texts into TF-IDF vectors with a single transform call.
+    
+    Args:
+        texts: Texts to vectorize
+        as_sparse: Return each vector as a 1 x dim CSR row instead of a dense array.
+            Dense rows of the hashed feature space take about 1 MB each.
+        
+    Returns:
+        One vector per input text, None where the text is empty or the vectorizer is not fitted
+    """
+    vectorizer = _load_vectorizer()
+    if vectorizer is None or not is_vectorizer_fitted(vectorizer):
+        logger.error("The TF-IDF vectorizer is not fitted. Cannot vectorize texts.")
+        return [None] * len(texts)
 
-def tfidf_search(query_vector: np.ndarray, threshold: float = 0.85) -> Optional[Dict]:
+    processed_texts = [preprocess_text(text) for text in texts]
+    vectors: List[Optional[Union[np.ndarray, sp.csr_matrix]]] = [None] * len(texts)
+    keys: List[Optional[str]] = [None] * len(texts)
+    missing = []
+    for i, text in enumerate(processed_texts):
+        if not text.strip():
+            continue
+        keys[i] = _vector_cache_key(text)
+        if keys[i] is not None:
+            vectors[i] = _cached_vector(keys[i])
+        if vectors[i] is None:
+            missing.append(i)
+    if missing:
+        # Transform each distinct text once; re-uploaded documents often extract to identical text
+        first_index: Dict[str, int] = {}
+        for i in missing:
+            first_index.setdefault(processed_texts[i], i)
+        matrix = _transform_texts(vectorizer, list(first_index))
+        rows = {}
+        for row, (text, i) in enumerate(first_index.items()):
+            rows[text] = row
+            if keys[i] is not None:
+                _remember_vector(keys[i], matrix[row])
+        for i in missing:
+            vectors[i] = matrix[rows[processed_texts[i]]]
+
+    if as_sparse:
+        return vectors
+    # Densify row by row; the hashed feature space is too wide to densify the whole batch at once
+    return [None if row is None else row.toarray()[0] for row in vectors]
+
+
+def _transform_texts(vectorizer: Union[Pipeline, TfidfVectorizer], processed_texts: List[str]):
+    """
+    Equivalent of vectorizer.transform(processed_texts), as float32 rows.
+    Scales the count matrix's data array by idf directly rather than multiplying
+    by sklearn's sparse idf diagonal, which allocates a second CSR matrix.
+    """
+    if isinstance(vectorizer, Pipeline):
+        X = vectorizer.named_steps['hash'].transform(processed_texts)
+        weighting = vectorizer.named_steps['tfidf']
+    else:
+        # Vectorizer pickled before the switch to feature hashing
+        X = CountVectorizer.transform(vectorizer, processed_texts).astype(vectorizer.dtype, copy=False)
+        weighting = vectorizer
+    if weighting.sublinear_tf:
+        np.log(X.data, X.data)
+        X.data += 1
+    if weighting.use_idf:
+        X.data *= weighting.idf_[X.indices]
+    if weighting.norm:
+        X = normalize(X, norm=weighting.norm, copy=False)
+    # Vectorizers pickled before the switch to feature hashing produce float64
+    return X.astype(np.float32, copy=False)
+
+
+def tfidf_search(query_vector: np.ndarray, threshold: float = 0.85, candidate_ids: Optional[List[str]] = None, db: Optional[Session] = None) -> Optional[Dict]:
     """
     Compare the query vector against TF-IDF vectors stored in the database.
     
     Args:
         query_vector: Query TF-IDF vector
         threshold: Similarity threshold for determining matches
+        candidate_ids: Optional document IDs to restrict the search to (e.g. LSH candidates).
+            None searches the whole corpus.
+        db: Optional session to reuse; a new one is opened when omitted.
         
     Returns:
         Match information if similarity exceeds threshold, else None
@@ -362,54 +627,62 @@ def tfidf_search(query_vector: np.ndarray, threshold: float = 0.85) -> Optional[
         logger.warning("Received an empty or None query vector for TF-IDF search.")
         return None
 
-    best_match_doc_id = None
-    best_sim = -1.0 # Initialize to a value lower than any possible cosine similarity
-    
+    if candidate_ids is not None and not candidate_ids:
+        return None
+
     try:
-        with get_db() as db:
-            all_doc_vectors = get_all_document_vectors(db, 'tfidf')
+        if db is not None:
+            all_doc_vectors = get_all_document_vectors(db, 'tfidf', doc_ids=candidate_ids, as_sparse=True)
+        else:
+            with get_db() as session:
+                all_doc_vectors = get_all_document_vectors(session, 'tfidf', doc_ids=candidate_ids, as_sparse=True)
         
         if not all_doc_vectors:
             logger.info("No TF-IDF vectors found in the database to search against.")
             return None
         
-        query_norm = np.linalg.norm(query_vector)
+        # Ensure vectors are 1D for dot product if they are not already (e.g. (1, N) shape)
+        q_vec = query_vector.flatten()
+        query_norm = np.linalg.norm(q_vec)
         if query_norm == 0:
             logger.warning("Query vector has zero norm. Cannot compute similarity.")
             return None
-            
-        for doc_id, doc_vec_array in all_doc_vectors:
-            if doc_vec_array is None or doc_vec_array.size == 0:
+
+        doc_ids = []
+        doc_rows = []
+        for doc_id, doc_row in all_doc_vectors:
+            if doc_row is None or doc_row.shape[1] == 0:
                 logger.warning(f"Skipping document {doc_id} due to empty or None vector in DB.")
                 continue
-
-            doc_norm = np.linalg.norm(doc_vec_array)
-            if doc_norm == 0:
-                logger.warning(f"Skipping document {doc_id} due to zero norm vector in DB.")
+            if doc_row.shape[1] != q_vec.shape[0]:
+                logger.warning(f"Shape mismatch between query vector ({q_vec.shape}) and DB vector for {doc_id} ({doc_row.shape[1]},). Skipping.")
                 continue
-            
-            # Ensure vectors are 1D for dot product if they are not already (e.g. (1, N) shape)
-            q_vec = query_vector.flatten()
-            d_vec = doc_vec_array.flatten()
+            doc_ids.append(doc_id)
+            doc_rows.append(doc_row)
 
-            if q_vec.shape != d_vec.shape:
-                logger.warning(f"Shape mismatch between query vector ({q_vec.shape}) and DB vector for {doc_id} ({d_vec.shape}). Skipping.")
-                continue
+        if not doc_rows:
+            logger.info("No comparable TF-IDF vectors found in the database to search against.")
+            return None
 
-            sim = np.dot(q_vec, d_vec) / (query_norm * doc_norm)
-            
-            if sim > best_sim:
-                best_sim = sim
-                best_match_doc_id = doc_id
+        # Score every stored vector in one sparse matrix-vector product
+        doc_matrix = sp.vstack(doc_rows, format='csr')
+        doc_norms = np.sqrt(np.asarray(doc_matrix.multiply(doc_matrix).sum(axis=1)).ravel())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sims = (doc_matrix @ q_vec) / (doc_norms * query_norm)
+        sims[doc_norms == 0] = -1.0 # Zero-norm vectors can't match anything
+
+        best_idx = int(np.argmax(sims))
+        best_match_doc_id = doc_ids[best_idx]
+        best_sim = float(sims[best_idx])
         
-        if best_match_doc_id is not None and best_sim >= threshold:
-            logger.info(f"TF-IDF search found match: {best_match_doc_id} with similarity {best_sim:.4f}")
+        if best_sim >= threshold:
+            logger.debug("TF-IDF search found match: %s with similarity %.4f", best_match_doc_id, best_sim)
             return {
                 "matched_doc": best_match_doc_id,
-                "similarity": round(float(best_sim), 4) # Ensure float for JSON serialization
+                "similarity": round(best_sim, 4) # Ensure float for JSON serialization
             }
         
-        logger.info(f"TF-IDF search no match found (best: {best_match_doc_id} at {best_sim:.4f}, threshold: {threshold})")
+        logger.debug("TF-IDF search no match found (best: %s at %.4f, threshold: %s)", best_match_doc_id, best_sim, threshold)
         return None
 
     except Exception as e:
@@ -420,6 +693,9 @@ def tfidf_search(query_vector: np.ndarray, threshold: float = 0.85) -> Optional[
 def analyze_document_pages(pages: List[Union[str, Dict]], threshold: float = 0.85) -> List[Dict]:
     """
     Analyze a document's pages for duplicate content.
+    Pages are weighted with the corpus-wide vectorizer when one is fitted, so scores use
+    corpus IDF and are comparable across documents; otherwise a vectorizer is fitted on
+    this document's pages alone.
     
     Args:
         pages: List of page texts or dictionaries with text_snippet field
@@ -454,33 +730,33 @@ def analyze_document_pages(pages: List[Union[str, Dict]], threshold: float = 0.8
     processed_pages = [preprocess_text(page) for page in page_texts]
     logger.debug(f"Preprocessed pages lengths: {[len(p) for p in processed_pages]}")
     
-    # Create a new vectorizer for this document only
-    logger.debug("Creating new TF-IDF vectorizer for page analysis")
-    vectorizer = TfidfVectorizer(ngram_range=(1, 2), stop_words='english')
+    corpus_vectorizer = _load_vectorizer()
     
     try:
-        # Fit and transform all pages
-        logger.debug("Fitting and transforming pages")
-        vectors = vectorizer.fit_transform(processed_pages).toarray()
+        # Rows stay sparse and are L2-normalized by either vectorizer
+        if corpus_vectorizer is not None:
+            logger.debug("Transforming pages with the corpus TF-IDF vectorizer")
+            vectors = _transform_texts(corpus_vectorizer, processed_pages)
+        else:
+            # No corpus vectorizer fitted yet: fit one on this document only
+            logger.debug("Fitting a document-local TF-IDF vectorizer for page analysis")
+            vectors = TfidfVectorizer(ngram_range=(1, 2), stop_words='english').fit_transform(processed_pages)
         logger.debug(f"Vector shape: {vectors.shape}")
         
-        # Find similar page pairs
-        similar_pairs = []
-        n_pages = len(pages)
+        # Cosine similarity of every page pair in one sparse product (dot product of unit rows)
+        n_pages = vectors.shape[0]
         logger.debug(f"Comparing {n_pages} pages")
+        sims = (vectors @ vectors.T).toarray()
         
-        for i in range(n_pages):
-            for j in range(i + 1, n_pages):
-                # Calculate cosine similarity
-                sim = np.dot(vectors[i], vectors[j]) / (np.linalg.norm(vectors[i]) * np.linalg.norm(vectors[j]) + 1e-8)
-                
-                if sim >= threshold:
-                    logger.debug(f"Found similar pages {i} and {j} with similarity {sim:.4f}")
-                    similar_pairs.append({
-                        "page1_idx": i,
-                        "page2_idx": j,
-                        "similarity": float(sim)
-                    })
+        similar_pairs = []
+        for i, j in np.argwhere(np.triu(sims, 1) >= threshold):
+            sim = sims[i, j]
+            logger.debug(f"Found similar pages {i} and {j} with similarity {sim:.4f}")
+            similar_pairs.append({
+                "page1_idx": int(i),
+                "page2_idx": int(j),
+                "similarity": float(sim)
+            })
         
         logger.debug(f"Analysis complete. Found {len(similar_pairs)} similar pairs")
         return similar_pairs
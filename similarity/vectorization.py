@@ -28,12 +28,13 @@ class VectorizationStrategy(ABC):
         pass
     
     @abstractmethod
-    def vectorize_batch(self, texts: List[str]) -> List[np.ndarray]:
+    def vectorize_batch(self, texts: List[str], as_sparse: bool = False) -> List[np.ndarray]:
         """
         Convert multiple texts to vector representations.
         
         Args:
             texts: List of texts to vectorize
+            as_sparse: Return 1 x dim sparse rows instead of dense arrays
             
         Returns:
             List of vector representations
@@ -62,9 +63,11 @@ class TFIDFStrategy(VectorizationStrategy):
         """Initialize the TF-IDF strategy."""
         from similarity.tfidf import (
             tfidf_vectorize, 
+            tfidf_vectorize_batch,
             update_tfidf_corpus
         )
         self._vectorize = tfidf_vectorize
+        self._vectorize_batch = tfidf_vectorize_batch
         self._update_corpus = update_tfidf_corpus
     
     def vectorize(self, text: str) -> np.ndarray:
@@ -79,17 +82,18 @@ class TFIDFStrategy(VectorizationStrategy):
         """
         return self._vectorize(text)
     
-    def vectorize_batch(self, texts: List[str]) -> List[np.ndarray]:
+    def vectorize_batch(self, texts: List[str], as_sparse: bool = False) -> List[np.ndarray]:
         """
         Convert multiple texts to TF-IDF vectors.
         
         Args:
             texts: List of texts to vectorize
+            as_sparse: Return 1 x dim CSR rows instead of dense arrays
             
         Returns:
             List of TF-IDF vectors
         """
-        return [self._vectorize(text) for text in texts]
+        return self._vectorize_batch(texts, as_sparse=as_sparse)
     
     def update_corpus(self, text: str, doc_name: str) -> None:
         """
@@ -26,6 +26,9 @@ class Settings(BaseSettings):
     PAGE_IMAGES_PATH: str = Field(default="storage/page_images")
     METADATA_PATH: str = Field(default="storage/metadata")
     TEMP_PATH: str = Field(default="storage/tmp")
+    # Request-local upload copies and OCR work files. Point it at a RAM-backed tmpfs
+    # (e.g. /dev/shm/dedup_tmp) to opt in, if that is large enough for the uploads.
+    SCRATCH_PATH: str = Field(default="storage/tmp", env="SCRATCH_PATH")
     
     # Configurable subpaths for document statuses
     UNIQUE_DOCS_SUBPATH: str = Field(default="unique", env="UNIQUE_DOCS_SUBPATH")
@@ -39,6 +42,7 @@ class Settings(BaseSettings):
     
     # Document analysis settings
     MIN_TEXT_LENGTH: int = Field(default=50)
+    MIN_PIPELINE_CHARS: int = Field(default=200, env="MIN_PIPELINE_CHARS")  # Documents with less extracted text are rejected in Stage 0
     MAX_FILE_SIZE: int = Field(default=50 * 1024 * 1024)  # 50MB
     ALLOWED_EXTENSIONS: List[str] = Field(default=["pdf"])
     
@@ -52,6 +56,7 @@ class Settings(BaseSettings):
     
     # Vector embedding settings
     SIMILARITY_METHOD: str = Field(default="tfidf", env="SIMILARITY_METHOD")
+    TFIDF_HASH_FEATURES: int = Field(default=2**18, env="TFIDF_HASH_FEATURES")  # Width of the hashed TF-IDF feature space
     # VECTOR_DIMENSION: int = Field(default=768)
     # EMBEDDING_MODEL: str = Field(default="all-MiniLM-L6-v2", env="EMBEDDING_MODEL")
     
@@ -62,23 +67,37 @@ class Settings(BaseSettings):
     # LSH settings
     LSH_JACCARD_THRESHOLD: float = Field(default=0.8, env="LSH_JACCARD_THRESHOLD")
     LSH_NUM_PERMUTATIONS: int = Field(default=128, env="LSH_NUM_PERMUTATIONS")
+    # When true, only the LSH candidate set is searched for TF-IDF matches.
+    # Set it to false to scan the whole corpus instead, e.g. to catch uploads made since
+    # the periodic LSH index rebuild.
+    TRUST_LSH_NEGATIVES: bool = Field(default=True, env="TRUST_LSH_NEGATIVES")
     
     # Celery / Redis settings
     REDIS_HOST: str = Field(default="localhost", env="REDIS_HOST")
     REDIS_PORT: int = Field(default=6379, env="REDIS_PORT")
     CELERY_BROKER_URL: Optional[str] = Field(default=None, env="CELERY_BROKER_URL")
     CELERY_RESULT_BACKEND: Optional[str] = Field(default=None, env="CELERY_RESULT_BACKEND")
+    PIPELINE_FAST_QUEUE: Optional[str] = Field(default=None, env="PIPELINE_FAST_QUEUE")  # Queue for the exact hash check stage; None uses the default queue
+    EXTRACTION_CACHE_URL: Optional[str] = Field(default=None, env="EXTRACTION_CACHE_URL")  # Defaults to Redis DB 2 on REDIS_HOST
+    EXTRACTION_CACHE_TTL: int = Field(default=24 * 3600, env="EXTRACTION_CACHE_TTL")  # Seconds; 0 disables the cache
+    PIPELINE_STATE_URL: Optional[str] = Field(default=None, env="PIPELINE_STATE_URL")  # Text handed between stage tasks; defaults to Redis DB 3 on REDIS_HOST
+    PIPELINE_STATE_TTL: int = Field(default=24 * 3600, env="PIPELINE_STATE_TTL")  # Seconds a document's stage text outlives an unfinished chain
 
     # Database settings
     DATABASE_URL: str = Field(default="sqlite:///./test.db", env="DATABASE_URL")
+    DB_POOL_SIZE: int = Field(default=5, env="DB_POOL_SIZE")
     
     # Processing limits
     MAX_BATCH_SIZE: int = Field(default=100, env="MAX_BATCH_SIZE")
+    PAGE_WORKERS: int = Field(default=4, env="PAGE_WORKERS")  # Processes for /content document analysis; <= 1 runs serially
     
     # OCR settings
     OCR_DPI: int = Field(default=300, env="OCR_DPI")
     OCR_LANGUAGE: str = Field(default="eng", env="OCR_LANGUAGE")
     ENABLE_OCR: bool = Field(default=True, env="ENABLE_OCR")
+    OCR_CONCURRENCY: int = Field(default=os.cpu_count() or 1, env="OCR_CONCURRENCY")  # Tesseract processes run at once per request
+    ANALYSIS_DPI: int = Field(default=200, env="ANALYSIS_DPI")  # Render resolution of pages OCR'd for highlighting
+    COMPARE_DISPLAY_DPI: int = Field(default=150, env="COMPARE_DISPLAY_DPI")  # Render resolution of highlighted comparison pages
     
     # Thumbnail generation
     THUMBNAIL_SIZE: tuple = Field(default=(200, 200))
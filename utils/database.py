@@ -1,12 +1,12 @@
 # utils/database.py
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, LargeBinary, ForeignKey, Text, Index
+from sqlalchemy import create_engine, func, Column, Integer, String, Float, DateTime, LargeBinary, ForeignKey, Text, Index, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from contextlib import contextmanager
 import datetime
 import pickle # For vector serialization if not handled elsewhere
-from typing import Optional, Generator, List
+from typing import Optional, Generator, List, Dict
 
 from utils.config import settings # To get DATABASE_URL
 
@@ -14,8 +14,18 @@ logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
+def _engine_kwargs(url: str) -> dict:
+    """Connection pool settings; SQLite uses SQLAlchemy's own pool defaults."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": 2 * settings.DB_POOL_SIZE,
+        "pool_recycle": 1800,
+    }
+
 try:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs(SQLALCHEMY_DATABASE_URL))
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
     logger.info("Database engine and session created successfully.")
@@ -84,6 +94,7 @@ class DocumentMetadata(Base): # type: ignore
     sections = relationship("DocumentSection", back_populates="document", cascade="all, delete-orphan")
     medical_entities = relationship("MedicalEntity", back_populates="document", cascade="all, delete-orphan")
     review_history_entries = relationship("ReviewHistory", back_populates="document", cascade="all, delete-orphan")
+    medical_analysis = relationship("DocumentMedicalAnalysis", back_populates="document", uselist=False, cascade="all, delete-orphan")
 
     # For duplicate relationships
     source_for_duplicates = relationship(
@@ -241,6 +252,15 @@ class MedicalEntity(Base): # type: ignore
     document = relationship("DocumentMetadata", back_populates="medical_entities")
     page = relationship("Page", back_populates="medical_entities")
 
+class DocumentMedicalAnalysis(Base): # type: ignore
+    __tablename__ = "document_medical_analysis"
+    document_id = Column(String, ForeignKey("document_metadata.doc_id"), primary_key=True)
+    content_hash = Column(String, nullable=True) # DocumentMetadata.content_hash the summary was computed for
+    summary = Column(JSON, nullable=False)
+    analyzed_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    document = relationship("DocumentMetadata", back_populates="medical_analysis")
+
 # Add other models if necessary, e.g., for LSH index bands if stored in DB, or exact hash log
 
 def create_all_tables():
@@ -407,6 +427,18 @@ def get_page_by_hash(db: Session, page_hash: str) -> Optional[Page]:
     """Gets a page by its hash."""
     return db.query(Page).filter(Page.page_hash == page_hash).first()
 
+def get_first_page_ids_by_hashes(db: Session, page_hashes: List[str]) -> Dict[str, int]:
+    """Maps each given hash to the lowest page id stored with it, in one query. Unknown hashes are omitted."""
+    if not page_hashes:
+        return {}
+    rows = (
+        db.query(Page.page_hash, func.min(Page.id))
+        .filter(Page.page_hash.in_(set(page_hashes)))
+        .group_by(Page.page_hash)
+        .all()
+    )
+    return {page_hash: page_id for page_hash, page_id in rows}
+
 def create_page_duplicate(db: Session, source_page_id: int, duplicate_page_id: int, similarity: float = 1.0) -> PageDuplicate:
     """Creates a PageDuplicate relationship."""
     db_page_duplicate = PageDuplicate(
@@ -541,4 +573,21 @@ def create_page_review_decision(
 
 def get_review_decisions_for_page(db: Session, page_id: int) -> List[PageReviewDecision]:
     """Retrieves all review decisions for a specific page, ordered by most recent first."""
-    return db.query(PageReviewDecision).filter(PageReviewDecision.page_id == page_id).order_by(PageReviewDecision.review_timestamp.desc()).all()
\ No newline at end of file
+    return db.query(PageReviewDecision).filter(PageReviewDecision.page_id == page_id).order_by(PageReviewDecision.review_timestamp.desc()).all()
+
+def get_cached_medical_analysis(db: Session, doc_id: str, content_hash: Optional[str]) -> Optional[dict]:
+    """
+    Retrieve the stored medical analysis summary for a document.
+    Returns None if there is none, or if it was computed for different content.
+    """
+    entry = db.query(DocumentMedicalAnalysis).filter(DocumentMedicalAnalysis.document_id == doc_id).first()
+    if entry is None or entry.content_hash != content_hash:
+        return None
+    return entry.summary
+
+def save_medical_analysis(db: Session, doc_id: str, content_hash: Optional[str], summary: dict) -> DocumentMedicalAnalysis:
+    """
+    Stores (or replaces) the medical analysis summary for a document.
+    Only adds it to the session; the caller commits.
+    """
+    return db.merge(DocumentMedicalAnalysis(document_id=doc_id, content_hash=content_hash, summary=summary))
@@ -0,0 +1,210 @@
+"""
+Content-addressed cache for PDF text extraction results.
+Lets retried pipeline tasks and re-uploads of the same file skip extraction and OCR.
+Rendered page images are cached the same way, keyed by their pixels, for the OCR word boxes,
+and document texts by their content and vectorizer version, for the TF-IDF vectors.
+"""
+
+import hashlib
+import json
+import logging
+import zlib
+from typing import List, Optional, Tuple
+
+import redis
+from PIL import Image
+
+from utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "extraction:"
+PAGE_WORDS_KEY_PREFIX = "page_words:"
+VECTOR_KEY_PREFIX = "tfidf_vector:"
+
+# Lazily created Redis client, shared by everything in this process
+_CLIENT = None
+
+
+def _get_client() -> Optional["redis.Redis"]:
+    """Return the Redis client, or None when the cache is disabled."""
+    global _CLIENT
+    if settings.EXTRACTION_CACHE_TTL <= 0:
+        return None
+    if _CLIENT is None:
+        url = settings.EXTRACTION_CACHE_URL or f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/2"
+        _CLIENT = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+    return _CLIENT
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    Hash the full contents of a file.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        Hex digest identifying the file contents
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _extraction_key(fingerprint: str) -> str:
+    """
+    Redis key of the extraction result for a file fingerprint under the current OCR settings,
+    so changing them (language, render DPI, ...) doesn't serve text produced with the old ones.
+    """
+    ocr_settings = f"{settings.ENABLE_OCR}:{settings.OCR_LANGUAGE}:{settings.OCR_DPI}:{settings.MIN_TEXT_LENGTH}"
+    return f"{CACHE_KEY_PREFIX}{fingerprint}:{hashlib.blake2b(ocr_settings.encode('utf-8'), digest_size=8).hexdigest()}"
+
+
+def image_fingerprint(image: Image.Image) -> str:
+    """
+    Hash the pixels of a rendered page image.
+
+    Args:
+        image: PIL image
+
+    Returns:
+        Hex digest identifying the image mode, size and pixels
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def get_cached_extraction(fingerprint: str) -> Optional[Tuple[List[str], str, List[float]]]:
+    """
+    Look up the extraction result for a file fingerprint.
+
+    Args:
+        fingerprint: Value returned by file_fingerprint
+
+    Returns:
+        (page_texts, full_text, medical_confidences), or None on a miss or if Redis is unavailable
+    """
+    try:
+        client = _get_client()
+        if client is None:
+            return None
+        payload = client.get(_extraction_key(fingerprint))
+        if payload is None:
+            return None
+        data = json.loads(zlib.decompress(payload))
+        if "full_text" not in data:
+            return None  # Stored before the full text was cached alongside the pages
+        return data["page_texts"], data["full_text"], data["medical_confidences"]
+    except Exception as e:
+        logger.warning(f"Extraction cache lookup failed for {fingerprint}: {e}")
+        return None
+
+
+def cache_extraction(fingerprint: str, page_texts: List[str], full_text: str, medical_confidences: List[float]) -> None:
+    """
+    Store the extraction result for a file fingerprint. Failures are logged and ignored.
+
+    Args:
+        fingerprint: Value returned by file_fingerprint
+        page_texts: Extracted text of every page
+        full_text: Normalized text of the whole document
+        medical_confidences: Medical confidence score of every page
+    """
+    try:
+        client = _get_client()
+        if client is None:
+            return
+        payload = zlib.compress(json.dumps({
+            "page_texts": page_texts,
+            "full_text": full_text,
+            "medical_confidences": medical_confidences,
+        }).encode("utf-8"))
+        client.setex(_extraction_key(fingerprint), settings.EXTRACTION_CACHE_TTL, payload)
+    except Exception as e:
+        logger.warning(f"Failed to cache extraction result for {fingerprint}: {e}")
+
+
+def get_cached_page_words(fingerprint: str) -> Optional[Tuple[List[str], List[str], List[List[int]]]]:
+    """
+    Look up the OCR words of a page image.
+
+    Args:
+        fingerprint: Value returned by image_fingerprint
+
+    Returns:
+        (words, normalized_words, boxes) columns, or None on a miss or if Redis is unavailable
+    """
+    try:
+        client = _get_client()
+        if client is None:
+            return None
+        payload = client.get(PAGE_WORDS_KEY_PREFIX + fingerprint)
+        if payload is None:
+            return None
+        data = json.loads(zlib.decompress(payload))
+        return data["words"], data["norms"], data["boxes"]
+    except Exception as e:
+        logger.warning(f"Page words cache lookup failed for {fingerprint}: {e}")
+        return None
+
+
+def cache_page_words(fingerprint: str, words: List[str], norms: List[str], boxes: List[List[int]]) -> None:
+    """
+    Store the OCR words of a page image. Failures are logged and ignored.
+
+    Args:
+        fingerprint: Value returned by image_fingerprint
+        words: Recognized words
+        norms: Normalized form of each word
+        boxes: (x, y, w, h) box of each word
+    """
+    try:
+        client = _get_client()
+        if client is None:
+            return
+        payload = zlib.compress(json.dumps({"words": words, "norms": norms, "boxes": boxes}).encode("utf-8"))
+        client.setex(PAGE_WORDS_KEY_PREFIX + fingerprint, settings.EXTRACTION_CACHE_TTL, payload)
+    except Exception as e:
+        logger.warning(f"Failed to cache page words for {fingerprint}: {e}")
+
+
+def get_cached_vector(key: str) -> Optional[bytes]:
+    """
+    Look up a serialized document vector.
+
+    Args:
+        key: Identifies the text and the vectorizer that produced the vector
+
+    Returns:
+        The serialized vector, or None on a miss or if Redis is unavailable
+    """
+    try:
+        client = _get_client()
+        if client is None:
+            return None
+        return client.get(VECTOR_KEY_PREFIX + key)
+    except Exception as e:
+        logger.warning(f"Vector cache lookup failed for {key}: {e}")
+        return None
+
+
+def cache_vector(key: str, payload: bytes) -> None:
+    """
+    Store a serialized document vector. Failures are logged and ignored.
+
+    Args:
+        key: Identifies the text and the vectorizer that produced the vector
+        payload: Serialized vector
+    """
+    try:
+        client = _get_client()
+        if client is None:
+            return
+        client.setex(VECTOR_KEY_PREFIX + key, settings.EXTRACTION_CACHE_TTL, payload)
+    except Exception as e:
+        logger.warning(f"Failed to cache vector for {key}: {e}")
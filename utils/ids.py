@@ -0,0 +1,34 @@
+"""
+Document ID generation.
+Hands out random UUIDs from a pooled os.urandom buffer instead of one getrandom call per ID.
+"""
+
+import os
+import threading
+import uuid
+
+POOL_SIZE = 1024  # UUIDs drawn per os.urandom call
+
+_lock = threading.Lock()
+_buf = b""
+_off = 0
+_pid = None
+
+
+def next_uuid() -> str:
+    """
+    Return a new random (version 4) UUID string.
+    The pool is discarded after a fork so parent and child never hand out the same bytes.
+
+    Returns:
+        UUID string, same format as str(uuid.uuid4())
+    """
+    global _buf, _off, _pid
+    with _lock:
+        if _pid != os.getpid() or _off >= len(_buf):
+            _buf = os.urandom(16 * POOL_SIZE)
+            _off = 0
+            _pid = os.getpid()
+        raw = _buf[_off:_off + 16]
+        _off += 16
+    return str(uuid.UUID(bytes=raw, version=4))
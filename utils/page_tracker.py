@@ -7,16 +7,17 @@ import hashlib
 import logging
 from typing import List, Optional, Any, Dict # Added Dict
 import datetime # Added for reviewed_at timestamp
+from dataclasses import dataclass
 
 from sqlalchemy.orm import Session
 
 # Import database functions and models
 from utils.database import (
     Page,
+    PageDuplicate,
     # User, # Not directly used here, but get_user_by_username returns it
-    create_page,
     get_page_by_hash,
-    create_page_duplicate,
+    get_first_page_ids_by_hashes,
     get_duplicates_for_page, # Renamed from get_duplicates_of_page for clarity
     create_page_review_decision,
     get_user_by_username,
@@ -41,6 +42,37 @@ def hash_text(text: str) -> str:
     return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
 
 
+@dataclass
+class PageBatch:
+    """Column-oriented page data for one document; every column has one entry per page."""
+    doc_id: str
+    texts: List[str]
+    medical_confidences: List[float]
+    duplicate_confidences: List[float]
+    image_paths: List[Optional[str]]
+
+    @classmethod
+    def from_columns(
+        cls,
+        doc_id: str,
+        texts: List[str],
+        medical_confidences: Optional[List[float]] = None,
+        duplicate_confidences: Optional[List[float]] = None,
+        image_paths: Optional[List[Optional[str]]] = None,
+    ) -> "PageBatch":
+        """Build a batch, padding missing or short columns so they line up with texts."""
+        num_pages = len(texts)
+        columns = [
+            (list(medical_confidences or []), 0.0),
+            (list(duplicate_confidences or []), 0.0),
+            (list(image_paths or []), None),
+        ]
+        if any(values and len(values) != num_pages for values, _ in columns):
+            logger.warning(f"Mismatch in lengths of page data for doc_id {doc_id}. Adjusting lists.")
+        medical, duplicate, images = [(values + [fill] * num_pages)[:num_pages] for values, fill in columns]
+        return cls(doc_id, list(texts), medical, duplicate, images)
+
+
 def process_document_pages( # Renamed from update_page_hash_map for clarity and new role
     db: Session,
     doc_id: str,
@@ -65,81 +97,70 @@ def process_document_pages( # Renamed from update_page_hash_map for clarity and
     Returns:
         List of created Page objects.
     """
-    created_pages: List[Page] = []
-    
-    # Prepare confidence lists if not provided
-    num_pages = len(page_texts)
-    medical_confidences = medical_confidences or [0.0] * num_pages
-    duplicate_confidences = duplicate_confidences or [0.0] * num_pages
-    image_paths = image_paths or [None] * num_pages # type: ignore
-    
-    # Ensure lists are the same length as page_texts
-    # This logic can be simplified or made more robust if necessary
-    if not (len(medical_confidences) == num_pages and \
-            len(duplicate_confidences) == num_pages and \
-            len(image_paths) == num_pages):
-        logger.warning(f"Mismatch in lengths of page data for doc_id {doc_id}. Adjusting lists.")
-        # Basic adjustment, consider more robust error handling or raising an exception
-        medical_confidences = (medical_confidences + [0.0] * num_pages)[:num_pages]
-        duplicate_confidences = (duplicate_confidences + [0.0] * num_pages)[:num_pages]
-        image_paths = (image_paths + [None] * num_pages)[:num_pages] # type: ignore
+    batch = PageBatch.from_columns(doc_id, page_texts, medical_confidences, duplicate_confidences, image_paths)
+    return store_page_batch(db, batch)
 
-    for i, text in enumerate(page_texts, start=1): # page_number is 1-indexed
-        page_num = i
-        if not text.strip():
-            logger.warning(f"Empty text for page {page_num} of doc_id {doc_id}, skipping")
-            continue
-            
-        page_hash_val = hash_text(text)
-        
-        # Check if this page hash already exists
-        existing_page_with_hash = get_page_by_hash(db, page_hash_val)
+
+def store_page_batch(db: Session, batch: PageBatch) -> List[Page]:
+    """
+    Insert all pages of a batch and their exact-duplicate links in one transaction.
+    Existing pages with the same hashes are looked up with a single query, and the
+    page inserts are flushed together instead of committing page by page.
+    
+    Args:
+        db: SQLAlchemy session
+        batch: Page data for one document
         
-        # Create the new page entry regardless
-        # The relationship will be handled by PageDuplicate
-        current_page = create_page(
-            db=db,
-            document_id=doc_id,
-            page_number=page_num,
-            page_hash=page_hash_val,
-            text_snippet=text[:300].replace("\n", " ").strip(),
-            full_page_text=text,
-            medical_confidence=medical_confidences[page_num-1],
-            duplicate_confidence=duplicate_confidences[page_num-1],
-            page_image_path=image_paths[page_num-1], # type: ignore
-            status="pending" # Default status
-        )
-        created_pages.append(current_page)
-        # db.flush() # Ensure current_page.id is available if not using autocommit for create_page
+    Returns:
+        List of created Page objects.
+    """
+    doc_id = batch.doc_id
+    created_pages: List[Page] = []
+    try:
+        for i, text in enumerate(batch.texts):
+            page_num = i + 1 # page_number is 1-indexed
+            if not text.strip():
+                logger.warning(f"Empty text for page {page_num} of doc_id {doc_id}, skipping")
+                continue
+            created_pages.append(Page(
+                document_id=doc_id,
+                page_number=page_num,
+                page_hash=hash_text(text),
+                text_snippet=text[:300].replace("\n", " ").strip(),
+                full_page_text=text,
+                medical_confidence=batch.medical_confidences[i],
+                duplicate_confidence=batch.duplicate_confidences[i],
+                page_image_path=batch.image_paths[i],
+                status="pending" # Default status
+            ))
+
+        # First page already stored for each hash; looked up before the new pages are flushed
+        source_ids = get_first_page_ids_by_hashes(db, [page.page_hash for page in created_pages])
 
-        if existing_page_with_hash:
-            # If the existing page is not the one we just created (i.e. different ID)
-            # This check is important if reprocessing the same document.
-            if existing_page_with_hash.id != current_page.id:
-                # Check if this exact duplicate relationship already exists to prevent errors
-                # This might require a specific query if unique constraint is on (source_page_id, duplicate_page_id)
-                # For now, we assume create_page_duplicate handles or ignores duplicates gracefully
-                # or the calling logic ensures no redundant calls.
-                # The PageDuplicate table has a unique constraint on (source_page_id, duplicate_page_id)
-                # So, attempting to add an existing one might raise an IntegrityError.
-                # A check could be added here if needed:
-                # existing_dup = db.query(PageDuplicate).filter_by(source_page_id=existing_page_with_hash.id, duplicate_page_id=current_page.id).first()
-                # if not existing_dup:
+        db.add_all(created_pages)
+        db.flush() # Assigns ids to all new pages
 
-                create_page_duplicate(
-                    db=db,
-                    source_page_id=existing_page_with_hash.id, # The first page encountered with this hash
-                    duplicate_page_id=current_page.id,        # The new page that is a duplicate
-                    similarity=1.0  # Exact hash match
-                )
-                logger.info(f"Page {current_page.id} (doc: {doc_id}, page_num: {page_num}) identified as duplicate of page {existing_page_with_hash.id} (hash: {page_hash_val})")
-            else:
-                logger.info(f"Page {current_page.id} (doc: {doc_id}, page_num: {page_num}) with hash {page_hash_val} is the same as the existing entry, likely a re-process.")
+        duplicate_count = 0
+        for page in created_pages:
+            source_id = source_ids.get(page.page_hash)
+            if source_id is None:
+                # The first occurrence becomes the source for later pages with the same hash
+                source_ids[page.page_hash] = page.id
+                continue
+            db.add(PageDuplicate(
+                source_page_id=source_id, # The first page encountered with this hash
+                duplicate_page_id=page.id, # The new page that is a duplicate
+                similarity=1.0  # Exact hash match
+            ))
+            duplicate_count += 1
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error storing pages for document {doc_id}: {e}", exc_info=True)
+        raise
 
-        else:
-            logger.info(f"Added new unique page {current_page.id} (doc: {doc_id}, page_num: {page_num}) with hash {page_hash_val}")
-            
-    logger.info(f"Processed {len(created_pages)} pages for doc_id {doc_id}.")
+    logger.debug("Processed %d pages for doc_id %s (%d exact duplicate pages).", len(created_pages), doc_id, duplicate_count)
     return created_pages
 
 
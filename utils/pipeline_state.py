@@ -0,0 +1,78 @@
+"""
+Shared store for the extracted text handed between pipeline stage tasks.
+Stages of one document may run on different workers or hosts, so the text is kept in
+Redis keyed by document ID rather than on the local disk, and expires on its own if the
+chain never reaches its final stage.
+"""
+
+import logging
+import zlib
+from typing import Optional
+
+import redis
+
+from utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+STAGE_TEXT_KEY_PREFIX = "pipeline_text:"
+
+# Lazily created Redis client, shared by everything in this process
+_CLIENT = None
+
+
+def _get_client() -> "redis.Redis":
+    """Return the Redis client for the pipeline state store."""
+    global _CLIENT
+    if _CLIENT is None:
+        url = settings.PIPELINE_STATE_URL or f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/3"
+        _CLIENT = redis.Redis.from_url(url, socket_timeout=5, socket_connect_timeout=5)
+    return _CLIENT
+
+
+def store_stage_text(doc_id: str, text: str) -> None:
+    """
+    Store the extracted text of a document for the later pipeline stages.
+
+    Args:
+        doc_id: Document ID
+        text: Full extracted text
+
+    Raises:
+        redis.RedisError: If the text could not be stored
+    """
+    payload = zlib.compress(text.encode("utf-8"))
+    _get_client().setex(STAGE_TEXT_KEY_PREFIX + doc_id, settings.PIPELINE_STATE_TTL, payload)
+
+
+def load_stage_text(doc_id: str) -> Optional[str]:
+    """
+    Look up the extracted text of a document.
+
+    Args:
+        doc_id: Document ID
+
+    Returns:
+        The text, or None if it was never stored or has expired
+
+    Raises:
+        redis.RedisError: If Redis is unavailable
+    """
+    payload = _get_client().get(STAGE_TEXT_KEY_PREFIX + doc_id)
+    if payload is None:
+        return None
+    return zlib.decompress(payload).decode("utf-8")
+
+
+def delete_stage_text(doc_id: str) -> None:
+    """
+    Remove the extracted text of a document once its pipeline has finished.
+    Failures are logged and ignored; the entry then expires after PIPELINE_STATE_TTL.
+
+    Args:
+        doc_id: Document ID
+    """
+    try:
+        _get_client().delete(STAGE_TEXT_KEY_PREFIX + doc_id)
+    except Exception as e:
+        logger.warning(f"Failed to delete stage text for {doc_id}: {e}")